@@ -1,9 +1,17 @@
+import itertools
 import random
 import numpy as np
 import pandas as pd
 from schedule import SchedulerVM
 from Helper import create_host_list
 from Runner import run_simulation
+from result_cache import ResultCache, code_version
+from results_warehouse import ResultsWarehouse
+from sla_metrics import SLAMetrics
+from datacenter import VMStats
+from energy_ledger import EnergyLedger
+from overload_detection import METHODS as OVERLOAD_DETECTORS, OverloadDetector
+from vm_selection import VMSelection
 from vm_profile_generator import (
     generate_initial_vm_profiles,
     generate_dynamic_vm_profiles
@@ -19,12 +27,13 @@ def enable_print():
     sys.stdout = sys.__stdout__
 
 # Global configs
-trace_dir = "planetlab/20110303"
+trace_day = "20110303"
 num_hosts = 200
 num_initial_vms = 400
 num_peak_arrive = 150
 time_steps = 288
 step_duration_sec = 300  # 5 minutes
+seed = 42
 
 placement_policies = [
     "random", "first_fit", "least_utilized",
@@ -32,83 +41,165 @@ placement_policies = [
 ]
 
 dvfs_options = [False, True]
-migration_options = ["disable", "default"] 
-
-results = []
-
-random.seed(42)
-np.random.seed(42)
-
-case_id = 1
-for policy in placement_policies:
-    for dvfs_flag in dvfs_options:
-        for migrate_set in migration_options:
-
-            print(f"\n=== Running Case {case_id} ===")
-            print(f"Policy: {policy}, DVFS: {dvfs_flag}, Migration: {migrate_set}")
+# Also accepted per case: an overload_detection method ("thr", "iqr", "mad", "lr"), optionally
+# with case["vm_selection"] set to a vm_selection policy ("mmt", "random", "mc")
+migration_options = ["disable", "default"]
+
+def build_cases(seeds=None, trace_days=None):
+    """
+    Expand the sweep grid into a list of case configurations.
+    Each case carries everything that determines its result, so it can be used as a cache key.
+
+    :param seeds: Seeds to replicate every case with (defaults to [seed])
+    :param trace_days: PlanetLab trace days to run every case on (defaults to [trace_day])
+    """
+    version = code_version()
+    cases = []
+    for day, case_seed, policy, dvfs_flag, migrate_set in itertools.product(
+        trace_days or [trace_day], seeds or [seed],
+        placement_policies, dvfs_options, migration_options
+    ):
+        cases.append({
+            "policy": policy,
+            "dvfs": dvfs_flag,
+            "migration": migrate_set,
+            "num_hosts": num_hosts,
+            "num_initial_vms": num_initial_vms,
+            "num_peak_arrive": num_peak_arrive,
+            "time_steps": time_steps,
+            "step_duration_sec": step_duration_sec,
+            "trace_day": day,
+            "seed": case_seed,
+            "code_version": version,
+        })
+    return cases
+
+def generate_case_profiles(case):
+    """
+    Seed the RNGs for a case and generate its VM profiles, sorted by arrival step.
+    RNGs are re-seeded per case so the result does not depend on which cases ran before it.
+    """
+    random.seed(case["seed"])
+    np.random.seed(case["seed"])
+
+    trace_dir = os.path.join("planetlab", case["trace_day"])
+
+    # Generate VMs
+    initial_profiles = generate_initial_vm_profiles(
+        num_vms=case["num_initial_vms"],
+        trace_dir=trace_dir,
+        long_lived_ratio=0.6,
+        time_steps=case["time_steps"],
+        antithetic_lifetimes=case.get("antithetic_lifetimes", False),
+        trace_dtype=case.get("trace_dtype")
+    )
+
+    dynamic_profiles = generate_dynamic_vm_profiles(
+        trace_dir=trace_dir,
+        num_hosts=case["num_hosts"],
+        num_peak_arrive=case["num_peak_arrive"],
+        initial_vm_id=len(initial_profiles),
+        time_steps=case["time_steps"],
+        arrival_process=case.get("arrival_process"),
+        step_duration_sec=case["step_duration_sec"],
+        antithetic_lifetimes=case.get("antithetic_lifetimes", False),
+        trace_dtype=case.get("trace_dtype")
+    )
+
+    all_profiles = initial_profiles + dynamic_profiles
+    all_profiles.sort(key=lambda p: p["arrival_time"])
+    return all_profiles
+
+def run_case(case):
+    """
+    Run a single case and return its result dict.
+    """
+    all_profiles = generate_case_profiles(case)
+
+    detector = None
+    vm_selection = None
+    if case["migration"] == "default":
+        migrate_set_map = None
+    elif case["migration"] in OVERLOAD_DETECTORS:
+        migrate_set_map = None
+        detector = OverloadDetector(case["num_hosts"], case["migration"])
+        if case.get("vm_selection"):
+            vm_selection = VMSelection(case["vm_selection"])
+    else:
+        migrate_set_map = case["migration"]
+
+    # Re-create hosts for each run
+    hosts = create_host_list(case["num_hosts"])
+    scheduler = SchedulerVM(hosts, sample_size=case.get("sample_size"))
+    scheduler.set_policy(case["policy"])
+
+    for host in hosts:
+        host.enable_dvfs(case["dvfs"])
+
+    # Run simulation
+    metrics = SLAMetrics()
+    vm_stats = VMStats()
+    ledger = EnergyLedger([host.host_id for host in hosts], case["time_steps"])
+    total_energy_joules, host_utilization_history, num_active_vm = run_simulation(
+        all_profiles=all_profiles,
+        hosts=hosts,
+        scheduler=scheduler,
+        step_duration_sec=case["step_duration_sec"],
+        time_steps=case["time_steps"],
+        migrate_fn=migrate_set_map,
+        metrics=metrics,
+        vm_stats=vm_stats,
+        ledger=ledger,
+        detector=detector,
+        vm_selection=vm_selection
+    )
+
+    # energy_kwh stays the operational (idle + dynamic) energy; boot and migration come on top
+    return {"energy_kwh": total_energy_joules / 3_600_000, **metrics.summary(),
+            "rejected_vms": vm_stats.rejected, **ledger.summary()}
+
+if __name__ == "__main__":
+    cache = ResultCache("results_cache")
+    warehouse = ResultsWarehouse("results.sqlite")
+    warehouse.start_run("comprehensive")
+    results = []
+
+    for case_id, case in enumerate(build_cases(), start=1):
+        print(f"\n=== Running Case {case_id} ===")
+        print(f"Policy: {case['policy']}, DVFS: {case['dvfs']}, Migration: {case['migration']}")
+
+        result = cache.get(case)
+        if result is not None:
+            print("Cached result found, skipping simulation.")
+        else:
             block_print()
-            if migrate_set == "default":
-                migrate_set_map = None
-            else:
-                migrate_set_map = migrate_set
-        
-            # Re-create hosts for each run
-            hosts = create_host_list(num_hosts)
-            scheduler = SchedulerVM(hosts)
-            scheduler.set_policy(policy)
-
-            for host in hosts:
-                host.enable_dvfs(dvfs_flag)
-
-            # Generate VMs
-            initial_profiles = generate_initial_vm_profiles(
-                num_vms=num_initial_vms,
-                trace_dir=trace_dir,
-                long_lived_ratio=0.6
-            )
-
-            dynamic_profiles = generate_dynamic_vm_profiles(
-                trace_dir=trace_dir,
-                num_hosts=num_hosts,
-                num_peak_arrive=num_peak_arrive,
-                initial_vm_id=len(initial_profiles)
-            )
-
-            all_profiles = initial_profiles + dynamic_profiles
-            all_profiles.sort(key=lambda p: p["arrival_time"])
-
-            # Run simulation
-            total_energy_joules, host_utilization_history, num_active_vm = run_simulation(
-                all_profiles=all_profiles,
-                hosts=hosts,
-                scheduler=scheduler,
-                step_duration_sec=step_duration_sec,
-                time_steps=time_steps,
-                migrate_fn=migrate_set_map
-            )
-            enable_print()
-
-            # Save results
-            energy_kwh = total_energy_joules / 3_600_000
-            results.append({
-                "case": case_id,
-                "policy": policy,
-                "dvfs": dvfs_flag,
-                "migration": migrate_set,
-                "energy_kwh": energy_kwh
-            })
-
-            print(f"Total Energy: {energy_kwh:.6f} kWh")
-            case_id += 1
-            #breakpoint()
-
-# Print summary
-print("\n--- Summary of All Cases ---")
-for r in results:
-    print(f"Case {r['case']}: {r['policy']}, DVFS={r['dvfs']}, Mig={r['migration']} => {r['energy_kwh']:.6f} kWh")
-
-# Save the results
-df = pd.DataFrame(results)
-df.to_csv("results.csv", index=False)
-
-print("\nResults saved to results.csv")
\ No newline at end of file
+            try:
+                result = run_case(case)
+            finally:
+                enable_print()
+            cache.put(case, result)
+        warehouse.add_result(case, result)
+
+        # Save results
+        results.append({
+            "case": case_id,
+            "policy": case["policy"],
+            "dvfs": case["dvfs"],
+            "migration": case["migration"],
+            "energy_kwh": result["energy_kwh"]
+        })
+
+        print(f"Total Energy: {result['energy_kwh']:.6f} kWh")
+        #breakpoint()
+
+    # Print summary
+    print("\n--- Summary of All Cases ---")
+    for r in results:
+        print(f"Case {r['case']}: {r['policy']}, DVFS={r['dvfs']}, Mig={r['migration']} => {r['energy_kwh']:.6f} kWh")
+
+    # Save the results
+    df = pd.DataFrame(results)
+    df.to_csv("results.csv", index=False)
+
+    warehouse.close()
+    print("\nResults saved to results.csv and results.sqlite")
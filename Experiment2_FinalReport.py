@@ -92,7 +92,7 @@ def run_simulation(scenario_id, case_id):
     
     # Simulation loop
     while True:
-        still_running = any(not cl.finished for cl in cloudlets)
+        still_running = bool(active_vms)
         still_waiting = bool(dynamic_arrivals)
         if not still_running and not still_waiting:
             break
@@ -119,10 +119,10 @@ def run_simulation(scenario_id, case_id):
         # Update active VMs and cloudlets
         for vm in active_vms[:]:
             vm.update_cloudlets(current_time, time_step)
-            if all(cl.finished for cl in vm.cloudlets):
+            if not vm.has_unfinished_cloudlets():
                 for host in hosts:
                     if vm in host.vms:
-                        host.vms.remove(vm)
+                        host.deallocate_vm(vm.vm_id)
                         print(f"[Time {current_time:.1f}s] VM {vm.vm_id} deallocated from Host {host.host_id}")
                         break
                 active_vms.remove(vm)
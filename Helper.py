@@ -2,6 +2,7 @@
 
 from datacenter import Host, VM
 import random
+import numpy as np
 
 # ====================
 # Host Configuration
@@ -32,6 +33,75 @@ def create_host_list(num_hosts):
         hosts.append(host)
     return hosts
 
+# ====================
+# Random streams
+# ====================
+# One independent NumPy stream per subsystem, all derived from a single seed. A stream only
+# depends on the seed and its own name, so adding a stream or drawing more from one never
+# changes what the others produce, and parallel workers given the same seed agree.
+STREAM_NAMES = ["vm_types", "traces", "lifetimes", "arrivals", "policy"]
+
+def make_streams(seed, names=None):
+    """
+    :param seed: Integer seed of the run
+    :param names: Stream names (defaults to STREAM_NAMES)
+    :return: {name: numpy Generator}
+    """
+    streams = {}
+    for name in names or STREAM_NAMES:
+        key = int.from_bytes(name.encode(), "little")
+        streams[name] = np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=(key,))))
+    return streams
+
+def host_fleet_arrays(num_hosts):
+    """
+    Configuration of the hosts create_host_list builds (types assigned round-robin), as arrays.
+    """
+    type_id = np.arange(num_hosts) % HOST_TYPES
+    return {
+        "host_id": np.arange(num_hosts, dtype=np.int64),
+        "type_id": type_id,
+        "num_cores": np.asarray(HOST_PES)[type_id],
+        "core_capacity": np.asarray(HOST_MIPS)[type_id],
+        "ram_capacity": np.asarray(HOST_RAM)[type_id],
+        "storage_capacity": np.full(num_hosts, HOST_STORAGE),
+        "power_idle": np.asarray(HOST_Power_Idle)[type_id],
+        "power_max": np.asarray(HOST_Power_Full)[type_id],
+    }
+
+def create_host_fleet(num_hosts, as_objects=True):
+    """
+    Same fleet as create_host_list, built from host_fleet_arrays.
+
+    :return: list of Host if as_objects, else the arrays dict
+    """
+    fleet = host_fleet_arrays(num_hosts)
+    if not as_objects:
+        return fleet
+    return [
+        Host(host_id=int(i), num_cores=int(c), core_capacity=int(m), ram_capacity=int(r),
+             storage_capacity=int(s), power_idle=int(pi), power_max=int(pm))
+        for i, c, m, r, s, pi, pm in zip(fleet["host_id"].tolist(), fleet["num_cores"].tolist(),
+                                         fleet["core_capacity"].tolist(), fleet["ram_capacity"].tolist(),
+                                         fleet["storage_capacity"].tolist(), fleet["power_idle"].tolist(),
+                                         fleet["power_max"].tolist())
+    ]
+
+def vm_fleet_arrays(num_vms, rng, start_id=0):
+    """
+    VM types of a whole fleet in one draw from rng (e.g. make_streams(seed)["vm_types"]).
+
+    :return: Dict of arrays vm_id, vm_type, cpu, ram, storage
+    """
+    vm_type = rng.integers(0, VM_TYPES, size=num_vms)
+    return {
+        "vm_id": np.arange(start_id, start_id + num_vms, dtype=np.int64),
+        "vm_type": vm_type,
+        "cpu": (np.asarray(VM_MIPS) * np.asarray(VM_PES))[vm_type],
+        "ram": np.asarray(VM_RAM, dtype=np.float64)[vm_type],
+        "storage": np.full(num_vms, VM_SIZE, dtype=np.float64),
+    }
+
 
 # ====================
 # VM Configuration
@@ -57,4 +127,19 @@ def create_vm_list(num_vms, start_id = 0, online_service=False):
         storage = VM_SIZE
         vm = VM(vm_id, cpu=cpu, ram=ram, storage=storage, is_online_service=online_service)
         vm_list.append(vm)
-    return vm_list
\ No newline at end of file
+    return vm_list
+
+def create_vm_fleet(num_vms, rng, start_id=0, online_service=False, as_objects=True):
+    """
+    create_vm_list drawing all VM types at once from its own stream instead of the global `random`.
+
+    :return: list of VM if as_objects, else the arrays dict of vm_fleet_arrays
+    """
+    fleet = vm_fleet_arrays(num_vms, rng, start_id)
+    if not as_objects:
+        return fleet
+    return [
+        VM(vm_id, cpu=cpu, ram=ram, storage=storage, is_online_service=online_service)
+        for vm_id, cpu, ram, storage in zip(fleet["vm_id"].tolist(), fleet["cpu"].tolist(),
+                                            fleet["ram"].tolist(), fleet["storage"].tolist())
+    ]
\ No newline at end of file
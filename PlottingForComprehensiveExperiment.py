@@ -1,27 +1,40 @@
 # This script visualizes the results from the comprehensive experiment.
 
+import os
+
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# === Load the results from CSV ===
-df = pd.read_csv("results.csv")
+from result_cache import code_version
+from results_warehouse import ResultsWarehouse
+
+# === Load the results: indexed query on the warehouse, or the CSV of older runs ===
+if os.path.exists("results.sqlite"):
+    with ResultsWarehouse("results.sqlite") as warehouse:
+        # Only cases of one simulator version: the current sources, else the latest run's
+        version = code_version()
+        df = warehouse.metric_frame(["energy_kwh"], code_version=version)
+        if df.empty:
+            latest = warehouse.query("SELECT code_version FROM runs ORDER BY run_id DESC LIMIT 1")
+            if len(latest):
+                version = latest["code_version"].iloc[0]
+                df = warehouse.metric_frame(["energy_kwh"], code_version=version)
+        print(f"Plotting {len(df)} cases of code version {version}")
+else:
+    df = pd.read_csv("results.csv")
 
 # Rename column for consistency
 df.rename(columns={"energy_kwh": "Energy"}, inplace=True)
 
 # === Create configuration Group column ===
-def get_group(row):
-    if not row["dvfs"] and row["migration"] == "disable":
-        return "No DVFS / No Migration"
-    elif row["dvfs"] and row["migration"] == "disable":
-        return "DVFS / No Migration"
-    elif not row["dvfs"] and row["migration"] == "default":
-        return "No DVFS / Migration"
-    elif row["dvfs"] and row["migration"] == "default":
-        return "DVFS / Migration"
-
-df["Group"] = df.apply(get_group, axis=1)
+migrating = df["migration"] != "disable"
+df["Group"] = np.select(
+    [~df["dvfs"] & ~migrating, df["dvfs"] & ~migrating, ~df["dvfs"] & migrating, df["dvfs"] & migrating],
+    ["No DVFS / No Migration", "DVFS / No Migration", "No DVFS / Migration", "DVFS / Migration"],
+    default=None
+)
 
 # Set global font sizes (for all future plots)
 plt.rcParams.update({
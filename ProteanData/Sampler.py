@@ -6,7 +6,11 @@ from scipy.interpolate import interp1d
 class ProteanSampler:
     def __init__(self,
                  lifetime_csv="ProteanData/VM_lifetime_blue_curve.csv",
-                 arrival_csv="ProteanData/VM_arriving_rates.csv"):
+                 arrival_csv="ProteanData/VM_arriving_rates.csv",
+                 antithetic=False):
+        # antithetic: draw lifetimes in antithetic pairs (u, 1 - u), which lowers the variance of
+        # any average over them since the inverse CDF is monotone
+        self.antithetic = antithetic
         # Load lifetime data
         df_life = pd.read_csv(lifetime_csv)
         grouped = df_life.groupby('Lifetime (mins)', as_index=False).mean()
@@ -27,8 +31,12 @@ class ProteanSampler:
         self.cdf_vals /= self.cdf_vals[-1]
         self.inverse_cdf = interp1d(self.cdf_vals, self.log_x, bounds_error=False, fill_value="extrapolate")
 
-    def VM_lifetime(self, n=1):
-        u = np.random.uniform(0, 1, n)
+    def VM_lifetime(self, n=1, rng=None):
+        # rng: optional numpy Generator; the global np.random state is used otherwise
+        m = (n + 1) // 2 if self.antithetic else n
+        u = rng.uniform(0, 1, m) if rng is not None else np.random.uniform(0, 1, m)
+        if self.antithetic:
+            u = np.concatenate([u, 1.0 - u])[:n]
         return 10 ** self.inverse_cdf(u)
 
     def plot_pdf_cdf(self):
@@ -73,12 +81,84 @@ class ProteanSampler:
         arrival_numbers = np.round(self.arrival_rates * scale).astype(int)
         return arrival_numbers
 
+    # The CSV rows are roughly 5 minutes apart and VM_arrival_rates uses one row per 5-minute step,
+    # so `scale` below is the expected number of arrivals per 5 minutes at a normalized rate of 1.
+    RATE_PERIOD_SEC = 300
+
+    def _cumulative_arrivals(self, seconds, scale):
+        """
+        Expected arrivals in [0, seconds) under the rate curve, linearly interpolated between the
+        CSV points and repeated every 24 hours (exact integral of the piecewise-linear curve).
+        """
+        x = self.arrival_time
+        r = self.arrival_rates
+        seg = np.diff(x) * (r[:-1] + r[1:]) / 2
+        knots = np.concatenate([[0.0], np.cumsum(seg)])     # Integral up to each knot, in rate-hours
+        day, hours = np.divmod(np.asarray(seconds, dtype=np.float64) / 3600.0, x[-1])
+        k = np.clip(np.searchsorted(x, hours, side="right") - 1, 0, len(x) - 2)
+        dx = hours - x[k]
+        slope = (r[k + 1] - r[k]) / (x[k + 1] - x[k])
+        rate_hours = day * knots[-1] + knots[k] + r[k] * dx + 0.5 * slope * dx ** 2
+        return rate_hours * 3600.0 / self.RATE_PERIOD_SEC * scale
+
+    def expected_arrivals(self, step_duration_sec=300, num_steps=288, scale=1):
+        """
+        Expected arrivals in each of num_steps steps of step_duration_sec seconds.
+        """
+        bounds = np.arange(num_steps + 1) * float(step_duration_sec)
+        return np.maximum(np.diff(self._cumulative_arrivals(bounds, scale)), 0.0)
+
+    def VM_arrivals(self, step_duration_sec=300, num_steps=288, scale=1, rng=None, method="poisson",
+                    max_lifetime_steps=None):
+        """
+        Draw a non-homogeneous Poisson arrival process over the whole horizon at once.
+
+        :param step_duration_sec: Simulation step length in seconds
+        :param num_steps: Horizon in steps (may span several days; the rate curve repeats daily)
+        :param scale: Expected arrivals per 5 minutes at a normalized rate of 1
+        :param rng: numpy Generator (a fresh default_rng() if None)
+        :param method: "poisson" (independent Poisson count per step from the integrated rate) or
+                       "thinning" (continuous arrival times from a homogeneous process at the peak
+                       rate, kept with probability rate(t) / peak)
+        :param max_lifetime_steps: Lifetimes above this are redrawn (defaults to num_steps)
+        :return: (arrival_steps, lifetimes), int64 arrays in steps, sorted by arrival
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        if method == "poisson":
+            counts = rng.poisson(self.expected_arrivals(step_duration_sec, num_steps, scale))
+            arrival_steps = np.repeat(np.arange(num_steps, dtype=np.int64), counts)
+        elif method == "thinning":
+            horizon = num_steps * float(step_duration_sec)
+            peak = self.arrival_rates.max() * scale / self.RATE_PERIOD_SEC
+            times = np.sort(rng.uniform(0.0, horizon, rng.poisson(peak * horizon)))
+            hours = (times / 3600.0) % self.arrival_time[-1]
+            rate = np.interp(hours, self.arrival_time, self.arrival_rates) * scale / self.RATE_PERIOD_SEC
+            times = times[rng.uniform(0.0, 1.0, len(times)) * peak < rate]
+            arrival_steps = np.minimum((times // step_duration_sec).astype(np.int64), num_steps - 1)
+        else:
+            raise ValueError(f"Unknown arrival method {method!r}")
+
+        max_lifetime_steps = num_steps if max_lifetime_steps is None else max_lifetime_steps
+        lifetimes = self._lifetime_steps(len(arrival_steps), step_duration_sec, rng)
+        too_long = np.nonzero(lifetimes > max_lifetime_steps)[0]
+        while len(too_long):
+            lifetimes[too_long] = self._lifetime_steps(len(too_long), step_duration_sec, rng)
+            too_long = too_long[lifetimes[too_long] > max_lifetime_steps]
+        return arrival_steps, lifetimes
+
+    def _lifetime_steps(self, n, step_duration_sec, rng):
+        minutes = self.VM_lifetime(n, rng=rng)
+        return np.maximum(np.ceil(minutes * 60.0 / step_duration_sec), 1).astype(np.int64)
+
 
 # Example usage:
 if __name__ == "__main__":
     sampler = ProteanSampler()
     samples = sampler.VM_lifetime(20)
     print("Generated Samples:", samples)
+    arrivals, lifetimes = sampler.VM_arrivals(step_duration_sec=60, num_steps=30 * 1440, scale=15,
+                                              rng=np.random.default_rng(0))
+    print(f"30 days at 1-minute steps: {len(arrivals)} arrivals, mean lifetime {lifetimes.mean():.1f} steps")
     sampler.plot_pdf_cdf()
     sampler.plot_arrival_rates()
     #breakpoint()
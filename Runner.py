@@ -1,77 +1,233 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from Helper import create_vm_list
+import random
+from capacity_model import CapacityModel
+from datacenter import VMPool
+from Helper import VM_MIPS, VM_PES, VM_RAM, VM_SIZE, VM_TYPES
+from plotting import history_array, plot_host_heatmap, plot_percentile_bands
+from trace_features import TraceFeatureStore
+from vector_engine import encode_utilization, trace_value, trace_values
 
-def run_simulation(all_profiles, hosts, scheduler, step_duration_sec=300, time_steps=288, migrate_fn=None):
+def run_simulation(all_profiles, hosts, scheduler, step_duration_sec=300, time_steps=288, migrate_fn=None,
+                   metrics=None, vm_stats=None, feature_store=None, trace_index=None, ledger=None, detector=None,
+                   vm_selection=None, history_dtype=None):
+    """
+    Run the whole simulation. VM objects are taken from a VMPool when their profile arrives and
+    returned to it when they expire or are rejected, so memory follows the concurrent VM count.
+
+    :param all_profiles: VM profiles sorted by arrival step
+    :param metrics: Optional sla_metrics.SLAMetrics; departed VMs are folded into its totals
+    :param vm_stats: Optional datacenter.VMStats collecting aggregates of departed VMs
+    :param feature_store: Optional trace_features.TraceFeatureStore with one row per entry of
+                          trace_index; built from all_profiles when omitted
+    :param trace_index: Row of the feature store for each profile
+    :param ledger: Optional energy_ledger.EnergyLedger over the hosts, booking per-host idle, dynamic,
+                   boot and migration energy
+    :param detector: Optional overload_detection.OverloadDetector over the hosts; migration then
+                     relieves overloaded hosts and consolidates underloaded ones as it decides
+    :param vm_selection: Optional vm_selection.VMSelection choosing which VMs leave an overloaded host
+    :param history_dtype: None for {host_id: utilization list}, or one of vector_engine.UTILIZATION_DTYPES
+                          to record the history as a (T, H) array of that type (H in the order of hosts,
+                          as the vector and sharded engines return it). Profile traces may be lists or
+                          encoded arrays (vm_profile_generator trace_dtype).
+    :return: (total energy in Joules, host utilization history, active VM count per step)
+    """
     current_time = 0.0
     total_energy_joules = 0.0
     active_vms = []
-    host_utilization_history = {host.host_id: [] for host in hosts}
+    if history_dtype is None:
+        host_utilization_history = {host.host_id: [] for host in hosts}
+    else:
+        host_utilization_history = encode_utilization(np.zeros((time_steps, len(hosts))), history_dtype)
     num_active_vm = []
 
-    # Create all VM objects before loop
+    # VM types are drawn up front exactly as create_vm_list would, kept as one byte per VM
     total_vm_count = len(all_profiles)
-    vm_list = create_vm_list(total_vm_count,online_service=True)
-    for vm, profile in zip(vm_list, all_profiles):
-        vm.vm_id = profile["vm_id"]
-    vm_objects = {vm.vm_id: vm for vm in vm_list}
+    vm_types = np.fromiter((random.randint(0, VM_TYPES - 1) for _ in range(total_vm_count)),
+                           dtype=np.int8, count=total_vm_count)
+    pool = VMPool(is_online_service=True)
+    vm_objects = {}
+    profiles_by_id = {}
+    arrivals_by_step = {}
+    for index, profile in enumerate(all_profiles):
+        arrivals_by_step.setdefault(profile["arrival_time"], []).append(index)
+
+    # Trace statistics are computed once for the whole corpus and looked up by trace row
+    if feature_store is None:
+        feature_store, trace_index = TraceFeatureStore.from_profiles(all_profiles, step_duration_sec=step_duration_sec)
+    if getattr(scheduler, "feature_store", False) is None:
+        scheduler.feature_store = feature_store
+    if vm_selection is not None and vm_selection.feature_store is None:
+        vm_selection.feature_store = feature_store
+    trace_of = {}
 
     print("Start 24-hour simulation with dynamic VM management...\n")
 
     for t in range(time_steps):
-        # Step 1: Add VMs arriving at this time
-        for profile in [p for p in all_profiles if p["arrival_time"] == t]:
-            vm = vm_objects[profile["vm_id"]]
-            cpu_ratio = profile["cpu_utilization"][t]
-            vm.cloudlet.set_cpu_demand_ratio(cpu_ratio, current_time)
-            vm.cloudlet.trace_mean = np.mean(profile["cpu_utilization"])
-            expiration_step = t + profile["lifetime"]
-            success = scheduler.schedule_vm(vm)
-            if success:
-                active_vms.append((vm, expiration_step))
-            else:
-                print(f"[Step {t}] VM {vm.vm_id} could not be scheduled.")
-
-        # Step 2: Update running VMs and remove expired
-        remaining_vms = []
-        for vm, exp in active_vms:
-            if t >= exp:
-                for host in hosts:
-                    if vm in host.vms:
-                        host.deallocate_vm(vm.vm_id)
-                        break
-            else:
-                profile = next(p for p in all_profiles if p["vm_id"] == vm.vm_id)
-                cpu_ratio = profile["cpu_utilization"][t]
-                vm.cloudlet.set_cpu_demand_ratio(cpu_ratio, current_time)
-                remaining_vms.append((vm, exp))
-        active_vms = remaining_vms
+        arrivals = []
+        for index in arrivals_by_step.pop(t, []):
+            profile = all_profiles[index]
+            vm_type = vm_types[index]
+            vm_objects[profile["vm_id"]] = pool.acquire(
+                profile["vm_id"], cpu=VM_MIPS[vm_type] * VM_PES[vm_type], ram=VM_RAM[vm_type], storage=VM_SIZE
+            )
+            profiles_by_id.setdefault(profile["vm_id"], profile)
+            trace_of[profile["vm_id"]] = int(trace_index[index])
+            arrivals.append(profile)
+
+        energy, active_vms, rejected = run_step(
+            t, current_time, arrivals, active_vms, vm_objects, profiles_by_id,
+            hosts, scheduler, host_utilization_history,
+            step_duration_sec=step_duration_sec, migrate_fn=migrate_fn, metrics=metrics,
+            features=(feature_store, trace_of), ledger=ledger, detector=detector,
+            vm_selection=vm_selection
+        )
+        total_energy_joules += energy
         num_active_vm.append(len(active_vms))
 
-        # Step 3: Power + utilization update
-        for host in hosts:
-            power = host.power_consumption()
-            energy = power * step_duration_sec
-            total_energy_joules += energy
-            host_utilization_history[host.host_id].append(host.base_cpu_utilization())
-            print(f"[{host.host_id}] Step {t:03d} | CPU Util: {host.base_cpu_utilization():.2f} | Power: {power:.2f} W | Energy: {energy:.2f} J")
+        # Release VMs that expired or were rejected this step
+        still_active = {vm.vm_id for vm, _ in active_vms}
+        rejected_ids = {vm.vm_id for vm in rejected}
+        if vm_stats is not None:
+            vm_stats.rejected += len(rejected_ids)
+        for vm_id in [v for v in vm_objects if v not in still_active]:
+            trace_of.pop(vm_id, None)
+            _release_vm(vm_objects.pop(vm_id), profiles_by_id.pop(vm_id), t, pool, metrics, vm_stats,
+                        ran=vm_id not in rejected_ids)
+
+        current_time += step_duration_sec
+
+    for vm, _ in active_vms:
+        _release_vm(vm_objects.pop(vm.vm_id), profiles_by_id.pop(vm.vm_id), time_steps, pool, metrics, vm_stats)
+    if getattr(scheduler, "decision_log", None) is not None:
+        scheduler.decision_log.flush()
 
-        # Step 4: Migration or shutdown if idle
-        if migrate_fn == "disable":
+    return total_energy_joules, host_utilization_history, num_active_vm
+
+def _release_vm(vm, profile, departure, pool, metrics, vm_stats, ran=True):
+    if ran:
+        if vm_stats is not None:
+            vm_stats.fold(vm, trace_values(profile["cpu_utilization"]), profile["arrival_time"], departure)
+        if metrics is not None:
+            metrics.fold_vm(vm.vm_id)
+    pool.release(vm)
+
+def run_step(t, current_time, arrivals, active_vms, vm_objects, profiles_by_id, hosts, scheduler,
+             host_utilization_history, step_duration_sec=300, migrate_fn=None, metrics=None, features=None,
+             ledger=None, detector=None, vm_selection=None):
+    """
+    Advance the simulation by one step: place arrivals, expire and update running VMs,
+    account power, then migrate or power off idle hosts.
+
+    :param t: Step index
+    :param current_time: Simulation time in seconds at the start of the step
+    :param arrivals: Profiles of the VMs arriving at this step
+    :param active_vms: List of (vm, expiration_step) for running VMs
+    :param vm_objects: {vm_id: VM}
+    :param profiles_by_id: {vm_id: profile}
+    :param host_utilization_history: {host_id: list}, appended to in place, or a (T, H) array whose
+                                     row t is written in its dtype
+    :param metrics: Optional sla_metrics.SLAMetrics, updated every step
+    :param features: Optional (TraceFeatureStore, {vm_id: trace row}); trace statistics of arriving
+                     VMs are then looked up instead of computed from their profile
+    :param ledger: Optional energy_ledger.EnergyLedger, booked every step
+    :param detector: Optional overload_detection.OverloadDetector used by the default migration
+    :param vm_selection: Optional vm_selection.VMSelection used with the detector
+    :return: (energy of the step in Joules, updated active_vms, VMs that could not be scheduled)
+    """
+    step_energy_joules = 0.0
+    rejected = []
+    decision_log = getattr(scheduler, "decision_log", None)
+    if decision_log is not None:
+        decision_log.step = t
+    if vm_selection is not None:
+        vm_selection.step = t
+    if ledger is not None:
+        ledger.step = t
+        was_active = [host.active for host in hosts]
+
+    # Step 1: Add VMs arriving at this time
+    for profile in arrivals:
+        vm = vm_objects[profile["vm_id"]]
+        cpu_ratio = trace_value(profile["cpu_utilization"], t)
+        vm.cloudlet.set_cpu_demand_ratio(cpu_ratio, current_time)
+        if features is not None:
+            feature_store, trace_of = features
+            vm.cloudlet.trace_index = trace_of[profile["vm_id"]]
+            vm.cloudlet.trace_mean = feature_store["mean"][vm.cloudlet.trace_index]
+        else:
+            vm.cloudlet.trace_mean = np.mean(trace_values(profile["cpu_utilization"]))
+        expiration_step = t + profile["lifetime"]
+        success = scheduler.schedule_vm(vm)
+        if success:
+            active_vms.append((vm, expiration_step))
+        else:
+            rejected.append(vm)
+            print(f"[Step {t}] VM {vm.vm_id} could not be scheduled.")
+    if ledger is not None:
+        for host, before in zip(hosts, was_active):
+            if host.active and not before:
+                ledger.record_boot(host)
+
+    # Step 2: Update running VMs and remove expired
+    remaining_vms = []
+    for vm, exp in active_vms:
+        if t >= exp:
             for host in hosts:
-                if host.active and len(host.vms) == 0:
-                    host.power_off()
-                    print(f"[Step {t:03d}] Host {host.host_id} is idle and powered off.")
-        elif migrate_fn is not None:
-            migrate_fn(hosts, current_time)
+                if vm in host.vms:
+                    host.deallocate_vm(vm.vm_id)
+                    break
         else:
-            migrate_vms(hosts, current_time)
+            profile = profiles_by_id[vm.vm_id]
+            cpu_ratio = trace_value(profile["cpu_utilization"], t)
+            vm.cloudlet.set_cpu_demand_ratio(cpu_ratio, current_time)
+            remaining_vms.append((vm, exp))
+    active_vms = remaining_vms
 
-        current_time += step_duration_sec
+    # Step 3: Power + utilization update
+    host_power = {}
+    by_host = isinstance(host_utilization_history, dict)
+    for host in hosts:
+        power = host.power_consumption()
+        energy = power * step_duration_sec
+        step_energy_joules += energy
+        host_power[host.host_id] = power
+        if by_host:
+            host_utilization_history[host.host_id].append(host.base_cpu_utilization())
+        if metrics is not None:
+            metrics.record_host_step(host, step_duration_sec)
+        print(f"[{host.host_id}] Step {t:03d} | CPU Util: {host.base_cpu_utilization():.2f} | Power: {power:.2f} W | Energy: {energy:.2f} J")
+    if not by_host:
+        host_utilization_history[t] = encode_utilization([host.base_cpu_utilization() for host in hosts],
+                                                         host_utilization_history.dtype.name)
+    if ledger is not None:
+        ledger.record_hosts(hosts, list(host_power.values()), step_duration_sec)
 
-    return total_energy_joules, host_utilization_history, num_active_vm
+    # Rack overhead power and per-rack energy, and fresh aggregates for the next placements
+    topology = getattr(scheduler, "topology", None)
+    if topology is not None:
+        step_energy_joules += topology.account_step(host_power, step_duration_sec)
+        topology.refresh()
 
-def migrate_vms(hosts, current_time):
+    # Step 4: Migration or shutdown if idle
+    if migrate_fn == "disable":
+        for host in hosts:
+            if host.active and len(host.vms) == 0:
+                host.power_off()
+                if decision_log is not None:
+                    decision_log.power_off(host)
+                print(f"[Step {t:03d}] Host {host.host_id} is idle and powered off.")
+    elif migrate_fn is not None:
+        migrate_fn(hosts, current_time)
+    else:
+        migrate_vms(hosts, current_time, metrics, decision_log, ledger, detector, vm_selection)
+
+    return step_energy_joules, active_vms, rejected
+
+def migrate_vms(hosts, current_time, metrics=None, decision_log=None, ledger=None, detector=None,
+                vm_selection=None):
+    if detector is not None:
+        return migrate_adaptive(hosts, current_time, detector, metrics, decision_log, ledger, vm_selection)
     current_util_map = {h.host_id: h.base_cpu_utilization() for h in hosts}
     underutilized_hosts = sorted(
         [h for h in hosts if current_util_map[h.host_id] < 0.2 and h.active],
@@ -82,16 +238,23 @@ def migrate_vms(hosts, current_time):
         key=lambda h: current_util_map[h.host_id]
     )
     projected_util_map = current_util_map.copy()
+    # CPU is judged on projected utilization; RAM and storage must fit the target's capacity
+    capacity = CapacityModel.attach(hosts)
+    non_cpu = capacity.dims(exclude=("cpu",))
+    pending = np.zeros_like(capacity.free)
 
     for src_host in underutilized_hosts:
         src_vms = src_host.vms[:]
         vm_to_target_map = {}
+        pending.fill(0.0)
         for vm in src_vms:
             placed = False
             for target in non_underutilized_hosts + [h for h in hosts if h.active and h != src_host and h not in non_underutilized_hosts]:
-                if projected_util_map[target.host_id] + vm.cpu / target.base_core_capacity <= 0.8:
+                if projected_util_map[target.host_id] + vm.cpu / target.base_core_capacity <= 0.8 and \
+                        capacity.fits(target, vm, non_cpu, pending):
                     vm_to_target_map[vm.vm_id] = target
                     projected_util_map[target.host_id] += vm.cpu / target.base_core_capacity
+                    pending[target.capacity_row] += capacity.demand(vm)
                     placed = True
                     break
             if not placed:
@@ -104,30 +267,146 @@ def migrate_vms(hosts, current_time):
                 src_host.deallocate_vm(vm.vm_id)
                 target = vm_to_target_map[vm.vm_id]
                 target.allocate_vm(vm)
+                if metrics is not None:
+                    metrics.record_migration(vm)
+                if decision_log is not None:
+                    decision_log.migrate(vm, src_host, target)
+                if ledger is not None:
+                    ledger.record_migration(vm, src_host, target)
             src_host.power_off()
+            if decision_log is not None:
+                decision_log.power_off(src_host)
             print(f"[Step {int(current_time/300):03d}] Host {src_host.host_id} underutilized. All VMs migrated. Host powered off.")
 
-def plot_utilization(profiles, host_utilization_history, time_steps=288):
-    time_axis = [i * 5 for i in range(time_steps)]
+def _move_vm(vm, src_host, dst_host, metrics=None, decision_log=None, ledger=None):
+    src_host.deallocate_vm(vm.vm_id)
+    dst_host.allocate_vm(vm)
+    if metrics is not None:
+        metrics.record_migration(vm)
+    if decision_log is not None:
+        decision_log.migrate(vm, src_host, dst_host)
+    if ledger is not None:
+        ledger.record_migration(vm, src_host, dst_host)
+
+def migrate_adaptive(hosts, current_time, detector, metrics=None, decision_log=None, ledger=None,
+                     vm_selection=None):
+    """
+    Dynamic consolidation driven by an overload_detection.OverloadDetector. The hosts' base
+    utilization is pushed into the detector, then
+      1. VMs leave each overloaded host in the order vm_selection gives (most recently placed
+         first without one) until the host is back under the detector's threshold (for lr, until
+         the predicted utilization is);
+      2. each underloaded host is emptied, all or nothing, and powered off.
+    As in CloudSim's power-aware allocation, CPU is judged on demand: a target must stay under its
+    own threshold with the VM's current demand added (over the whole host's base capacity, where
+    migrate_vms charges the VM's size over one core), and the capacity model must have room for the
+    VM's other resources. The fullest such host is taken. VMs leaving an overloaded host may power on a sleeping host.
+
+    :param detector: OverloadDetector over hosts, in the same order
+    :param vm_selection: Optional vm_selection.VMSelection
+    """
+    step = int(current_time / 300)
+    util = np.array([host.base_cpu_utilization() for host in hosts])
+    detector.push(util)
+    active = np.array([host.active for host in hosts], dtype=bool)
+    overloaded = detector.overloaded(util) & active
+    underloaded = detector.underloaded(util) & active & ~overloaded
+    excess = detector.excess(util)
+    upper = detector.upper_threshold()
+    projected = util.copy()
+    closed = overloaded.copy()      # Hosts that may not receive VMs
+    capacity = CapacityModel.attach(hosts)
+    non_cpu = capacity.dims(exclude=("cpu",))
+    pending = np.zeros_like(capacity.free)      # Promised to hosts by a consolidation plan
+    base_capacity = np.array([host.base_cpu_capacity for host in hosts], dtype=np.float64)
+
+    def find_target(vm, src, allow_boot=False):
+        fits = (projected + vm.cpu_demand() / base_capacity <= upper) & capacity.feasible(vm, non_cpu, pending)
+        fits[src] = False
+        candidates = np.flatnonzero(fits & active & ~closed)
+        if len(candidates):
+            return candidates[np.argmax(projected[candidates])]
+        sleeping = np.flatnonzero(fits & ~active)
+        if allow_boot and len(sleeping):
+            k = sleeping[0]
+            hosts[k].power_on()
+            active[k] = True
+            if ledger is not None:
+                ledger.record_boot(hosts[k])
+            return k
+        return None
+
+    # Relieve overloaded hosts, all of their VM orders computed together
+    relieve = np.nonzero(overloaded)[0]
+    if vm_selection is not None:
+        orders = vm_selection.order([hosts[src] for src in relieve])
+    else:
+        orders = [src_host.vms[::-1] for src_host in (hosts[src] for src in relieve)]
+    for src, candidates in zip(relieve, orders):
+        src_host = hosts[src]
+        shed = 0.0
+        for vm in candidates:
+            if shed >= excess[src]:
+                break
+            k = find_target(vm, src, allow_boot=True)
+            if k is None:
+                print(f"[Step {step:03d}] Host {src_host.host_id} overloaded, no target for VM {vm.vm_id}.")
+                break
+            cost = vm.cpu_demand() / src_host.base_cpu_capacity
+            shed += cost
+            projected[src] -= cost
+            projected[k] += vm.cpu_demand() / hosts[k].base_cpu_capacity
+            _move_vm(vm, src_host, hosts[k], metrics, decision_log, ledger)
+            underloaded[k] = False
+        print(f"[Step {step:03d}] Host {src_host.host_id} overloaded. Shed {shed:.2f} of its capacity.")
+
+    # Consolidate underloaded hosts, least utilized first
+    for src in sorted(np.nonzero(underloaded)[0], key=lambda h: util[h]):
+        src_host = hosts[src]
+        closed[src] = True
+        plan = []
+        pending.fill(0.0)
+        for vm in src_host.vms:
+            k = find_target(vm, src)
+            if k is None:
+                break
+            projected[k] += vm.cpu_demand() / hosts[k].base_cpu_capacity
+            pending[k] += capacity.demand(vm)
+            plan.append((vm, k))
+        pending.fill(0.0)
+        if len(plan) < len(src_host.vms):
+            for vm, k in plan:
+                projected[k] -= vm.cpu_demand() / hosts[k].base_cpu_capacity
+            closed[src] = False
+            print(f"[Step {step:03d}] Host {src_host.host_id} cannot migrate all VMs — skipping.")
+            continue
+        for vm, k in plan:
+            _move_vm(vm, src_host, hosts[k], metrics, decision_log, ledger)
+        projected[src] = 0.0
+        active[src] = False
+        src_host.power_off()
+        if decision_log is not None:
+            decision_log.power_off(src_host)
+        print(f"[Step {step:03d}] Host {src_host.host_id} underutilized. All VMs migrated. Host powered off.")
+
+def plot_utilization(profiles, host_utilization_history, time_steps=288, max_host_lines=20):
+    time_axis = np.arange(time_steps) * 5
 
     plt.figure(figsize=(14, 6))
 
     for idx in np.random.choice(len(profiles), size=min(20, len(profiles)), replace=False):
         profile = profiles[idx]
         arrival_time = profile["arrival_time"]
-        lifetime = profile["lifetime"]
-        departure_time = arrival_time + lifetime
-        utilization_trace = profile["cpu_utilization"]
-        masked_util = [
-            u if arrival_time <= t < departure_time else np.nan
-            for t, u in enumerate(utilization_trace)
-        ]
+        departure_time = arrival_time + profile["lifetime"]
+        masked_util = np.asarray(trace_values(profile["cpu_utilization"][:time_steps]), dtype=np.float64)
+        steps = np.arange(len(masked_util))
+        masked_util = np.where((steps >= arrival_time) & (steps < departure_time), masked_util, np.nan)
 
         valid_points = np.count_nonzero(~np.isnan(masked_util))
         if valid_points == 1:
-            plt.plot(time_axis, masked_util, 'm+', label=f"VM {profile['vm_id']} (1 point)")
+            plt.plot(time_axis[:len(masked_util)], masked_util, 'm+', label=f"VM {profile['vm_id']} (1 point)")
         else:
-            plt.plot(time_axis, masked_util, label=f"VM {profile['vm_id']}", alpha=0.7)
+            plt.plot(time_axis[:len(masked_util)], masked_util, label=f"VM {profile['vm_id']}", alpha=0.7)
 
     plt.title("CPU Utilization of Random 20 VMs Over 24 Hours")
     plt.xlabel("Time (minutes)")
@@ -137,13 +416,25 @@ def plot_utilization(profiles, host_utilization_history, time_steps=288):
     plt.legend(ncol=4, fontsize='small', loc='upper center', bbox_to_anchor=(0.5, -0.15))
     plt.show()
 
+    # Beyond a handful of hosts, one line per host is unreadable: show aggregate views instead
+    values, host_ids = history_array(host_utilization_history)
+    if len(host_ids) > max_host_lines:
+        fig, (ax_bands, ax_heat) = plt.subplots(2, 1, figsize=(14, 10))
+        plot_percentile_bands(ax_bands, host_utilization_history)
+        ax_bands.set_title("CPU Utilization Percentiles Across Hosts Over 24 Hours")
+        plot_host_heatmap(ax_heat, host_utilization_history)
+        ax_heat.set_title("CPU Utilization of Hosts Over 24 Hours")
+        fig.tight_layout()
+        plt.show()
+        return
+
     plt.figure(figsize=(14, 6))
-    for host_id, util_trace in host_utilization_history.items():
-        plt.plot(time_axis, util_trace, label=host_id, alpha=0.8)
+    for host_id, util_trace in zip(host_ids, values.T):
+        plt.plot(time_axis[:len(util_trace)], util_trace, label=host_id, alpha=0.8)
     plt.title("CPU Utilization of Hosts Over 24 Hours")
     plt.xlabel("Time (minutes)")
     plt.ylabel("CPU Utilization (0–1)")
     plt.grid(True)
     plt.tight_layout()
     plt.legend(ncol=4, fontsize='small', loc='upper center', bbox_to_anchor=(0.5, -0.15))
-    plt.show()
\ No newline at end of file
+    plt.show()
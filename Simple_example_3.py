@@ -88,7 +88,7 @@ while True:
         if all(cl.finished for cl in vm.cloudlets):
             for host in hosts:
                 if vm in host.vms:
-                    host.vms.remove(vm)
+                    host.deallocate_vm(vm.vm_id)
                     print(f"[Time {current_time:.1f}s] VM {vm.vm_id} deallocated from Host {host.host_id}")
                     break
             active_vms.remove(vm)
@@ -0,0 +1,152 @@
+# capacity_model.py
+#
+# Multi-resource admission control shared by placement and migration. Each host has a limit and
+# a free amount for each of R resources (CPU, RAM and storage reservations by default), kept as
+# (H, R) arrays and updated by Host.allocate_vm / deallocate_vm. Whether a VM fits on every host
+# is then one broadcasted comparison, and a batch of VMs is a (V, H) one, instead of summing the
+# VMs of each host per check. Another dimension (network bandwidth, GPUs as counts) is one more
+# entry in the resources mapping and costs one more column, not another pass over the VMs.
+
+import numpy as np
+
+# name -> (host limit, VM demand)
+RESOURCES = {
+    "cpu": (lambda host: host.base_cpu_capacity * host.cpu_oversub, lambda vm: vm.cpu),
+    "ram": (lambda host: host.ram_capacity * host.ram_oversub, lambda vm: vm.ram),
+    "storage": (lambda host: host.storage_capacity * host.storage_oversub, lambda vm: vm.storage),
+}
+
+
+class CapacityModel:
+    def __init__(self, hosts, resources=None):
+        """
+        Attach the hosts (Host.capacity_model / capacity_row) and book the VMs they already hold.
+        A host reports to one model at a time; use attach to share the model of a host list.
+
+        :param hosts: Hosts, in the order of the rows
+        :param resources: {name: (host limit function, VM demand function)}, defaults to RESOURCES
+        """
+        self.hosts = hosts
+        self.resources = dict(resources or RESOURCES)
+        self.names = list(self.resources)
+        self.index = {name: k for k, name in enumerate(self.names)}
+        self._vm_demand = [demand for _, demand in self.resources.values()]
+        self.limit = np.array([[limit(host) for limit, _ in self.resources.values()] for host in hosts],
+                              dtype=np.float64).reshape(len(hosts), len(self.names))
+        self.free = self.limit.copy()
+        for row, host in enumerate(hosts):
+            host.capacity_model = self
+            host.capacity_row = row
+            for vm in host.vms:
+                self.free[row] -= self.demand(vm)
+
+    @classmethod
+    def attach(cls, hosts, resources=None):
+        """
+        The model the hosts already share, in this order, or a new one over them.
+        """
+        model = getattr(hosts[0], "capacity_model", None) if hosts else None
+        if (model is not None and resources is None and len(model.hosts) == len(hosts) and
+                all(a is b for a, b in zip(model.hosts, hosts))):
+            return model
+        return cls(hosts, resources)
+
+    def dims(self, *names, exclude=()):
+        """
+        Column indices of the named resources (all of them by default) minus those in exclude.
+        """
+        return np.array([self.index[name] for name in (names or self.names) if name not in exclude],
+                        dtype=np.int64)
+
+    # ---------- Demand and bookkeeping ----------
+
+    def demand(self, vm):
+        return np.array([demand(vm) for demand in self._vm_demand], dtype=np.float64)
+
+    def demands(self, vms):
+        """
+        (V, R) demand of a batch of VMs.
+        """
+        return np.array([[demand(vm) for demand in self._vm_demand] for vm in vms],
+                        dtype=np.float64).reshape(len(vms), len(self.names))
+
+    def add(self, host, vm):
+        self.free[host.capacity_row] -= self.demand(vm)
+
+    def remove(self, host, vm):
+        self.free[host.capacity_row] += self.demand(vm)
+
+    def used(self, host, name):
+        row, k = host.capacity_row, self.index[name]
+        return self.limit[row, k] - self.free[row, k]
+
+    # ---------- Feasibility ----------
+
+    def feasible(self, vm, dims=None, pending=None):
+        """
+        (H,) bool, whether the VM fits on each host.
+
+        :param dims: Column indices to check (see dims), all by default
+        :param pending: Optional (H, R) demand already promised to hosts but not yet allocated
+        """
+        free = self.free if pending is None else self.free - pending
+        demand = self.demand(vm)
+        if dims is not None:
+            free, demand = free[:, dims], demand[dims]
+        return (free >= demand).all(axis=1)
+
+    def feasible_batch(self, vms, dims=None):
+        """
+        (V, H) bool, whether each VM fits on each host on its own.
+        """
+        free, demand = self.free, self.demands(vms)
+        if dims is not None:
+            free, demand = free[:, dims], demand[:, dims]
+        return (free[None, :, :] >= demand[:, None, :]).all(axis=2)
+
+    def fits(self, host, vm, dims=None, pending=None):
+        """
+        Whether the VM fits on one host, O(R).
+        """
+        free = self.free[host.capacity_row]
+        if pending is not None:
+            free = free - pending[host.capacity_row]
+        demand = self.demand(vm)
+        if dims is not None:
+            free, demand = free[dims], demand[dims]
+        return bool((free >= demand).all())
+
+
+if __name__ == "__main__":
+    import time
+
+    from Helper import create_host_list, create_vm_list
+    import ComprehensiveExperiment_FinalReport as experiment
+
+    experiment.block_print()
+    hosts = create_host_list(2000)
+    vms = create_vm_list(200)
+    model = CapacityModel(hosts)
+    for k, vm in enumerate(vms[:100]):
+        hosts[k % len(hosts)].allocate_vm(vm)
+    experiment.enable_print()
+
+    def summed_check(host, vm):
+        # Host.can_host_vm without a model
+        return (sum(v.cpu for v in host.vms) + vm.cpu <= host.base_cpu_capacity * host.cpu_oversub and
+                sum(v.ram for v in host.vms) + vm.ram <= host.ram_capacity * host.ram_oversub and
+                sum(v.storage for v in host.vms) + vm.storage <= host.storage_capacity * host.storage_oversub)
+
+    start = time.perf_counter()
+    by_sum = [[summed_check(host, vm) for host in hosts] for vm in vms[100:]]
+    summed = time.perf_counter() - start
+    start = time.perf_counter()
+    by_model = [model.feasible(vm) for vm in vms[100:]]
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = model.feasible_batch(vms[100:])
+    batched = time.perf_counter() - start
+
+    assert (np.array(by_sum) == np.array(by_model)).all() and (batch == np.array(by_model)).all()
+    print(f"100 VMs x {len(hosts)} hosts: per-host checks {summed * 1000:.1f} ms, "
+          f"per-VM vectors {single * 1000:.1f} ms, one batch {batched * 1000:.1f} ms")
@@ -1,4 +1,7 @@
 # datacenter.py
+import heapq
+import itertools
+from collections import deque
 
 class Host:
     def __init__(self, host_id, num_cores, core_capacity, ram_capacity, storage_capacity,
@@ -19,6 +22,9 @@ class Host:
         self.vms = []
         self.active = True
         self.dvfs_enabled = False  # DVFS is disenabled by default
+        self.rack = None  # Set when the host is part of a DatacenterTopology
+        self.capacity_model = None  # Set when a capacity_model.CapacityModel tracks the host
+        self.capacity_row = None
 
         # Power model (can be updated via DVFS)
         self.power_idle = power_idle
@@ -38,32 +44,46 @@ class Host:
     def cpu_capacity(self):
         return self.num_cores * self.core_capacity
 
-    def cpu_utilization(self):
+    def cpu_demand(self):
+        """
+        MIPS requested by the hosted VMs, which may exceed the capacity of the host.
+        """
         total_demand = 0.0
         for vm in self.vms:
-            for cl in vm.cloudlets:
-                if not cl.finished:
-                    total_demand += vm.cpu * cl.cpu_demand_ratio
-        return min(total_demand / self.cpu_capacity, 1.0)
+            total_demand += vm.cpu_demand()
+        return total_demand
+
+    def cpu_utilization(self):
+        return min(self.cpu_demand() / self.cpu_capacity, 1.0)
     
     def base_cpu_utilization(self):
-        total_demand = 0.0
-        for vm in self.vms:
-            for cl in vm.cloudlets:
-                if not cl.finished:
-                    total_demand += vm.cpu * cl.cpu_demand_ratio
-        return min(total_demand / self.base_cpu_capacity, 1.0)
+        return min(self.cpu_demand() / self.base_cpu_capacity, 1.0)
 
     def power_consumption(self):
+        return self.power_at_demand(self.cpu_demand())
+
+    def power_at_demand(self, demand):
+        """
+        Power draw (W) for a given total VM demand in MIPS, applying DVFS first if enabled.
+        Lets replays evaluate the power model without VM objects on the host.
+        """
         if self.dvfs_enabled:
-            self.update_dvfs()
-        u = self.cpu_utilization()
+            self.update_dvfs(min(demand / self.base_cpu_capacity, 1.0))
+        u = min(demand / self.cpu_capacity, 1.0)
         if not self.active and u == 0:
             return 0.0
         if self.power_function:
             return self.power_function(u)
         return self.power_idle + (self.power_max - self.power_idle) * u
 
+    def idle_power(self):
+        """
+        Power draw (W) at zero utilization at the current DVFS level.
+        """
+        if self.power_function:
+            return self.power_function(0.0)
+        return self.power_idle
+
     def apply_dvfs_level(self, level):
         """
         Manually set DVFS level.
@@ -78,11 +98,12 @@ class Host:
         else:
             print(f"[DVFS] Invalid level {level} for Host {self.host_id}")
 
-    def update_dvfs(self):
+    def update_dvfs(self, util=None):
         """
-        Auto-adjust DVFS level based on CPU utilization.
+        Auto-adjust DVFS level based on CPU utilization (computed from the VMs if not given).
         """
-        util = self.base_cpu_utilization()
+        if util is None:
+            util = self.base_cpu_utilization()
         # If an external DVFS update rule is provided, use it.
         if self.dvfs_rule_function:
             new_level = self.dvfs_rule_function(util)
@@ -127,6 +148,10 @@ class Host:
         # if self.active and self.can_host_vm(vm):
         if self.active:
             self.vms.append(vm)
+            if self.capacity_model is not None:
+                self.capacity_model.add(self, vm)
+            if self.rack is not None:
+                self.rack.host_changed(self)
             print(f"VM {vm.vm_id} allocated to Host {self.host_id}.")
         else:
             print(f"Host {self.host_id} cannot allocate VM {vm.vm_id}.")
@@ -135,11 +160,17 @@ class Host:
         for vm in self.vms:
             if vm.vm_id == vm_id:
                 self.vms.remove(vm)
+                if self.capacity_model is not None:
+                    self.capacity_model.remove(self, vm)
+                if self.rack is not None:
+                    self.rack.host_changed(self)
                 print(f"VM {vm_id} deallocated from Host {self.host_id}.")
                 return
         print(f"VM {vm_id} not found on Host {self.host_id}.")
 
     def can_host_vm(self, vm):
+        if self.capacity_model is not None:
+            return self.capacity_model.fits(self, vm)
         total_cpu = sum(v.cpu for v in self.vms)
         total_ram = sum(v.ram for v in self.vms)
         total_storage = sum(v.storage for v in self.vms)
@@ -148,6 +179,8 @@ class Host:
                 total_storage + vm.storage <= self.storage_capacity * self.storage_oversub)
 
     def remaining_cpu(self):
+        if self.capacity_model is not None:
+            return self.base_cpu_capacity - self.capacity_model.used(self, "cpu")
         used_cpu = sum(v.cpu for v in self.vms)
         return self.base_cpu_capacity - used_cpu
 
@@ -157,8 +190,228 @@ class Host:
                 f"Storage: {self.storage_capacity} GB")
 
 
+class TopologyNode:
+    def __init__(self, name, level, children=None, hosts=None, overhead_power=0.0):
+        """
+        A cluster or rack of a DatacenterTopology. Each node keeps aggregate free capacity and
+        utilization bounds over its subtree, so a search can skip subtrees that cannot fit a VM
+        or cannot beat the best host found so far.
+
+        :param name: Node name, e.g. "cluster0/rack3"
+        :param level: "root", "cluster" or "rack"
+        :param children: Child nodes (clusters and the root)
+        :param hosts: Hosts (racks only)
+        :param overhead_power: Constant power of the rack's PDU / top-of-rack switch, drawn while any host is on
+        """
+        self.name = name
+        self.level = level
+        self.children = children or []
+        self.hosts = hosts or []
+        self.overhead_power = overhead_power
+        self.parent = None
+        self.energy_joules = 0.0  # Hosts plus overhead, racks only
+        self.host_stats = {}
+        for child in self.children:
+            child.parent = self
+
+    @staticmethod
+    def stats_of(host):
+        """
+        Per-host values the scheduler policies rank by.
+        """
+        used_cpu = sum(v.cpu for v in host.vms)
+        used_ram = sum(v.ram for v in host.vms)
+        used_storage = sum(v.storage for v in host.vms)
+        return {
+            "free_cpu": host.base_cpu_capacity * host.cpu_oversub - used_cpu,
+            "free_ram": host.ram_capacity * host.ram_oversub - used_ram,
+            "free_storage": host.storage_capacity * host.storage_oversub - used_storage,
+            "remaining_cpu": host.base_cpu_capacity - used_cpu,
+            "free_ram_capacity": host.ram_capacity - used_ram,
+            "util": host.cpu_utilization(),
+        }
+
+    def recompute(self):
+        """
+        Rebuild this node's aggregates from its hosts (rack) or children (cluster/root).
+        """
+        if self.level == "rack":
+            stats = list(self.host_stats.values())
+            indices = [h.topology_index for h in self.hosts]
+        else:
+            stats = [c.aggregate for c in self.children]
+            indices = [c.min_index for c in self.children]
+        self.min_index = min(indices) if indices else float("inf")
+        if not stats:
+            self.aggregate = None
+            return
+        if self.level == "rack":
+            self.aggregate = {
+                "max_free_cpu": max(st["free_cpu"] for st in stats),
+                "max_free_ram": max(st["free_ram"] for st in stats),
+                "max_free_storage": max(st["free_storage"] for st in stats),
+                "min_remaining_cpu": min(st["remaining_cpu"] for st in stats),
+                "max_remaining_cpu": max(st["remaining_cpu"] for st in stats),
+                "max_free_ram_capacity": max(st["free_ram_capacity"] for st in stats),
+                "min_util": min(st["util"] for st in stats),
+                "max_util": max(st["util"] for st in stats),
+            }
+        else:
+            stats = [st for st in stats if st is not None]
+            self.aggregate = {
+                key: (min if key.startswith("min") else max)(st[key] for st in stats)
+                for key in stats[0]
+            } if stats else None
+
+    def host_changed(self, host):
+        """
+        Refresh one host's stats and the aggregates on the path to the root.
+        """
+        self.host_stats[host.host_id] = self.stats_of(host)
+        node = self
+        while node is not None:
+            node.recompute()
+            node = node.parent
+
+    def can_fit(self, vm):
+        agg = self.aggregate
+        return (agg is not None and
+                vm.cpu <= agg["max_free_cpu"] and
+                vm.ram <= agg["max_free_ram"] and
+                vm.storage <= agg["max_free_storage"])
+
+    def power_consumption(self):
+        """
+        Rack power: its hosts plus the overhead while any host is on.
+        """
+        host_power = sum(h.power_consumption() for h in self.hosts)
+        return host_power + (self.overhead_power if any(h.active for h in self.hosts) else 0.0)
+
+
+class DatacenterTopology:
+    # For each policy: (key of a host, lower bound of that key over a subtree's aggregate).
+    # Keys are minimized; ties go to the lowest host index, as min()/max() over the flat host list do.
+    POLICY_KEYS = {
+        "first_fit": (lambda host, st, vm: 0.0,
+                      lambda agg, vm: 0.0),
+        "least_utilized": (lambda host, st, vm: host.cpu_utilization(),
+                           lambda agg, vm: agg["min_util"]),
+        "most_utilized": (lambda host, st, vm: -host.cpu_utilization(),
+                          lambda agg, vm: -agg["max_util"]),
+        "best_fit": (lambda host, st, vm: st["remaining_cpu"] - vm.cpu,
+                     lambda agg, vm: agg["min_remaining_cpu"] - vm.cpu),
+        "worst_fit": (lambda host, st, vm: -(st["remaining_cpu"] - vm.cpu),
+                      lambda agg, vm: -(agg["max_remaining_cpu"] - vm.cpu)),
+        "most_free_ram": (lambda host, st, vm: -st["free_ram_capacity"],
+                          lambda agg, vm: -agg["max_free_ram_capacity"]),
+    }
+
+    def __init__(self, hosts, hosts_per_rack=40, racks_per_cluster=16, rack_overhead_power=0.0):
+        """
+        Cluster -> rack -> host hierarchy over a host list, filled in host list order.
+
+        :param hosts: list of Host objects
+        :param hosts_per_rack: Hosts per rack
+        :param racks_per_cluster: Racks per cluster
+        :param rack_overhead_power: PDU / top-of-rack switch power per rack in Watts
+        """
+        self.hosts = hosts
+        self.racks = []
+        for i, host in enumerate(hosts):
+            host.topology_index = i
+        for r, start in enumerate(range(0, len(hosts), hosts_per_rack)):
+            cluster_id = r // racks_per_cluster
+            rack = TopologyNode(f"cluster{cluster_id}/rack{r}", "rack",
+                                hosts=hosts[start:start + hosts_per_rack],
+                                overhead_power=rack_overhead_power)
+            for host in rack.hosts:
+                host.rack = rack
+            self.racks.append(rack)
+
+        self.clusters = [
+            TopologyNode(f"cluster{c}", "cluster", children=self.racks[start:start + racks_per_cluster])
+            for c, start in enumerate(range(0, len(self.racks), racks_per_cluster))
+        ]
+        self.root = TopologyNode("datacenter", "root", children=self.clusters)
+        self.refresh()
+
+    def refresh(self):
+        """
+        Recompute every host's stats and all aggregates, O(H). Needed once per step, since
+        utilization also changes when cloudlet demand or DVFS levels change.
+        """
+        for rack in self.racks:
+            rack.host_stats = {h.host_id: TopologyNode.stats_of(h) for h in rack.hosts}
+            rack.recompute()
+        for cluster in self.clusters:
+            cluster.recompute()
+        self.root.recompute()
+
+    def iter_candidates(self, vm):
+        """
+        Yield hosts that can host the VM in host order, skipping racks and clusters that cannot fit it.
+        """
+        for cluster in self.clusters:
+            if not cluster.can_fit(vm):
+                continue
+            for rack in cluster.children:
+                if not rack.can_fit(vm):
+                    continue
+                for host in rack.hosts:
+                    if host.can_host_vm(vm):
+                        yield host
+
+    def select_host(self, vm, policy):
+        """
+        Branch-and-bound search for the host a SchedulerVM policy would pick from the flat list.
+        Subtrees that cannot fit the VM, or whose bound cannot beat the best host so far, are pruned.
+        """
+        key_fn, bound_fn = self.POLICY_KEYS[policy]
+        best = [None, None]  # [(key, host index), host]
+
+        def visit(node):
+            if not node.can_fit(vm):
+                return
+            if best[0] is not None and (bound_fn(node.aggregate, vm), node.min_index) >= best[0]:
+                return
+            if node.level == "rack":
+                for host in node.hosts:
+                    if host.can_host_vm(vm):
+                        rank = (key_fn(host, node.host_stats[host.host_id], vm), host.topology_index)
+                        if best[0] is None or rank < best[0]:
+                            best[0], best[1] = rank, host
+                return
+            for child in sorted((c for c in node.children if c.aggregate is not None),
+                                key=lambda c: (bound_fn(c.aggregate, vm), c.min_index)):
+                visit(child)
+
+        visit(self.root)
+        return best[1]
+
+    def supports(self, policy):
+        return policy in self.POLICY_KEYS
+
+    def account_step(self, host_power, step_duration_sec):
+        """
+        Add one step of energy to every rack.
+
+        :param host_power: {host_id: power in W} for this step
+        :param step_duration_sec: Step length in seconds
+        :return: Rack overhead energy of the step in Joules (not included in host energy)
+        """
+        overhead_energy = 0.0
+        for rack in self.racks:
+            overhead = rack.overhead_power if any(h.active for h in rack.hosts) else 0.0
+            rack.energy_joules += (sum(host_power[h.host_id] for h in rack.hosts) + overhead) * step_duration_sec
+            overhead_energy += overhead * step_duration_sec
+        return overhead_energy
+
+    def rack_energy(self):
+        return {rack.name: rack.energy_joules for rack in self.racks}
+
+
 class VM:
-    def __init__(self, vm_id, cpu, ram, storage, is_online_service=False):
+    def __init__(self, vm_id, cpu, ram, storage, is_online_service=False, cloudlet_scheduler=None):
         """
         VM represents a virtual machine or container instance.
 
@@ -167,6 +420,8 @@ class VM:
         :param ram: RAM in MB
         :param storage: Storage in GB
         :param is_online_service: Flag indicating whether the VM is for online service
+        :param cloudlet_scheduler: None (every batch cloudlet runs at vm.cpu * cpu_demand_ratio),
+                                   "time_shared" or "space_shared" (see CloudletScheduler)
         """
         self.vm_id = vm_id
         self.cpu = cpu
@@ -175,19 +430,71 @@ class VM:
         self.is_online_service = is_online_service  # Flag to indicate online service
         self.cloudlet = None  # A single cloudlet for online services
         self.cloudlets = []   # Multiple cloudlets for batch workloads
+        self.cloudlet_scheduler = None
+        if cloudlet_scheduler is not None and not is_online_service:
+            self.cloudlet_scheduler = CloudletScheduler(self, mode=cloudlet_scheduler)
 
         if is_online_service:
             # Create a Cloudlet inside the VM if it's for online service
             self.cloudlet = Cloudlet(f"Cloudlet_{vm_id}", length=1e10)  # Can use a large length or define as needed
             self.assign_cloudlet(self.cloudlet)  # Automatically bind the cloudlet
 
-    def assign_cloudlet(self, cloudlet):
+    def reset(self, vm_id, cpu, ram, storage):
+        """
+        Re-initialize a released VM in place for a new arrival (see VMPool).
+        """
+        self.vm_id = vm_id
+        self.cpu = cpu
+        self.ram = ram
+        self.storage = storage
+        self.cloudlets = []
+        if self.cloudlet_scheduler is not None:
+            self.cloudlet_scheduler = CloudletScheduler(self, mode=self.cloudlet_scheduler.mode,
+                                                        num_pes=self.cloudlet_scheduler.num_pes)
+        if self.is_online_service:
+            if self.cloudlet is None:
+                self.cloudlet = Cloudlet(f"Cloudlet_{vm_id}", length=1e10)
+            else:
+                self.cloudlet.reset(f"Cloudlet_{vm_id}", length=1e10)
+            self.assign_cloudlet(self.cloudlet)
+
+    def assign_cloudlet(self, cloudlet, current_time=-1.0):
         """
         Assign a Cloudlet to this VM.
+        With a cloudlet scheduler, the cloudlet is handed to it instead of the cloudlets list.
         """
+        if self.cloudlet_scheduler is not None:
+            cloudlet.assign_to_vm(self, current_time)
+            self.cloudlet_scheduler.submit(cloudlet, max(current_time, 0.0))
+            return
         self.cloudlets.append(cloudlet)
         cloudlet.assign_to_vm(self)
 
+    def cpu_demand(self):
+        """
+        MIPS currently requested by the VM's unfinished cloudlets.
+        """
+        if self.cloudlet_scheduler is not None:
+            return self.cloudlet_scheduler.cpu_demand()
+        total_demand = 0.0
+        for cl in self.cloudlets:
+            if not cl.finished:
+                total_demand += self.cpu * cl.cpu_demand_ratio
+        return total_demand
+
+    def has_unfinished_cloudlets(self):
+        if self.cloudlet_scheduler is not None:
+            return len(self.cloudlet_scheduler) > 0
+        return any(not cl.finished for cl in self.cloudlets)
+
+    def next_completion_time(self):
+        """
+        Predicted finish time of the next cloudlet, or None. Only available with a cloudlet scheduler.
+        """
+        if self.cloudlet_scheduler is not None:
+            return self.cloudlet_scheduler.next_completion_time()
+        return None
+
     def update_cloudlets(self, current_time, time_step=1.0, cpu_ratio=None):
         """
         Update execution for the assigned cloudlet (or cloudlets) and remove finished ones.
@@ -200,6 +507,10 @@ class VM:
             if self.cloudlet.finished:
                 self.cloudlet = None  # Clear the cloudlet if finished
                 print(f"Cloudlet {self.cloudlet.cloudlet_id} has finished and is removed from VM {self.vm_id}")
+        elif self.cloudlet_scheduler is not None:
+            # Only completions up to the end of this step are processed, O(log n) each
+            for cloudlet in self.cloudlet_scheduler.advance(current_time + time_step):
+                print(f"Cloudlet {cloudlet.cloudlet_id} has finished and is removed from VM {self.vm_id}")
         else:
             # For batch workloads, process all assigned cloudlets
             for cloudlet in self.cloudlets[:]:  # Copy to safely remove while iterating
@@ -213,9 +524,185 @@ class VM:
             return (f"VM {self.vm_id} | Online Service | CPU: {self.cpu} MIPS, RAM: {self.ram} MB, "
                     f"Storage: {self.storage} GB, Cloudlet: {self.cloudlet.cloudlet_id if self.cloudlet else 'None'}")
         else:
+            active = len(self.cloudlet_scheduler) if self.cloudlet_scheduler is not None else len(self.cloudlets)
             return (f"VM {self.vm_id} | Batch Workload | CPU: {self.cpu} MIPS, RAM: {self.ram} MB, "
-                    f"Storage: {self.storage} GB, Active Cloudlets: {len(self.cloudlets)}")
-    
+                    f"Storage: {self.storage} GB, Active Cloudlets: {active}")
+
+
+class VMPool:
+    def __init__(self, is_online_service=True, cloudlet_scheduler=None):
+        """
+        Reusable VM objects: acquire() on arrival, release() on departure, so the number of
+        live VM objects follows the concurrent VM count instead of the total arrivals.
+        """
+        self.is_online_service = is_online_service
+        self.cloudlet_scheduler = cloudlet_scheduler
+        self.free = []
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, vm_id, cpu, ram, storage):
+        if self.free:
+            vm = self.free.pop()
+            vm.reset(vm_id, cpu, ram, storage)
+            self.reused += 1
+            return vm
+        self.created += 1
+        return VM(vm_id, cpu=cpu, ram=ram, storage=storage, is_online_service=self.is_online_service,
+                  cloudlet_scheduler=self.cloudlet_scheduler)
+
+    def release(self, vm):
+        self.free.append(vm)
+
+
+class VMStats:
+    def __init__(self):
+        """
+        Rolling aggregates of VMs that have left the simulation; each VM is folded in once,
+        in O(lifetime) for its requested MIPS and O(1) otherwise.
+        """
+        self.count = 0
+        self.rejected = 0
+        self.lifetime_mean = 0.0
+        self._lifetime_m2 = 0.0
+        self.lifetime_max = 0
+        self.requested_mips_steps = 0.0
+        self.mean_utilization_sum = 0.0
+
+    def fold(self, vm, cpu_utilization, arrival, departure):
+        """
+        :param vm: The departing VM
+        :param cpu_utilization: Its utilization trace
+        :param arrival: First step it ran
+        :param departure: Step it left (exclusive)
+        """
+        lifetime = max(departure - arrival, 0)
+        self.count += 1
+        delta = lifetime - self.lifetime_mean
+        self.lifetime_mean += delta / self.count
+        self._lifetime_m2 += delta * (lifetime - self.lifetime_mean)
+        self.lifetime_max = max(self.lifetime_max, lifetime)
+        if lifetime:
+            used = cpu_utilization[arrival:departure]
+            total = float(sum(used))
+            self.requested_mips_steps += vm.cpu * total
+            self.mean_utilization_sum += total / len(used)
+
+    @property
+    def lifetime_std(self):
+        return (self._lifetime_m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+
+    def summary(self):
+        return {
+            "vms": self.count,
+            "rejected_vms": self.rejected,
+            "lifetime_mean_steps": self.lifetime_mean,
+            "lifetime_std_steps": self.lifetime_std,
+            "lifetime_max_steps": self.lifetime_max,
+            "requested_mips_steps": self.requested_mips_steps,
+            "vm_mean_utilization": self.mean_utilization_sum / self.count if self.count else 0.0,
+        }
+
+
+class CloudletScheduler:
+    def __init__(self, vm, mode="time_shared", num_pes=1):
+        """
+        CloudSim-style cloudlet scheduler of a batch VM.
+
+        - time_shared: all submitted cloudlets run at once and share the VM's MIPS equally
+          (each gets vm.cpu / max(n, num_pes)).
+        - space_shared: at most num_pes cloudlets run at once, each on its own PE
+          (vm.cpu / num_pes); the rest wait in FIFO order.
+
+        Since all running cloudlets progress at the same rate, progress is tracked with a single
+        virtual clock: `work_done` is the MI every running cloudlet has received so far. A cloudlet
+        finishes when work_done reaches its key (work_done at start + its length), so the heap
+        never needs re-keying when the rate changes on an arrival or completion.
+
+        :param vm: Owning VM
+        :param mode: "time_shared" or "space_shared"
+        :param num_pes: Number of processing elements of the VM
+        """
+        if mode not in ("time_shared", "space_shared"):
+            raise ValueError(f"Unknown cloudlet scheduler mode: {mode}")
+        self.vm = vm
+        self.mode = mode
+        self.num_pes = num_pes
+        self.running = []        # heap of (finish key, seq, cloudlet)
+        self.waiting = deque()   # space-shared queue
+        self.work_done = 0.0
+        self.last_time = 0.0
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.running) + len(self.waiting)
+
+    def rate(self):
+        """
+        MIPS delivered to each running cloudlet.
+        """
+        return self.vm.cpu / max(len(self.running), self.num_pes)
+
+    def cpu_demand(self):
+        return self.vm.cpu * min(len(self.running), self.num_pes) / self.num_pes
+
+    def _start(self, cloudlet, current_time):
+        cloudlet.start_time = current_time
+        heapq.heappush(self.running, (self.work_done + cloudlet.remaining, next(self._seq), cloudlet))
+
+    def submit(self, cloudlet, current_time):
+        """
+        Add a cloudlet at current_time, first advancing the clock so earlier work is accounted
+        at the old rate.
+        """
+        finished = self.advance(current_time)
+        if self.mode == "space_shared" and len(self.running) >= self.num_pes:
+            self.waiting.append(cloudlet)
+        else:
+            self._start(cloudlet, current_time)
+        return finished
+
+    def next_completion_time(self):
+        if not self.running:
+            return None
+        return self.last_time + (self.running[0][0] - self.work_done) / self.rate()
+
+    def remaining(self, cloudlet):
+        """
+        Remaining MI of a running or waiting cloudlet.
+        """
+        for key, _, cl in self.running:
+            if cl is cloudlet:
+                return max(key - self.work_done, 0.0)
+        return cloudlet.remaining
+
+    def advance(self, current_time):
+        """
+        Run until current_time and return the cloudlets that finished, in completion order.
+        Each completion costs O(log n); time without completions costs O(1).
+        """
+        finished = []
+        while self.running:
+            completion_time = self.next_completion_time()
+            if completion_time > current_time:
+                break
+            self.work_done = self.running[0][0]
+            self.last_time = completion_time
+            while self.running and self.running[0][0] <= self.work_done:
+                _, _, cloudlet = heapq.heappop(self.running)
+                cloudlet.remaining = 0
+                cloudlet.finished = True
+                cloudlet.end_time = completion_time
+                finished.append(cloudlet)
+            while self.waiting and len(self.running) < self.num_pes:
+                self._start(self.waiting.popleft(), completion_time)
+
+        if self.running and current_time > self.last_time:
+            self.work_done += self.rate() * (current_time - self.last_time)
+        self.last_time = max(self.last_time, current_time)
+        return finished
+
+
 class Cloudlet:
     def __init__(self, cloudlet_id, length, cpu_demand_ratio=1.0):
         """
@@ -237,6 +724,23 @@ class Cloudlet:
 
         # Statistical features of the workload trace (e.g., mean, std, max, min)
         self.trace_mean = None
+        self.trace_index = None     # Row in a trace_features.TraceFeatureStore, if one is used
+
+    def reset(self, cloudlet_id, length, cpu_demand_ratio=1.0):
+        """
+        Return the cloudlet to its initial state for reuse by a pooled VM.
+        """
+        self.cloudlet_id = cloudlet_id
+        self.length = length
+        self.cpu_demand_ratio = cpu_demand_ratio
+        self.remaining = length
+        self.assigned_vm = None
+        self.start_time = None
+        self.end_time = None
+        self.finished = False
+        self.cpu_demand_timeline.clear()
+        self.trace_mean = None
+        self.trace_index = None
 
     def assign_to_vm(self, vm, current_time=-1.0):
         self.assigned_vm = vm
@@ -0,0 +1,179 @@
+# decision_log.py
+#
+# Record of every placement and migration decision of a run, and a replay engine that
+# re-runs the run from it. Replays skip host selection and migration planning, so sweeping
+# power or DVFS parameters over a fixed schedule costs a fraction of a full simulation.
+# Decisions stay exactly those of the recorded run, including where the original policy
+# consulted the power model (energy_aware placement) or utilization (migration).
+
+import os
+
+import numpy as np
+
+from vector_engine import build_workload
+
+PLACE = 0
+REJECT = 1
+MIGRATE = 2
+POWER_OFF = 3
+
+DECISION_DTYPE = np.dtype([
+    ("step", "<i4"),
+    ("kind", "u1"),
+    ("vm_id", "<i8"),
+    ("src", "<i4"),     # Source host id (-1 for placements)
+    ("dst", "<i4"),     # Destination host id (-1 for rejections)
+    ("cpu", "<f4"),     # MIPS of the VM, so replays need no VM objects
+])
+
+
+class DecisionLog:
+    def __init__(self, path=None, buffer_size=65536):
+        """
+        Append-only decision record. With a path, records are flushed to a binary file of
+        DECISION_DTYPE rows every buffer_size decisions; without one they stay in memory.
+
+        :param path: Output file (truncated on creation) or None
+        :param buffer_size: Records kept in memory between flushes
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.step = 0       # Current step, set by Runner.run_step
+        self._buffer = []
+        self._chunks = []
+        if path is not None:
+            open(path, "wb").close()
+
+    def record(self, kind, vm_id=-1, src=-1, dst=-1, cpu=0.0):
+        self._buffer.append((self.step, kind, vm_id, src, dst, cpu))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def place(self, vm, host):
+        self.record(PLACE, vm.vm_id, -1, host.host_id, vm.cpu)
+
+    def reject(self, vm):
+        self.record(REJECT, vm.vm_id, -1, -1, vm.cpu)
+
+    def migrate(self, vm, src_host, dst_host):
+        self.record(MIGRATE, vm.vm_id, src_host.host_id, dst_host.host_id, vm.cpu)
+
+    def power_off(self, host):
+        self.record(POWER_OFF, -1, host.host_id, -1)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        chunk = np.array(self._buffer, dtype=DECISION_DTYPE)
+        self._buffer = []
+        if self.path is None:
+            self._chunks.append(chunk)
+        else:
+            with open(self.path, "ab") as f:
+                chunk.tofile(f)
+
+    def decisions(self):
+        """
+        All decisions recorded so far as a structured array.
+        """
+        self.flush()
+        if self.path is None:
+            return np.concatenate(self._chunks) if self._chunks else np.empty(0, dtype=DECISION_DTYPE)
+        return load_decisions(self.path)
+
+
+def load_decisions(path):
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=DECISION_DTYPE)
+    return np.fromfile(path, dtype=DECISION_DTYPE)
+
+
+def replay_simulation(decisions, all_profiles, hosts, step_duration_sec=300, time_steps=288):
+    """
+    Re-run a recorded simulation on new hosts (e.g. with another power model or DVFS setting)
+    without host selection. Per step: apply the recorded placements, expire VMs, evaluate
+    Host.power_at_demand for every host, then apply the recorded migrations and power-offs.
+
+    :param decisions: Structured array from DecisionLog.decisions / load_decisions, or a path
+    :param all_profiles: The VM profiles of the recorded run
+    :param hosts: Hosts with the same ids as in the recorded run; only their power model is used
+    :return: Dict with energy_joules, boot_energy_joules, host_utilization_history ({host_id: list})
+             and num_active_vm, as from Runner.run_simulation
+    """
+    if isinstance(decisions, (str, os.PathLike)):
+        decisions = load_decisions(decisions)
+
+    H = len(hosts)
+    host_index = {host.host_id: i for i, host in enumerate(hosts)}
+    base_cpu_capacity = np.array([host.base_cpu_capacity for host in hosts], dtype=np.float64)
+
+    # As in Runner.run_simulation, the first profile of a vm_id is the one used
+    profiles_by_id = {}
+    for profile in all_profiles:
+        profiles_by_id.setdefault(profile["vm_id"], profile)
+    profiles = list(profiles_by_id.values())
+    zeros = np.zeros(len(profiles))
+    workload = build_workload(profiles, (zeros, zeros, zeros), time_steps=time_steps)
+    vm_index = {vm_id: i for i, vm_id in enumerate(workload["vm_id"].tolist())}
+    expiry = workload["arrival"] + workload["lifetime"]
+    traces = workload["traces"]
+    trace_index = workload["trace_index"]
+
+    V = len(profiles)
+    vm_host = np.full(V, -1, dtype=np.int64)
+    vm_cpu = np.zeros(V)
+    active = np.array([host.active for host in hosts], dtype=bool)
+    boot_energy = 0.0
+    energy = 0.0
+    host_utilization_history = {host.host_id: [] for host in hosts}
+    num_active_vm = []
+
+    # Decisions are recorded in step order; split them into per-step placement and migration phases
+    bounds = np.searchsorted(decisions["step"], np.arange(time_steps + 1), side="left")
+
+    for t in range(time_steps):
+        step = decisions[bounds[t]:bounds[t + 1]]
+
+        # Step 1: recorded placements (booting hosts that were off)
+        for d in step[step["kind"] == PLACE]:
+            i, h = vm_index[int(d["vm_id"])], host_index[int(d["dst"])]
+            if not active[h]:
+                active[h] = True
+                boot_energy += hosts[h].boot_energy_joules
+            vm_host[i] = h
+            vm_cpu[i] = d["cpu"]
+
+        # Step 2: expire VMs; the rest follow their traces
+        vm_host[(vm_host >= 0) & (t >= expiry)] = -1
+        running = np.nonzero(vm_host >= 0)[0]
+        demand = np.bincount(vm_host[running], weights=vm_cpu[running] * traces[trace_index[running], t],
+                             minlength=H)
+        num_active_vm.append(len(running))
+
+        # Step 3: power with the hosts' (possibly new) power model
+        base_util = np.minimum(demand / base_cpu_capacity, 1.0)
+        for h, host in enumerate(hosts):
+            host.active = bool(active[h])
+            energy += host.power_at_demand(demand[h]) * step_duration_sec
+            host_utilization_history[host.host_id].append(base_util[h])
+
+        # Step 4: recorded migrations and power-offs
+        for d in step[step["kind"] >= MIGRATE]:
+            if d["kind"] == MIGRATE:
+                h = host_index[int(d["dst"])]
+                if not active[h]:
+                    # Adaptive migration may wake a host to relieve an overloaded one
+                    active[h] = True
+                    boot_energy += hosts[h].boot_energy_joules
+                vm_host[vm_index[int(d["vm_id"])]] = h
+            else:
+                active[host_index[int(d["src"])]] = False
+
+    for h, host in enumerate(hosts):
+        host.active = bool(active[h])
+    return {
+        "energy_joules": energy,
+        "boot_energy_joules": boot_energy,
+        "host_utilization_history": host_utilization_history,
+        "num_active_vm": num_active_vm,
+    }
@@ -0,0 +1,133 @@
+# energy_ledger.py
+#
+# Per-host energy breakdown. Every Joule a run spends is booked to a host, a bucket of
+# bucket_steps consecutive steps and one of four components:
+#
+#   idle       power drawn at zero utilization (at the host's current DVFS level) while on
+#   dynamic    power above idle, driven by utilization
+#   boot       Host.boot_energy_joules, each time a powered-off host is switched on
+#   migration  live-migration overhead, E = 0.512 J/MB * RAM + 20.165 J per migration
+#              (Liu et al., "Performance and energy modeling for live migration of virtual
+#              machines", HPDC 2011), split evenly between source and destination
+#
+# idle + dynamic is the operational energy the engines report as energy_joules; boot and
+# migration are the overheads on top of it. The books are one (components, replicas, hosts,
+# buckets) float array updated with vectorized adds, so the object engine (one replica) and
+# the vector engine (R replicas) share it.
+
+import numpy as np
+
+COMPONENTS = ["idle", "dynamic", "boot", "migration"]
+IDLE, DYNAMIC, BOOT, MIGRATION = range(len(COMPONENTS))
+
+MIGRATION_JOULES_PER_MB = 0.512
+MIGRATION_JOULES_FIXED = 20.165
+
+
+def migration_energy_joules(ram_mb):
+    return MIGRATION_JOULES_PER_MB * np.asarray(ram_mb, dtype=np.float64) + MIGRATION_JOULES_FIXED
+
+
+class EnergyLedger:
+    def __init__(self, host_ids, time_steps=288, bucket_steps=12, replicas=1):
+        """
+        :param host_ids: Ids of the hosts, in the order the engine indexes them
+        :param time_steps: Number of simulation steps
+        :param bucket_steps: Steps per bucket (12 five-minute steps = hourly buckets)
+        :param replicas: R, for vector engine runs
+        """
+        if bucket_steps < 1:
+            raise ValueError("bucket_steps must be at least 1")
+        self.host_ids = np.asarray(host_ids)
+        self.host_index = {int(host_id): i for i, host_id in enumerate(self.host_ids.tolist())}
+        self.bucket_steps = bucket_steps
+        self.num_buckets = -(-time_steps // bucket_steps)
+        self.joules = np.zeros((len(COMPONENTS), replicas, len(self.host_ids), self.num_buckets))
+        self.step = 0       # Current step, set by the engine
+
+    def _bucket(self, step=None):
+        return min((self.step if step is None else step) // self.bucket_steps, self.num_buckets - 1)
+
+    def add_power(self, idle_power, total_power, step_duration_sec, step=None):
+        """
+        Book one step of power draw. idle_power / total_power are (R, H) or (H,) in Watts.
+        """
+        b = self._bucket(step)
+        self.joules[IDLE, :, :, b] += np.asarray(idle_power) * step_duration_sec
+        self.joules[DYNAMIC, :, :, b] += (np.asarray(total_power) - idle_power) * step_duration_sec
+
+    def add_boot(self, hosts, joules, rows=0, step=None):
+        """
+        Book boot energy of the host indices `hosts` (in replicas `rows`).
+        """
+        np.add.at(self.joules[BOOT, :, :, self._bucket(step)], (rows, hosts), joules)
+
+    def add_migration(self, src, dst, ram_mb, rows=0, step=None):
+        """
+        Book the overhead of migrations from host indices src to dst of VMs with ram_mb MB of RAM.
+        """
+        half = migration_energy_joules(ram_mb) / 2
+        rows, src, dst, half = np.broadcast_arrays(rows, src, dst, half)
+        books = self.joules[MIGRATION, :, :, self._bucket(step)]
+        np.add.at(books, (rows, src), half)
+        np.add.at(books, (rows, dst), half)
+
+    # ---------- Object engine hooks ----------
+
+    def record_hosts(self, hosts, power, step_duration_sec):
+        """
+        Book one step of the object engine given each host's power draw (W), in host order.
+        """
+        idle = np.array([host.idle_power() if p > 0 else 0.0 for host, p in zip(hosts, power)])
+        self.add_power(idle, power, step_duration_sec)
+
+    def record_boot(self, host):
+        self.add_boot(self.host_index[host.host_id], host.boot_energy_joules)
+
+    def record_migration(self, vm, src_host, dst_host):
+        self.add_migration(self.host_index[src_host.host_id], self.host_index[dst_host.host_id], vm.ram)
+
+    # ---------- Export ----------
+
+    def totals(self):
+        """
+        {component: (R,) Joules} over all hosts and buckets.
+        """
+        return {name: self.joules[k].sum(axis=(1, 2)) for k, name in enumerate(COMPONENTS)}
+
+    def per_host(self):
+        """
+        (components, R, H) Joules over the whole run.
+        """
+        return self.joules.sum(axis=3)
+
+    def per_bucket(self):
+        """
+        (components, R, buckets) Joules over all hosts.
+        """
+        return self.joules.sum(axis=2)
+
+    def summary(self, replica=0):
+        """
+        kWh per component and in total for one replica.
+        """
+        totals = {name: float(value[replica]) / 3_600_000 for name, value in self.totals().items()}
+        result = {f"{name}_energy_kwh": value for name, value in totals.items()}
+        result["total_energy_kwh"] = sum(totals.values())
+        return result
+
+    def save(self, path, dtype="float32"):
+        """
+        Write the books as a compressed .npz (float32 by default: ~1e-7 relative error, half the size).
+        """
+        np.savez_compressed(path, joules=self.joules.astype(dtype), host_ids=self.host_ids,
+                            components=np.array(COMPONENTS), bucket_steps=self.bucket_steps)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        joules = data["joules"].astype(np.float64)
+        ledger = cls(data["host_ids"], joules.shape[3] * int(data["bucket_steps"]), int(data["bucket_steps"]),
+                     joules.shape[1])
+        ledger.joules[...] = joules
+        return ledger
@@ -0,0 +1,288 @@
+# federation.py
+#
+# Multi-datacenter federation. Every site (its own hosts, scheduler policy, DVFS and
+# migration settings) runs Runner.run_step in its own worker process. A broker in the
+# parent process routes arriving VMs between sites; sites and broker only exchange
+# messages over pipes at step boundaries, so all sites advance one step in parallel.
+
+import multiprocessing
+import os
+import random
+import sys
+
+import numpy as np
+
+from datacenter import VM
+from Helper import create_host_list
+from Runner import run_step
+from schedule import SchedulerVM
+from vector_engine import draw_vm_specs, trace_value
+
+ROUTING_POLICIES = ["round_robin", "most_free_cpu", "least_utilized", "best_fit"]
+
+
+def _site_summary(name, t, hosts, active_vms, step_energy, rejected):
+    """
+    State a site reports to the broker at the end of a step.
+    """
+    free_cpu = 0.0
+    total_cpu = 0.0
+    util = 0.0
+    for host in hosts:
+        free_cpu += host.base_cpu_capacity * host.cpu_oversub - sum(v.cpu for v in host.vms)
+        total_cpu += host.base_cpu_capacity
+        util += host.base_cpu_utilization()
+    return {
+        "site": name,
+        "t": t,
+        "energy_joules": step_energy,
+        "free_cpu": free_cpu,
+        "total_cpu": total_cpu,
+        "mean_util": util / len(hosts) if hosts else 0.0,
+        "active_hosts": sum(1 for h in hosts if h.active),
+        "active_vms": len(active_vms),
+        "rejected": [vm.vm_id for vm in rejected],
+    }
+
+
+def _site_worker(conn, site, step_duration_sec, verbose=False):
+    """
+    Worker process owning one datacenter. Sends an initial summary, then (tuples over conn):
+      ("step", t, current_time, [(profile, (cpu, ram, storage)), ...]) -> step summary
+      ("finish",)                                                      -> final site result
+    """
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    random.seed(site.get("seed", 0))
+    np.random.seed(site.get("seed", 0))
+
+    hosts = create_host_list(site["num_hosts"])
+    scheduler = SchedulerVM(hosts, site.get("policy", "first_fit"))
+    for host in hosts:
+        host.enable_dvfs(site.get("dvfs", False))
+    migrate_fn = None if site.get("migration", "default") == "default" else site["migration"]
+
+    vm_objects = {}
+    profiles_by_id = {}
+    active_vms = []
+    host_utilization_history = {host.host_id: [] for host in hosts}
+    total_energy_joules = 0.0
+    conn.send(_site_summary(site["name"], -1, hosts, active_vms, 0.0, []))
+
+    while True:
+        message = conn.recv()
+        if message[0] == "step":
+            _, t, current_time, routed = message
+            arrivals = []
+            for profile, (cpu, ram, storage) in routed:
+                vm_objects[profile["vm_id"]] = VM(profile["vm_id"], cpu=cpu, ram=ram, storage=storage,
+                                                  is_online_service=True)
+                profiles_by_id[profile["vm_id"]] = profile
+                arrivals.append(profile)
+
+            step_energy, active_vms, rejected = run_step(
+                t, current_time, arrivals, active_vms, vm_objects, profiles_by_id,
+                hosts, scheduler, host_utilization_history,
+                step_duration_sec=step_duration_sec, migrate_fn=migrate_fn
+            )
+            total_energy_joules += step_energy
+            # Forget VMs that expired or were rejected, as Runner.run_simulation does
+            still_active = {vm.vm_id for vm, _ in active_vms}
+            for vm_id in [v for v in vm_objects if v not in still_active]:
+                del vm_objects[vm_id]
+                profiles_by_id.pop(vm_id, None)
+            conn.send(_site_summary(site["name"], t, hosts, active_vms, step_energy, rejected))
+        elif message[0] == "finish":
+            conn.send({
+                "site": site["name"],
+                "energy_joules": total_energy_joules,
+                "boot_energy_joules": scheduler.get_total_boot_energy(),
+                "host_utilization_history": host_utilization_history,
+            })
+            conn.close()
+            return
+
+
+def _receive(conn, name):
+    """
+    Next message of a site worker; a worker that died closes its end of the pipe.
+    """
+    try:
+        return conn.recv()
+    except EOFError:
+        raise RuntimeError(f"Site worker {name} exited unexpectedly") from None
+
+
+class Broker:
+    def __init__(self, site_names, routing="most_free_cpu"):
+        """
+        Routes arriving VMs between sites using the summaries of the previous step.
+        Within a step, the broker debits each routed VM from its own copy of the site's
+        free capacity, so a burst of arrivals is spread instead of all going to one site.
+
+        :param site_names: Site names in a fixed order
+        :param routing: One of ROUTING_POLICIES
+        """
+        if routing not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy: {routing}")
+        self.site_names = site_names
+        self.routing = routing
+        self.summaries = {name: None for name in site_names}
+        self._next = 0
+
+    def update(self, summary):
+        self.summaries[summary["site"]] = summary
+
+    def route(self, arrivals, excluded=None):
+        """
+        :param arrivals: List of (profile, (cpu, ram, storage))
+        :param excluded: {vm_id: set of site names that already rejected it}
+        :return: ({site name: [(profile, spec), ...]}, list of arrivals no site is left for)
+        """
+        excluded = excluded or {}
+        routed = {name: [] for name in self.site_names}
+        unroutable = []
+        free = {n: (s["free_cpu"] if s else float("inf")) for n, s in self.summaries.items()}
+        load = {n: (s["mean_util"] * s["total_cpu"] if s else 0.0) for n, s in self.summaries.items()}
+        total = {n: (s["total_cpu"] if s else 1.0) for n, s in self.summaries.items()}
+
+        for profile, spec in arrivals:
+            cpu = spec[0]
+            names = [n for n in self.site_names if n not in excluded.get(profile["vm_id"], ())]
+            if not names:
+                unroutable.append((profile, spec))
+                continue
+            if self.routing == "round_robin":
+                names = sorted(names, key=lambda n: (self.site_names.index(n) - self._next) % len(self.site_names))
+                target = names[0]
+                self._next = (self.site_names.index(target) + 1) % len(self.site_names)
+            elif self.routing == "most_free_cpu":
+                target = max(names, key=lambda n: free[n])
+            elif self.routing == "least_utilized":
+                target = min(names, key=lambda n: load[n] / total[n])
+            else:
+                # best_fit: the site with the least free capacity that still fits the VM consolidates best
+                fitting = [n for n in names if free[n] >= cpu]
+                target = min(fitting, key=lambda n: free[n]) if fitting else max(names, key=lambda n: free[n])
+            routed[target].append((profile, spec))
+            free[target] -= cpu
+            load[target] += cpu * trace_value(profile["cpu_utilization"], profile["arrival_time"])
+        return routed, unroutable
+
+
+def run_federation(sites, all_profiles, routing="most_free_cpu", step_duration_sec=300, time_steps=288,
+                   verbose=False):
+    """
+    Simulate several datacenters, one worker process each, behind a VM-routing broker.
+
+    :param sites: List of site dicts: name, num_hosts, policy, dvfs, migration, seed
+    :param all_profiles: VM profiles of the whole federation, sorted by arrival step
+    :param routing: Broker routing policy (see ROUTING_POLICIES)
+    :return: Dict with total energy, per-site results and routing statistics
+    """
+    names = [site["name"] for site in sites]
+    broker = Broker(names, routing)
+    vm_specs = list(zip(*draw_vm_specs(len(all_profiles))))
+
+    arrivals_by_step = {}
+    for profile, spec in zip(all_profiles, vm_specs):
+        arrivals_by_step.setdefault(profile["arrival_time"], []).append((profile, spec))
+
+    pipes = {}
+    processes = []
+    retries = []          # Rejected VMs, re-routed to another site at the next step
+    excluded = {}         # vm_id -> sites that rejected it
+    routed_count = {name: 0 for name in names}
+    dropped = 0
+    current_time = 0.0
+
+    try:
+        for site in sites:
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_site_worker, args=(child_conn, site, step_duration_sec, verbose))
+            process.start()
+            # Only the worker holds the child end, so its exit shows up here as EOFError
+            child_conn.close()
+            pipes[site["name"]] = parent_conn
+            processes.append(process)
+        for name in names:
+            broker.update(_receive(pipes[name], name))
+
+        for t in range(time_steps):
+            arrivals = retries + arrivals_by_step.get(t, [])
+            retries = []
+            routed, unroutable = broker.route(arrivals, excluded)
+            dropped += len(unroutable)
+
+            for name in names:
+                pipes[name].send(("step", t, current_time, routed[name]))
+                routed_count[name] += len(routed[name])
+            for name in names:
+                summary = _receive(pipes[name], name)
+                broker.update(summary)
+                rejected = set(summary["rejected"])
+                for profile, spec in routed[name]:
+                    if profile["vm_id"] in rejected:
+                        excluded.setdefault(profile["vm_id"], set()).add(name)
+                        # Arrives one step later elsewhere, with its remaining lifetime
+                        retry = dict(profile, arrival_time=t + 1, lifetime=profile["lifetime"] - 1)
+                        if retry["lifetime"] > 0 and t + 1 < time_steps:
+                            retries.append((retry, spec))
+                        else:
+                            dropped += 1
+            current_time += step_duration_sec
+
+        site_results = {}
+        for name in names:
+            pipes[name].send(("finish",))
+            site_results[name] = _receive(pipes[name], name)
+    except BaseException:
+        # Workers still waiting for a message would never exit on their own
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+        for conn in pipes.values():
+            conn.close()
+
+    for name in names:
+        site_results[name]["routed_vms"] = routed_count[name]
+    return {
+        "total_energy_joules": sum(r["energy_joules"] for r in site_results.values()),
+        "sites": site_results,
+        "dropped_vms": dropped,
+        "routing": routing,
+    }
+
+
+if __name__ == "__main__":
+    from vm_profile_generator import generate_initial_vm_profiles, generate_dynamic_vm_profiles
+
+    random.seed(42)
+    np.random.seed(42)
+    trace_dir = "planetlab/20110303"
+    num_sites = 4
+    hosts_per_site = 50
+
+    sites = [
+        {"name": f"dc{i}", "num_hosts": hosts_per_site, "policy": "energy_aware",
+         "dvfs": i % 2 == 1, "migration": "default", "seed": 42 + i}
+        for i in range(num_sites)
+    ]
+
+    initial_profiles = generate_initial_vm_profiles(num_vms=100 * num_sites, trace_dir=trace_dir, long_lived_ratio=0.6)
+    dynamic_profiles = generate_dynamic_vm_profiles(
+        trace_dir=trace_dir, num_hosts=hosts_per_site * num_sites, num_peak_arrive=150,
+        initial_vm_id=len(initial_profiles)
+    )
+    all_profiles = sorted(initial_profiles + dynamic_profiles, key=lambda p: p["arrival_time"])
+
+    for routing in ROUTING_POLICIES:
+        result = run_federation(sites, all_profiles, routing=routing)
+        per_site = ", ".join(f"{n}: {r['energy_joules'] / 3_600_000:.2f} kWh ({r['routed_vms']} VMs)"
+                             for n, r in result["sites"].items())
+        print(f"{routing}: total {result['total_energy_joules'] / 3_600_000:.2f} kWh | {per_site} | "
+              f"dropped {result['dropped_vms']}")
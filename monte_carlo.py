@@ -0,0 +1,149 @@
+# monte_carlo.py
+#
+# Replicated runs of sweep cases. The R replicas of a case use seeds seed, seed+1, ...,
+# seed+R-1 and advance together in one vector_engine pass instead of R separate simulations.
+
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from ComprehensiveExperiment_FinalReport import build_cases, generate_case_profiles
+from energy_ledger import EnergyLedger
+from Helper import create_host_list
+from result_cache import ResultCache
+from sla_metrics import BatchSLAMetrics
+from vector_engine import HostArrays, build_workload, draw_vm_specs, run_batched_simulation, stack_workloads
+
+
+def confidence_interval(samples, confidence=0.95):
+    """
+    Student-t confidence interval of the mean.
+
+    :param samples: 1-D array of replica results
+    :param confidence: Two-sided confidence level
+    :return: (mean, std, lower, upper); the interval collapses to the mean for a single sample
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    mean = float(samples.mean())
+    if len(samples) < 2:
+        return mean, 0.0, mean, mean
+    std = float(samples.std(ddof=1))
+    half_width = float(stats.t.ppf((1 + confidence) / 2, len(samples) - 1) * std / np.sqrt(len(samples)))
+    return mean, std, mean - half_width, mean + half_width
+
+
+def vector_migration(case):
+    """
+    The vector engine's migration mode for a case. Only "default" and "disable" are implemented
+    there; the overload-detector modes of run_case need the object engine.
+    """
+    if case["migration"] not in ("default", "disable"):
+        raise ValueError(f"Migration mode {case['migration']!r} is not implemented by the vector engine")
+    return case["migration"]
+
+
+def replica_seeds(case, replicas, first_replica=0):
+    return [case["seed"] + i for i in range(first_replica, first_replica + replicas)]
+
+
+def build_replica_batch(case, replicas, trace_dtype="float64", first_replica=0):
+    """
+    Generate the workload of each replica exactly as run_case would for that seed, then stack them.
+    The workload depends on the seed, not on the policy, so every policy run on one batch sees the
+    same arrivals, lifetimes, traces and VM types (common random numbers).
+    """
+    workloads = []
+    for seed in replica_seeds(case, replicas, first_replica):
+        profiles = generate_case_profiles(dict(case, seed=seed))
+        vm_specs = draw_vm_specs(len(profiles))
+        workloads.append(build_workload(profiles, vm_specs, time_steps=case["time_steps"], trace_dtype=trace_dtype))
+    return stack_workloads(workloads)
+
+
+def run_replicated_case(case, replicas=10, confidence=0.95, trace_dtype="float64", history_dtype="float64"):
+    """
+    Run R replicas of a case in one batched pass and summarize their energy.
+
+    :param case: Case configuration dict (see ComprehensiveExperiment_FinalReport.build_cases)
+    :param replicas: Number of independent seeds
+    :param confidence: Confidence level of the reported interval
+    :param trace_dtype: Storage type of the traces (see vector_engine.UTILIZATION_DTYPES)
+    :param history_dtype: Storage type of the recorded host utilization
+    :return: Result dict with mean/std/CI of energy in kWh, the per-replica values and the
+             quantization errors
+    """
+    migration = vector_migration(case)
+    batch = build_replica_batch(case, replicas, trace_dtype)
+    host_arrays = HostArrays(create_host_list(case["num_hosts"]))
+    rngs = [np.random.default_rng(seed) for seed in replica_seeds(case, replicas)]
+    metrics = BatchSLAMetrics(replicas, host_arrays.num_hosts, batch["arrival"].shape[1])
+    ledger = EnergyLedger(host_arrays.host_ids, case["time_steps"], replicas=replicas)
+
+    result = run_batched_simulation(
+        batch, host_arrays,
+        policy=case["policy"],
+        dvfs=case["dvfs"],
+        migration=migration,
+        step_duration_sec=case["step_duration_sec"],
+        time_steps=case["time_steps"],
+        rngs=rngs,
+        metrics=metrics,
+        history_dtype=history_dtype,
+        ledger=ledger
+    )
+
+    energy_kwh = result["energy_joules"] / 3_600_000
+    mean, std, lower, upper = confidence_interval(energy_kwh, confidence)
+    sla = metrics.summary()
+    quantization = result["quantization"]
+    overheads = ledger.totals()
+    return {
+        "replicas": replicas,
+        "energy_kwh_mean": mean,
+        "energy_kwh_std": std,
+        "energy_kwh_ci_low": lower,
+        "energy_kwh_ci_high": upper,
+        "confidence": confidence,
+        "energy_kwh_replicas": energy_kwh.tolist(),
+        "slav_mean": float(sla["slav"].mean()),
+        "slatah_mean": float(sla["slatah"].mean()),
+        "pdm_mean": float(sla["pdm"].mean()),
+        "migrations_mean": float(sla["migrations"].mean()),
+        "boot_energy_kwh_mean": float(overheads["boot"].mean() / 3_600_000),
+        "migration_energy_kwh_mean": float(overheads["migration"].mean() / 3_600_000),
+        "trace_dtype": quantization["trace_dtype"],
+        "trace_max_abs_error": quantization["trace_max_abs_error"],
+        "history_dtype": quantization["history_dtype"],
+        "history_max_abs_error": quantization["history_max_abs_error"],
+        "energy_kwh_error_bound": float(quantization["energy_error_bound_joules"].max() / 3_600_000),
+    }
+
+
+if __name__ == "__main__":
+    replicas = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    confidence = 0.95
+    cache = ResultCache("results_cache")
+    rows = []
+
+    for case_id, case in enumerate(build_cases(), start=1):
+        key = dict(case, mode="replicated", replicas=replicas, confidence=confidence)
+        result = cache.get(key)
+        if result is None:
+            result = run_replicated_case(case, replicas, confidence)
+            cache.put(key, result)
+
+        print(f"Case {case_id}: {case['policy']}, DVFS={case['dvfs']}, Mig={case['migration']} => "
+              f"{result['energy_kwh_mean']:.3f} ± {result['energy_kwh_mean'] - result['energy_kwh_ci_low']:.3f} kWh "
+              f"({replicas} replicas)")
+        rows.append({
+            "case": case_id,
+            "policy": case["policy"],
+            "dvfs": case["dvfs"],
+            "migration": case["migration"],
+            **{k: v for k, v in result.items() if k != "energy_kwh_replicas"}
+        })
+
+    pd.DataFrame(rows).to_csv("results_replicated.csv", index=False)
+    print("\nResults saved to results_replicated.csv")
@@ -0,0 +1,345 @@
+# offline_bound.py
+#
+# Offline lower bound on the energy of a recorded day, as a yardstick for the online policies.
+# Given every VM's arrival, lifetime and per-step demand in advance, a time-indexed MILP picks
+# how many hosts of each class are on at every step and spreads the VMs over the classes:
+#
+#   classes       (host type, DVFS level); hosts are interchangeable within a type, so only
+#                 counts n[c, t] are integer. Without DVFS only level 0 exists
+#   assignment    x[v, c, t] = share of VM v on class c at step t (continuous by default, binary
+#                 with integral_assignment); VMs may move freely between steps
+#   packing       per class and step: demand within n * the level's capacity, and with
+#                 reservations also allocated cpu, ram and storage within n * host limits.
+#                 Runner.migrate_vms and migrate_adaptive pack by demand only, so only runs
+#                 without migration are bounded with reservations
+#   energy        idle power of every host on + linear dynamic power of the demand it serves,
+#                 plus boot energy whenever the number of hosts of a type that are on grows
+#
+#   unserved      a window whose peak cannot be packed (where runs reject VMs) is solved again
+#                 with VMs allowed to go unserved at a penalty above the cost of serving them
+#
+# Each of these relaxes what the simulator can do, so the optimum is a lower bound on the energy
+# (energy_kwh + boot_energy_kwh) of any policy that serves every VM without overloading a host
+# (SLATAH = 0; demand above capacity costs no power in the simulator). Runs that rejected VMs
+# served less than the bound assumes and cannot be compared with it. The day is decomposed into
+# windows of window_steps steps solved independently; only the boot coupling across window
+# boundaries is dropped (hosts may be on for free at the start of a window), which keeps the sum
+# of the window bounds a valid bound. The dual bound of each window is used, so windows that hit
+# the time limit still give a valid (weaker) bound.
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_matrix, vstack
+
+from Helper import create_host_list
+from vector_engine import HostArrays, decode_utilization
+
+# Penalty of an unserved (VM, step) relative to serving it alone on the costliest host
+UNSERVED_PENALTY_FACTOR = 10.0
+
+
+def host_classes(host_arrays, dvfs=False):
+    """
+    Group hosts into types with identical limits and power tables, and expand them into
+    (type, DVFS level) classes.
+
+    :return: Dict of per-class arrays (type, level, cpu/ram/storage limit, capacity, idle power,
+             slope in W per MIPS) and per-type arrays (count, boot_energy_joules)
+    """
+    h = host_arrays
+    levels = range(h.level_cpu_capacity.shape[0]) if dvfs else [0]
+    signature = np.column_stack([h.cpu_limit, h.ram_limit, h.storage_limit, h.boot_energy_joules,
+                                 h.level_cpu_capacity.T, h.level_power_idle.T, h.level_power_max.T])
+    _, first, type_of_host = np.unique(signature, axis=0, return_index=True, return_inverse=True)
+    type_of_host = type_of_host.ravel()
+
+    classes = {"type": [], "level": [], "host": []}
+    for k, j in enumerate(first):
+        for level in levels:
+            if h.level_cpu_capacity[level, j] > 0:
+                classes["type"].append(k)
+                classes["level"].append(level)
+                classes["host"].append(j)
+    j = np.array(classes["host"])
+    level = np.array(classes["level"])
+    capacity = h.level_cpu_capacity[level, j]
+    return {
+        "type": np.array(classes["type"]),
+        "level": level,
+        "cpu_limit": h.cpu_limit[j],
+        "ram_limit": h.ram_limit[j],
+        "storage_limit": h.storage_limit[j],
+        "capacity": capacity,
+        "idle": h.level_power_idle[level, j],
+        "slope": (h.level_power_max[level, j] - h.level_power_idle[level, j]) / capacity,
+        "type_count": np.bincount(type_of_host, minlength=len(first)),
+        "type_boot_joules": h.boot_energy_joules[first],
+    }
+
+
+def vm_demand(workload, time_steps=288):
+    """
+    (V, T) MIPS demanded by every VM at every step (0 outside its lifetime) and the (V, T) alive mask.
+    """
+    arrival = np.asarray(workload["arrival"])
+    expiry = arrival + np.asarray(workload["lifetime"])
+    steps = np.arange(time_steps)
+    alive = (steps[None, :] >= arrival[:, None]) & (steps[None, :] < expiry[:, None])
+    ratio = decode_utilization(np.asarray(workload["traces"])[np.asarray(workload["trace_index"])])
+    demand = np.where(alive, np.asarray(workload["cpu"])[:, None] * ratio[:, :time_steps], 0.0)
+    return demand, alive
+
+
+def _solve_window(steps, workload, demand, alive, classes, step_duration_sec, include_boot, reservations,
+                  integral_assignment, time_limit, mip_rel_gap, allow_unserved=False):
+    """
+    :return: (bound in joules, whether it is optimal), or None when not every VM can be served and
+             allow_unserved is False
+    """
+    C = len(classes["type"])
+    K = len(classes["type_count"])
+    W = len(steps)
+    cpu, ram, storage = (np.asarray(workload[name], dtype=np.float64) for name in ("cpu", "ram", "storage"))
+
+    # Variables: x for every alive (vm, step) pair and class, then n[c, s], then b[k, s] for s >= 1,
+    # then (with allow_unserved) the unserved share u of every pair
+    pair_step, pair_vm = np.nonzero(alive[:, steps].T)
+    P = len(pair_vm)
+    num_x = P * C
+    n_offset = num_x
+    b_offset = n_offset + C * W
+    u_offset = b_offset + (K * (W - 1) if include_boot else 0)
+    num_u = P if allow_unserved else 0
+    num_vars = u_offset + num_u
+    x_index = np.arange(num_x).reshape(P, C)
+    n_index = n_offset + np.arange(C * W).reshape(W, C)
+
+    # A VM only goes to classes where it fits on a single host
+    pair_demand = demand[pair_vm, steps[pair_step]]
+    fits = pair_demand[:, None] <= classes["capacity"] + 1e-9
+    if reservations:
+        fits &= ((cpu[pair_vm][:, None] <= classes["cpu_limit"]) & (ram[pair_vm][:, None] <= classes["ram_limit"])
+                 & (storage[pair_vm][:, None] <= classes["storage_limit"]))
+
+    cost = np.zeros(num_vars)
+    cost[:num_x] = (step_duration_sec * pair_demand[:, None] * classes["slope"]).ravel()
+    cost[n_offset:b_offset] = np.tile(step_duration_sec * classes["idle"], W)
+    upper = np.full(num_vars, np.inf)
+    upper[:num_x] = fits.ravel().astype(np.float64)
+    upper[n_offset:b_offset] = np.tile(classes["type_count"][classes["type"]], W)
+    integrality = np.zeros(num_vars)
+    integrality[n_offset:b_offset] = 1
+    if integral_assignment:
+        integrality[:num_x] = 1
+    if include_boot:
+        cost[b_offset:u_offset] = np.tile(classes["type_boot_joules"], W - 1)
+    if allow_unserved:
+        serve_alone = step_duration_sec * (pair_demand * classes["slope"].max() + classes["idle"].max())
+        if include_boot:
+            serve_alone += classes["type_boot_joules"].max()
+        cost[u_offset:] = UNSERVED_PENALTY_FACTOR * serve_alone
+        upper[u_offset:] = 1.0
+
+    blocks, lower_bounds, upper_bounds = [], [], []
+
+    # Every alive VM is fully placed or left unserved
+    rows = np.concatenate([np.repeat(np.arange(P), C), np.arange(num_u)])
+    columns = np.concatenate([x_index.ravel(), u_offset + np.arange(num_u)])
+    blocks.append(coo_matrix((np.ones(num_x + num_u), (rows, columns)), shape=(P, num_vars)))
+    lower_bounds.append(np.ones(P))
+    upper_bounds.append(np.ones(P))
+
+    # Packing: per (step, class), resource use minus n * limit <= 0
+    row_of_pair = pair_step[:, None] * C + np.arange(C)[None, :]
+    packing = [(pair_demand, classes["capacity"])]
+    if reservations:
+        packing += [(cpu[pair_vm], classes["cpu_limit"]), (ram[pair_vm], classes["ram_limit"]),
+                    (storage[pair_vm], classes["storage_limit"])]
+    for use, limit in packing:
+        data = np.concatenate([np.repeat(use, C), -np.tile(limit, W)])
+        r = np.concatenate([row_of_pair.ravel(), np.arange(W * C)])
+        c = np.concatenate([x_index.ravel(), n_index.ravel()])
+        blocks.append(coo_matrix((data, (r, c)), shape=(W * C, num_vars)))
+        lower_bounds.append(np.full(W * C, -np.inf))
+        upper_bounds.append(np.zeros(W * C))
+
+    # At most the hosts of a type are on, over all its DVFS levels
+    type_rows = np.arange(W)[:, None] * K + classes["type"][None, :]
+    blocks.append(coo_matrix((np.ones(W * C), (type_rows.ravel(), n_index.ravel())), shape=(W * K, num_vars)))
+    lower_bounds.append(np.zeros(W * K))
+    upper_bounds.append(np.tile(classes["type_count"], W).astype(np.float64))
+
+    # Boot: hosts on of type k at s minus at s - 1 <= b[k, s]
+    if include_boot and W > 1:
+        b_index = b_offset + np.arange(K * (W - 1)).reshape(W - 1, K)
+        r_now = (np.arange(1, W)[:, None] - 1) * K + classes["type"][None, :]
+        data = np.concatenate([np.ones((W - 1) * C), -np.ones((W - 1) * C), -np.ones((W - 1) * K)])
+        r = np.concatenate([r_now.ravel(), r_now.ravel(), np.arange((W - 1) * K)])
+        c = np.concatenate([n_index[1:].ravel(), n_index[:-1].ravel(), b_index.ravel()])
+        blocks.append(coo_matrix((data, (r, c)), shape=((W - 1) * K, num_vars)))
+        lower_bounds.append(np.full((W - 1) * K, -np.inf))
+        upper_bounds.append(np.zeros((W - 1) * K))
+
+    constraint = LinearConstraint(vstack(blocks).tocsr(), np.concatenate(lower_bounds), np.concatenate(upper_bounds))
+    options = {"disp": False, "mip_rel_gap": mip_rel_gap}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    result = milp(cost, integrality=integrality, bounds=Bounds(np.zeros(num_vars), upper),
+                  constraints=constraint, options=options)
+    if result.status == 2 and not allow_unserved:
+        return None
+    if result.x is None and result.status != 1:
+        raise ValueError(f"Window starting at step {steps[0]} could not be solved: {result.message}")
+    bound = getattr(result, "mip_dual_bound", None)
+    if bound is None or not np.isfinite(bound):
+        bound = result.fun
+    return float(bound), result.status == 0
+
+
+def energy_lower_bound(workload, host_arrays, dvfs=False, step_duration_sec=300, time_steps=288, window_steps=12,
+                       include_boot=True, reservations=True, integral_assignment=False, time_limit=60.0,
+                       mip_rel_gap=1e-3):
+    """
+    Lower bound on the energy of any placement/migration schedule of a recorded day.
+
+    :param workload: Workload dict (vector_engine.build_workload or RequestLog.to_workload)
+    :param host_arrays: vector_engine.HostArrays of the fleet
+    :param dvfs: Let hosts run at any DVFS level (bound for DVFS-enabled runs)
+    :param window_steps: Steps per independently solved MILP
+    :param include_boot: Include boot energy (compare with energy_kwh + boot_energy_kwh) or not
+                         (compare with energy_kwh)
+    :param reservations: Enforce the cpu/ram/storage reservation limits, as placement does; turn off
+                         to bound runs that migrate (Runner.migrate_vms and migrate_adaptive check
+                         CPU demand, not reservations)
+    :param integral_assignment: Binary VM-to-class assignment (tighter, slower)
+    :param time_limit: Seconds per window; the window's dual bound is used if it is reached
+    :param mip_rel_gap: Relative gap at which a window stops; its dual bound stays valid
+    :return: Dict with lower_bound_joules, lower_bound_kwh, window_bounds_joules, windows_optimal,
+             solve_sec and unserved_windows (windows where the hosts cannot serve every VM; above
+             zero the bound includes unserved penalties, not just energy)
+    """
+    if window_steps < 1:
+        raise ValueError("window_steps must be at least 1")
+    classes = host_classes(host_arrays, dvfs)
+    demand, alive = vm_demand(workload, time_steps)
+    bounds = []
+    optimal = 0
+    unserved = 0
+    start = time.perf_counter()
+    for first in range(0, time_steps, window_steps):
+        steps = np.arange(first, min(first + window_steps, time_steps))
+        args = (steps, workload, demand, alive, classes, step_duration_sec, include_boot, reservations,
+                integral_assignment, time_limit, mip_rel_gap)
+        solved = _solve_window(*args)
+        if solved is None:
+            solved = _solve_window(*args, allow_unserved=True)
+            unserved += 1
+        bound, is_optimal = solved
+        bounds.append(bound)
+        optimal += is_optimal
+    total = float(np.sum(bounds))
+    return {
+        "lower_bound_joules": total,
+        "lower_bound_kwh": total / 3_600_000,
+        "window_bounds_joules": bounds,
+        "windows_optimal": optimal,
+        "num_windows": len(bounds),
+        "solve_sec": time.perf_counter() - start,
+        "unserved_windows": unserved,
+    }
+
+
+def case_workload(case):
+    """
+    The workload run_case simulates for a case (same profiles and VM types).
+    """
+    from monte_carlo import build_replica_batch
+
+    batch = build_replica_batch(case, 1)
+    num_vms = int(batch["num_vms"][0])
+    workload = {name: batch[name][0, :num_vms] for name in ("arrival", "lifetime", "trace_index", "cpu", "ram",
+                                                              "storage")}
+    workload["traces"] = batch["traces"]
+    return workload
+
+
+def case_lower_bound(case, **kwargs):
+    """
+    Lower bound for a sweep case: depends on its workload, DVFS and whether it migrates, not on the policy.
+    Every migration mode (default and the overload detectors) may exceed CPU reservations, so
+    reservations are only enforced with migration disabled.
+    """
+    kwargs.setdefault("reservations", case["migration"] == "disable")
+    return energy_lower_bound(case_workload(case), HostArrays(create_host_list(case["num_hosts"])),
+                              dvfs=case["dvfs"], step_duration_sec=case["step_duration_sec"],
+                              time_steps=case["time_steps"], **kwargs)
+
+
+if __name__ == "__main__":
+    import ComprehensiveExperiment_FinalReport as experiment
+    from result_cache import ResultCache
+
+    window_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    cache = ResultCache("results_cache")
+    bounds = {}
+    rows = []
+    for case in experiment.build_cases():
+        key = (case["seed"], case["trace_day"], case["dvfs"], case["migration"])
+        if key not in bounds:
+            experiment.block_print()
+            try:
+                bounds[key] = case_lower_bound(case, window_steps=window_steps)
+            finally:
+                experiment.enable_print()
+            print(f"Lower bound seed={case['seed']} day={case['trace_day']} DVFS={case['dvfs']} "
+                  f"migration={case['migration']}: "
+                  f"{bounds[key]['lower_bound_kwh']:.3f} kWh ({bounds[key]['windows_optimal']}/"
+                  f"{bounds[key]['num_windows']} windows optimal, {bounds[key]['solve_sec']:.1f} s, "
+                  f"{bounds[key]['unserved_windows']} windows with unserved VMs)")
+        result = cache.get(case)
+        if result is None:
+            experiment.block_print()
+            try:
+                result = experiment.run_case(case)
+            finally:
+                experiment.enable_print()
+            cache.put(case, result)
+        energy = result["energy_kwh"] + result.get("boot_energy_kwh", 0.0)
+        # The bound assumes every VM is served within host capacity; a run that rejected some or
+        # overloaded a host (demand above capacity costs no power), or a bound that had to leave
+        # demand unserved (and so counts penalties), is not comparable
+        rejected = int(result.get("rejected_vms", 0))
+        slatah = result.get("slatah", 0.0)
+        gap_valid = rejected == 0 and slatah == 0 and bounds[key]["unserved_windows"] == 0
+        rows.append({
+            "policy": case["policy"],
+            "dvfs": case["dvfs"],
+            "migration": case["migration"],
+            "seed": case["seed"],
+            "energy_with_boot_kwh": energy,
+            "slatah": slatah,
+            "lower_bound_kwh": bounds[key]["lower_bound_kwh"],
+            "rejected_vms": rejected,
+            "unserved_windows": bounds[key]["unserved_windows"],
+            "gap_valid": gap_valid,
+            "gap_pct": (100.0 * (energy - bounds[key]["lower_bound_kwh"]) / bounds[key]["lower_bound_kwh"]
+                        if gap_valid else float("nan")),
+        })
+
+    report = pd.DataFrame(rows)
+    report.to_csv("results_lower_bound.csv", index=False)
+    print(report.to_string(index=False))
+    if os.path.exists("results.sqlite"):
+        from results_warehouse import ResultsWarehouse
+        with ResultsWarehouse("results.sqlite") as warehouse:
+            warehouse.start_run("lower bound")
+            for case, row in zip(experiment.build_cases(), rows):
+                if row["gap_valid"]:
+                    warehouse.add_result(case, {"lower_bound_kwh": row["lower_bound_kwh"], "gap_pct": row["gap_pct"]})
+                else:
+                    warehouse.add_result(case, {"rejected_vms": row["rejected_vms"], "slatah": row["slatah"]})
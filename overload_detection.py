@@ -0,0 +1,202 @@
+# overload_detection.py
+#
+# Rolling-window host overload detectors for dynamic consolidation (Beloglazov and Buyya,
+# "Optimal online deterministic algorithms and adaptive heuristics for energy and performance
+# efficient dynamic consolidation of virtual machines in cloud data centers", CCPE 2012):
+#
+#   thr   static threshold: overloaded when u > threshold
+#   iqr   adaptive threshold 1 - s * IQR of the host's last W utilizations (s = 1.5)
+#   mad   adaptive threshold 1 - s * MAD, the median absolute deviation of the window (s = 2.5)
+#   lr    least-squares line through the window; overloaded when s * predicted next u >= 1 (s = 1.2)
+#
+# A host is underloaded below a fixed underload_threshold. Until min_history utilizations have
+# been seen the adaptive detectors fall back to the static threshold.
+#
+# The last W utilizations of every host are kept in a (H, W) ring buffer plus a copy with each row
+# sorted. A push evicts the oldest value from every sorted row and inserts the new one with a few
+# whole-array gathers, so quantiles (median, IQR) are O(H) reads, and the regression sums
+# (sum of u and of i * u over the window) are updated in O(H). MAD takes one partition of the
+# (H, W) deviations.
+
+import numpy as np
+
+METHODS = ["thr", "iqr", "mad", "lr"]
+DEFAULT_SAFETY = {"thr": 1.0, "iqr": 1.5, "mad": 2.5, "lr": 1.2}
+
+
+class OverloadDetector:
+    def __init__(self, num_hosts, method="mad", window=12, safety=None, threshold=0.8,
+                 underload_threshold=0.2, min_history=None):
+        """
+        :param num_hosts: H, hosts in the order utilizations are pushed
+        :param method: One of METHODS
+        :param window: W, utilizations kept per host
+        :param safety: Safety parameter s (defaults to DEFAULT_SAFETY[method])
+        :param threshold: Static overload threshold (thr, and the fallback of the others)
+        :param underload_threshold: Hosts below it are consolidated
+        :param min_history: Utilizations needed before the adaptive estimate is used (defaults to W)
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown overload detector: {method}")
+        if window < 3:
+            raise ValueError("window must be at least 3")
+        self.method = method
+        self.window = window
+        self.safety = DEFAULT_SAFETY[method] if safety is None else safety
+        self.threshold = threshold
+        self.underload_threshold = underload_threshold
+        self.min_history = window if min_history is None else min(min_history, window)
+
+        self.values = np.zeros((num_hosts, window))         # Ring buffer, column pos is the oldest
+        self.sorted = np.full((num_hosts, window), np.inf)  # Rows ascending, +inf where not yet filled
+        self.pos = 0
+        self.count = 0
+        self._sum = np.zeros(num_hosts)         # sum of u over the window
+        self._weighted = np.zeros(num_hosts)    # sum of i * u, i = 0 for the oldest
+        self._cols = np.arange(window)
+
+    def push(self, utilization):
+        """
+        Append one step of utilization, (H,), for all hosts.
+        """
+        u = np.asarray(utilization, dtype=np.float64)
+        W = self.window
+        if self.count == W:
+            old = self.values[:, self.pos].copy()
+            self._sum -= old
+            self._weighted -= self._sum     # Every remaining value moves one index down
+            self._weighted += (W - 1) * u
+        else:
+            old = np.full(len(u), np.inf)
+            self._weighted += self.count * u
+        self._sum += u
+        self.values[:, self.pos] = u
+
+        # Sorted rows: drop one copy of the evicted value, then insert the new one in place
+        cols = self._cols
+        drop = np.argmax(self.sorted == old[:, None], axis=1)
+        rest = np.take_along_axis(self.sorted, cols[:-1] + (cols[:-1] >= drop[:, None]), axis=1)
+        at = (rest < u[:, None]).sum(axis=1)
+        shifted = np.take_along_axis(rest, np.minimum(cols - (cols > at[:, None]), W - 2), axis=1)
+        self.sorted = np.where(cols == at[:, None], u[:, None], shifted)
+
+        self.pos = (self.pos + 1) % W
+        self.count = min(self.count + 1, W)
+        if self.pos == 0:
+            # Re-derive the running sums once per window so rounding errors do not accumulate
+            self._sum = self.values.sum(axis=1)
+            self._weighted = self.values @ cols.astype(np.float64)
+
+    def history(self):
+        """
+        (H, n) utilizations in the window, oldest first.
+        """
+        if self.count < self.window:
+            return self.values[:, :self.count]
+        return np.roll(self.values, -self.pos, axis=1)
+
+    # ---------- Window statistics ----------
+
+    def quantile(self, q):
+        """
+        (H,) q-quantile of each host's window, with numpy's default linear interpolation.
+        """
+        if self.count == 0:
+            return np.zeros(len(self.values))
+        position = q * (self.count - 1)
+        lo = int(np.floor(position))
+        hi = min(lo + 1, self.count - 1)
+        frac = position - lo
+        return self.sorted[:, lo] * (1 - frac) + self.sorted[:, hi] * frac
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def iqr(self):
+        return self.quantile(0.75) - self.quantile(0.25)
+
+    def mad(self):
+        if self.count == 0:
+            return np.zeros(len(self.values))
+        deviations = np.abs(self.sorted[:, :self.count] - self.median()[:, None])
+        return np.median(deviations, axis=1)
+
+    def predict(self):
+        """
+        (H,) utilization of the next step extrapolated from the least-squares line through the window.
+        """
+        n = self.count
+        if n < 2:
+            return self._sum.copy()
+        sx = n * (n - 1) / 2
+        sxx = (n - 1) * n * (2 * n - 1) / 6
+        slope = (n * self._weighted - sx * self._sum) / (n * sxx - sx * sx)
+        intercept = (self._sum - slope * sx) / n
+        return intercept + slope * n
+
+    # ---------- Decisions ----------
+
+    def adaptive(self):
+        return self.method != "thr" and self.count >= self.min_history
+
+    def upper_threshold(self):
+        """
+        (H,) utilization a host may reach without counting as overloaded. For lr, 1 / s.
+        """
+        H = len(self.values)
+        if not self.adaptive():
+            return np.full(H, self.threshold)
+        if self.method == "iqr":
+            return np.clip(1 - self.safety * self.iqr(), 0.0, 1.0)
+        if self.method == "mad":
+            return np.clip(1 - self.safety * self.mad(), 0.0, 1.0)
+        return np.full(H, 1 / self.safety)
+
+    def overloaded(self, utilization):
+        """
+        (H,) bool, judged on the current utilization and the window pushed so far.
+        """
+        if self.method == "lr" and self.adaptive():
+            return self.safety * self.predict() >= 1
+        return np.asarray(utilization) > self.upper_threshold()
+
+    def excess(self, utilization):
+        """
+        (H,) utilization a host has to shed to stop being overloaded (<= 0 when it is not).
+        """
+        if self.method == "lr" and self.adaptive():
+            return self.predict() - 1 / self.safety
+        return np.asarray(utilization) - self.upper_threshold()
+
+    def underloaded(self, utilization):
+        return np.asarray(utilization) < self.underload_threshold
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    H, W, T = 10_000, 12, 288
+    trend = np.clip(0.5 + 0.4 * np.sin(np.linspace(0, 2 * np.pi, T)), 0, 1)
+    detectors = {method: OverloadDetector(H, method, window=W) for method in METHODS}
+    history = np.zeros((H, T))
+    elapsed = {method: 0.0 for method in METHODS}
+    for t in range(T):
+        u = np.clip(trend[t] + rng.normal(0, 0.1, H), 0, 1)
+        history[:, t] = u
+        for method, detector in detectors.items():
+            start = time.perf_counter()
+            detector.push(u)
+            detector.overloaded(u)
+            elapsed[method] += time.perf_counter() - start
+
+    window = history[:, -W:]
+    mad = detectors["mad"]
+    assert np.allclose(mad.median(), np.median(window, axis=1))
+    assert np.allclose(mad.mad(), np.median(np.abs(window - np.median(window, axis=1)[:, None]), axis=1))
+    assert np.allclose(mad.iqr(), np.subtract(*np.percentile(window, [75, 25], axis=1)))
+    slope, intercept = np.polyfit(np.arange(W), window.T, 1)
+    assert np.allclose(detectors["lr"].predict(), intercept + slope * W)
+    for method, detector in detectors.items():
+        print(f"{method}: {detector.overloaded(history[:, -1]).sum()} of {H} hosts overloaded, "
+              f"{elapsed[method] / T * 1000:.2f} ms per step")
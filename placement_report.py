@@ -0,0 +1,87 @@
+# placement_report.py
+#
+# Compares power-of-d-choices placement (SchedulerVM(sample_size=d)) against the exact
+# policies: energy and rejected VMs on the sweep cases, and placement latency as the fleet grows.
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import ComprehensiveExperiment_FinalReport as experiment
+from datacenter import VM
+from Helper import create_host_list
+from schedule import SchedulerVM
+
+SAMPLED_POLICIES = ["least_utilized", "most_utilized", "best_fit", "worst_fit", "energy_aware"]
+
+
+def compare_sampled_placement(cases, sample_sizes=(2, 4, 8)):
+    """
+    Run every case exactly and with each sample size.
+
+    :param cases: Case dicts from build_cases
+    :param sample_sizes: Values of d to compare
+    :return: DataFrame with one row per case and sample size (0 = exact)
+    """
+    rows = []
+    for case in cases:
+        exact = None
+        for d in (0,) + tuple(sample_sizes):
+            experiment.block_print()
+            try:
+                result = experiment.run_case(dict(case, sample_size=d or None))
+            finally:
+                experiment.enable_print()
+            if d == 0:
+                exact = result
+            rows.append({
+                "policy": case["policy"],
+                "dvfs": case["dvfs"],
+                "migration": case["migration"],
+                "sample_size": d,
+                "energy_kwh": result["energy_kwh"],
+                "energy_delta_pct": 100.0 * (result["energy_kwh"] - exact["energy_kwh"]) / exact["energy_kwh"],
+                "rejected_vms": result["rejected_vms"],
+                "extra_rejected_vms": result["rejected_vms"] - exact["rejected_vms"],
+            })
+    return pd.DataFrame(rows)
+
+
+def placement_latency(num_hosts, policy="best_fit", sample_size=None, num_vms=200, fill_ratio=0.5, seed=0):
+    """
+    Mean time in seconds to place one VM on a partially filled fleet.
+    """
+    rng = np.random.default_rng(seed)
+    experiment.block_print()
+    try:
+        hosts = create_host_list(num_hosts)
+        for host in hosts:
+            for _ in range(int(rng.random() < fill_ratio) * 2):
+                host.vms.append(VM(-1, cpu=rng.choice([500.0, 1000.0]), ram=5, storage=5, is_online_service=True))
+        scheduler = SchedulerVM(hosts, policy, rng=rng, sample_size=sample_size)
+        vms = [VM(i, cpu=500.0, ram=5, storage=5, is_online_service=True) for i in range(num_vms)]
+        for vm in vms:
+            vm.cloudlet.trace_mean = 0.3
+        start = time.perf_counter()
+        for vm in vms:
+            scheduler._select_host(vm)
+        return (time.perf_counter() - start) / num_vms
+    finally:
+        experiment.enable_print()
+
+
+if __name__ == "__main__":
+    sample_sizes = tuple(int(d) for d in sys.argv[1:]) or (2, 4, 8)
+    cases = [c for c in experiment.build_cases() if c["policy"] in SAMPLED_POLICIES]
+    report = compare_sampled_placement(cases, sample_sizes)
+    report.to_csv("results_sampled_placement.csv", index=False)
+    print(report.groupby(["policy", "sample_size"])[["energy_delta_pct", "extra_rejected_vms"]].mean())
+
+    print("\nPlacement latency (best_fit, ms per VM)")
+    for num_hosts in (1_000, 10_000, 100_000):
+        exact = placement_latency(num_hosts, num_vms=20)
+        sampled = [placement_latency(num_hosts, sample_size=d) for d in sample_sizes]
+        print(f"{num_hosts:>7} hosts: exact {exact * 1e3:.3f}"
+              + "".join(f" | d={d} {t * 1e3:.3f}" for d, t in zip(sample_sizes, sampled)))
@@ -0,0 +1,177 @@
+# plotting.py
+#
+# Plots that stay readable and fast for large fleets and long runs: host utilization as a
+# binned heatmap or as percentile bands instead of one line per host, and largest-triangle-
+# three-buckets (LTTB) downsampling of long series. Everything works on the array history
+# ((T, H) arrays from the vector engines, or Runner's {host_id: list} dict) and draws on
+# matplotlib Figure objects with the Agg canvas, so figures can be rendered headlessly and
+# in parallel worker processes.
+
+import multiprocessing
+import os
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from vector_engine import decode_utilization
+
+
+def history_array(host_utilization_history):
+    """
+    :param host_utilization_history: {host_id: list of T values} or array of shape (T, H),
+                                     in any of vector_engine.UTILIZATION_DTYPES
+    :return: (T, H) float array and the list of host ids
+    """
+    if isinstance(host_utilization_history, dict):
+        host_ids = list(host_utilization_history)
+        values = np.array([host_utilization_history[h] for h in host_ids], dtype=np.float64).T
+        return values.reshape(-1, len(host_ids)), host_ids
+    values = decode_utilization(host_utilization_history)
+    return values, list(range(values.shape[1]))
+
+
+def lttb(x, y, num_out):
+    """
+    Largest-triangle-three-buckets downsampling: keep num_out points of (x, y) that preserve
+    the visual shape of the series. First and last points are always kept.
+
+    :return: Indices of the kept points
+    """
+    n = len(y)
+    if num_out >= n or num_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, num_out - 1).astype(np.int64)
+    keep = np.empty(num_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(num_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def plot_host_heatmap(ax, history, step_minutes=5, max_rows=200, max_cols=1000, sort_hosts=True):
+    """
+    Host utilization as an image: time on x, hosts on y. Hosts are sorted by mean utilization
+    and averaged into at most max_rows bins; steps are averaged into at most max_cols bins.
+
+    :param ax: matplotlib Axes
+    :param history: (T, H) array or {host_id: list}
+    """
+    values, _ = history_array(history)
+    T, H = values.shape
+    if sort_hosts:
+        values = values[:, np.argsort(values.mean(axis=0), kind="stable")]
+    image = _bin_mean(_bin_mean(values.T, max_rows), max_cols, axis=1)
+    extent = (0, T * step_minutes, 0, H)
+    im = ax.imshow(image, aspect="auto", origin="lower", extent=extent, vmin=0.0, vmax=1.0,
+                   cmap="viridis", interpolation="nearest")
+    ax.set_xlabel("Time (minutes)")
+    ax.set_ylabel("Hosts (sorted by mean utilization)" if sort_hosts else "Host")
+    ax.figure.colorbar(im, ax=ax, label="CPU Utilization (0–1)")
+    return im
+
+
+def plot_percentile_bands(ax, history, step_minutes=5, percentiles=(5, 25, 50, 75, 95), max_points=1000,
+                          active_only=False):
+    """
+    Median host utilization with shaded percentile bands over time. Long series are
+    downsampled with LTTB on the median; the bands use the same time points.
+
+    :param ax: matplotlib Axes
+    :param history: (T, H) array or {host_id: list}
+    :param percentiles: Symmetric percentiles; the middle one is drawn as a line
+    :param active_only: Ignore hosts at zero utilization at each step
+    """
+    values, _ = history_array(history)
+    if active_only:
+        values = np.where(values > 0, values, np.nan)
+    with np.errstate(all="ignore"):
+        levels = np.nanpercentile(values, percentiles, axis=1)
+    time_axis = np.arange(values.shape[0]) * step_minutes
+    mid = len(percentiles) // 2
+    keep = lttb(time_axis, np.nan_to_num(levels[mid]), max_points)
+
+    for i in range(mid):
+        alpha = 0.15 + 0.2 * i / max(mid - 1, 1)
+        ax.fill_between(time_axis[keep], levels[i, keep], levels[-1 - i, keep], alpha=alpha, color="tab:blue",
+                        linewidth=0, label=f"p{percentiles[i]}–p{percentiles[-1 - i]}")
+    ax.plot(time_axis[keep], levels[mid, keep], color="tab:blue", label=f"p{percentiles[mid]}")
+    ax.plot(time_axis[keep], np.nanmean(values, axis=1)[keep], color="tab:orange", linestyle="--", label="mean")
+    ax.set_xlabel("Time (minutes)")
+    ax.set_ylabel("CPU Utilization (0–1)")
+    ax.set_ylim(0, 1)
+    ax.grid(True)
+    ax.legend(loc="upper right", fontsize="small")
+
+
+def plot_series(ax, y, step_minutes=5, max_points=1000, **kwargs):
+    """
+    Plot one long series after LTTB downsampling.
+    """
+    x = np.arange(len(y)) * step_minutes
+    keep = lttb(x, y, max_points)
+    return ax.plot(x[keep], np.asarray(y)[keep], **kwargs)
+
+
+def _bin_mean(values, max_bins, axis=0):
+    """
+    Average consecutive entries along axis into at most max_bins bins.
+    """
+    n = values.shape[axis]
+    if n <= max_bins:
+        return values
+    edges = np.linspace(0, n, max_bins + 1).astype(np.int64)
+    sums = np.add.reduceat(values, edges[:-1], axis=axis)
+    counts = np.diff(edges)
+    shape = [1] * values.ndim
+    shape[axis] = max_bins
+    return sums / counts.reshape(shape)
+
+
+def render_figure(job):
+    """
+    Render one figure to a file with the Agg canvas.
+
+    :param job: Dict with path, kind ("heatmap" or "bands"), history, and optional title,
+                step_minutes and figsize
+    :return: The written path
+    """
+    fig = Figure(figsize=job.get("figsize", (14, 6)))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    step_minutes = job.get("step_minutes", 5)
+    if job["kind"] == "heatmap":
+        plot_host_heatmap(ax, job["history"], step_minutes=step_minutes)
+    elif job["kind"] == "bands":
+        plot_percentile_bands(ax, job["history"], step_minutes=step_minutes)
+    else:
+        raise ValueError(f"Unknown figure kind: {job['kind']}")
+    ax.set_title(job.get("title", ""))
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(job["path"]) or ".", exist_ok=True)
+    fig.savefig(job["path"], dpi=job.get("dpi", 100))
+    return job["path"]
+
+
+def render_figures(jobs, processes=None):
+    """
+    Render many figures (e.g. one per sweep case) in parallel worker processes.
+
+    :param jobs: List of job dicts for render_figure
+    :param processes: Worker count (defaults to the CPU count); 1 renders in this process
+    :return: List of written paths
+    """
+    if processes == 1 or len(jobs) <= 1:
+        return [render_figure(job) for job in jobs]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(render_figure, jobs)
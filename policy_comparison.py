@@ -0,0 +1,144 @@
+# policy_comparison.py
+#
+# Replicated comparison of placement policies with variance reduction:
+#
+#   common random numbers  every policy runs on the same replica workloads (arrivals, lifetimes,
+#                          traces, VM types) and the same random-policy streams, so the energy
+#                          differences between policies are computed on paired replicas and most
+#                          of the workload noise cancels out
+#   antithetic lifetimes   lifetimes are drawn in (u, 1 - u) pairs (case["antithetic_lifetimes"])
+#   sequential stopping    replicas are added in batches until the confidence interval of every
+#                          pairwise energy difference is narrower than the requested precision
+#                          (Bonferroni-corrected, so all intervals hold jointly)
+
+import itertools
+import sys
+
+import numpy as np
+import pandas as pd
+
+from ComprehensiveExperiment_FinalReport import build_cases, placement_policies
+from Helper import create_host_list
+from monte_carlo import build_replica_batch, confidence_interval, replica_seeds, vector_migration
+from vector_engine import HostArrays, run_batched_simulation
+
+# Seed offset between policies when common random numbers are disabled
+INDEPENDENT_SEED_STRIDE = 1_000_003
+
+
+def run_policies(case, policies, replicas, first_replica=0, crn=True, host_arrays=None):
+    """
+    Energy (kWh) of every policy on replicas [first_replica, first_replica + replicas).
+
+    :param case: Case dict; its policy is ignored
+    :param policies: Policy names
+    :param crn: Common random numbers; without them each policy gets its own workloads
+    :return: {policy: (replicas,) energy in kWh}
+    """
+    host_arrays = host_arrays or HostArrays(create_host_list(case["num_hosts"]))
+    migration = vector_migration(case)
+    shared_batch = build_replica_batch(case, replicas, first_replica=first_replica) if crn else None
+
+    energy = {}
+    for k, policy in enumerate(policies):
+        policy_case = case if crn else dict(case, seed=case["seed"] + INDEPENDENT_SEED_STRIDE * (k + 1))
+        batch = shared_batch if crn else build_replica_batch(policy_case, replicas, first_replica=first_replica)
+        rngs = [np.random.default_rng(seed) for seed in replica_seeds(policy_case, replicas, first_replica)]
+        result = run_batched_simulation(
+            batch, host_arrays,
+            policy=policy,
+            dvfs=case["dvfs"],
+            migration=migration,
+            step_duration_sec=case["step_duration_sec"],
+            time_steps=case["time_steps"],
+            rngs=rngs
+        )
+        energy[policy] = result["energy_joules"] / 3_600_000
+    return energy
+
+
+def pairwise_differences(energy, confidence=0.95):
+    """
+    Paired confidence intervals of the energy difference of every policy pair, at a per-pair level
+    that makes all intervals hold jointly with the given confidence (Bonferroni).
+
+    :param energy: {policy: (n,) energy in kWh}, replica i of every policy paired
+    :return: DataFrame with policy_a, policy_b, mean_diff_kwh (a - b), std, half_width, ci_low, ci_high
+    """
+    pairs = list(itertools.combinations(energy, 2))
+    level = 1 - (1 - confidence) / max(len(pairs), 1)
+    rows = []
+    for a, b in pairs:
+        mean, std, lower, upper = confidence_interval(energy[a] - energy[b], level)
+        rows.append({"policy_a": a, "policy_b": b, "mean_diff_kwh": mean, "std_kwh": std,
+                     "half_width_kwh": (upper - lower) / 2, "ci_low_kwh": lower, "ci_high_kwh": upper})
+    return pd.DataFrame(rows)
+
+
+def sequential_comparison(case, policies=None, confidence=0.95, rel_precision=0.005, abs_precision_kwh=None,
+                          initial_replicas=5, batch_replicas=5, max_replicas=200, crn=True):
+    """
+    Add replicas until every pairwise difference is known to the requested precision.
+
+    :param case: Case dict fixing everything but the policy
+    :param policies: Policies to compare (defaults to all placement policies)
+    :param confidence: Joint confidence of all pairwise intervals
+    :param rel_precision: Target half-width relative to the mean energy of the two policies
+    :param abs_precision_kwh: Target half-width in kWh (overrides rel_precision)
+    :param initial_replicas: Replicas before the first check (at least 2)
+    :param batch_replicas: Replicas added per round
+    :param max_replicas: Upper bound; the result says whether the target was reached
+    :param crn: Use common random numbers across policies
+    :return: Dict with replicas, simulations, converged, per-policy mean energy and the pairwise table
+    """
+    if initial_replicas < 2:
+        raise ValueError("initial_replicas must be at least 2")
+    policies = list(policies or placement_policies)
+    host_arrays = HostArrays(create_host_list(case["num_hosts"]))
+    energy = {policy: np.empty(0) for policy in policies}
+    replicas = 0
+    step = initial_replicas
+
+    while True:
+        new = run_policies(case, policies, step, first_replica=replicas, crn=crn, host_arrays=host_arrays)
+        energy = {policy: np.concatenate([energy[policy], new[policy]]) for policy in policies}
+        replicas += step
+
+        table = pairwise_differences(energy, confidence)
+        if abs_precision_kwh is not None:
+            target = np.full(len(table), abs_precision_kwh)
+        else:
+            means = {policy: energy[policy].mean() for policy in policies}
+            target = rel_precision * (table["policy_a"].map(means) + table["policy_b"].map(means)).to_numpy() / 2
+        table["target_kwh"] = target
+        converged = bool((table["half_width_kwh"] <= target).all())
+        print(f"[Sequential] {replicas} replicas: widest interval ±{table['half_width_kwh'].max():.4f} kWh, "
+              f"{int((table['half_width_kwh'] <= target).sum())}/{len(table)} pairs within target")
+        if converged or replicas >= max_replicas:
+            break
+        step = min(batch_replicas, max_replicas - replicas)
+
+    return {
+        "replicas": replicas,
+        "simulations": replicas * len(policies),
+        "converged": converged,
+        "energy_kwh_mean": {policy: float(energy[policy].mean()) for policy in policies},
+        "pairwise": table,
+        "energy_kwh": energy,
+    }
+
+
+if __name__ == "__main__":
+    rel_precision = float(sys.argv[1]) if len(sys.argv) > 1 else 0.005
+    case = next(c for c in build_cases() if c["dvfs"] and c["migration"] == "default")
+    runs = {}
+    for label, crn, antithetic in (("independent", False, False), ("CRN", True, False),
+                                   ("CRN + antithetic", True, True)):
+        print(f"\n=== {label} ===")
+        runs[label] = sequential_comparison(dict(case, antithetic_lifetimes=antithetic),
+                                            rel_precision=rel_precision, crn=crn)
+    print("\nSimulations needed for the same joint precision:")
+    for label, result in runs.items():
+        print(f"{label:>18}: {result['simulations']} ({result['replicas']} replicas per policy, "
+              f"converged={result['converged']})")
+    print(runs["CRN + antithetic"]["pairwise"].to_string(index=False))
@@ -0,0 +1,426 @@
+# request_log.py
+#
+# Streaming ingestion of VM request logs. A log is a JSONL file, one event per line:
+#
+#   {"event": "create", "vm_id": 17, "time": 12, "cpu": 1250, "ram": 5, "storage": 5, "trace": "<file>"}
+#   {"event": "delete", "vm_id": 17, "time": 40}
+#
+# "time" is a simulation step. A create may give "vm_type" (index into Helper's VM tables)
+# instead of cpu/ram/storage, and "lifetime" instead of a matching delete; VMs that are never
+# deleted live for long_lived_duration steps, as in vm_profile_generator. "trace" names a
+# PlanetLab file in the trace directory.
+#
+# The log is parsed chunk_size lines at a time and each chunk is appended to per-column binary
+# files in a cache directory, so ingest memory is bounded by the chunk size and the number of
+# VMs created and not yet deleted, not by the log length (an out-of-order log also needs one
+# O(num_vms) sort permutation). Later runs map the cached columns with np.memmap and skip JSON
+# parsing entirely, until the log file changes.
+#
+# replay_log runs the vector engine's step loop (one replica) straight from the cache: each
+# step's arrivals are read chunk_size rows at a time, and per-VM state lives in slots that are
+# reused once their VM leaves, so replay memory follows the VMs alive at once. to_workload
+# instead hands the whole log to vector_engine / sharded_engine, which hold every VM in memory.
+
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+
+from Helper import VM_MIPS, VM_PES, VM_RAM, VM_SIZE
+from vector_engine import BatchState, _migrate_replica, _place_sequence, decode_utilization, encode_utilization
+from vm_profile_generator import load_trace_file
+
+CACHE_FORMAT = 1
+
+COLUMNS = {
+    "vm_id": np.int64,
+    "arrival": np.int64,
+    "lifetime": np.float64,
+    "trace_index": np.int64,
+    "cpu": np.float64,
+    "ram": np.float64,
+    "storage": np.float64,
+}
+
+
+def default_cache_dir(log_path):
+    return f"{log_path}.cache"
+
+
+def _source_stat(log_path):
+    st = os.stat(log_path)
+    return {"source": os.path.abspath(log_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _column_path(cache_dir, name):
+    return os.path.join(cache_dir, f"{name}.bin")
+
+
+def _read_meta(cache_dir):
+    path = os.path.join(cache_dir, "meta.json")
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _parse_create(event, line_no, trace_ids, trace_names):
+    if "vm_type" in event:
+        vm_type = int(event["vm_type"])
+        cpu, ram, storage = VM_MIPS[vm_type] * VM_PES[vm_type], VM_RAM[vm_type], VM_SIZE
+    else:
+        try:
+            cpu, ram, storage = event["cpu"], event["ram"], event["storage"]
+        except KeyError as e:
+            raise ValueError(f"Line {line_no}: create event without {e.args[0]} or vm_type") from None
+    trace = event.get("trace")
+    if trace is None:
+        raise ValueError(f"Line {line_no}: create event without trace")
+    trace = str(trace)
+    if trace not in trace_ids:
+        trace_ids[trace] = len(trace_names)
+        trace_names.append(trace)
+    return cpu, ram, storage, trace_ids[trace]
+
+
+def ingest_log(log_path, cache_dir=None, chunk_size=100_000, long_lived_duration=1e9):
+    """
+    Parse a JSONL request log in chunks into the binary column cache.
+
+    :param log_path: Path of the JSONL log
+    :param cache_dir: Cache directory (defaults to <log_path>.cache)
+    :param chunk_size: Lines parsed per chunk
+    :param long_lived_duration: Lifetime (steps) of VMs without a delete event or lifetime
+    :return: The cache metadata dict
+    """
+    cache_dir = cache_dir or default_cache_dir(log_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in COLUMNS:
+        open(_column_path(cache_dir, name), "wb").close()
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    trace_ids = {}
+    trace_names = []
+    live = {}               # vm_id -> row of VMs created and not yet deleted
+    num_rows = 0
+    unmatched_deletes = 0
+    last_arrival = None
+    in_order = True
+    line_no = 0
+
+    with open(log_path, "r") as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                break
+            columns = {name: [] for name in COLUMNS}
+            patches = []    # (row, lifetime) of deletes for VMs created in an earlier chunk
+
+            for line in lines:
+                line_no += 1
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                kind = event.get("event", "create")
+                vm_id = int(event["vm_id"])
+                time = int(event["time"])
+
+                if kind == "create":
+                    if vm_id in live:
+                        raise ValueError(f"Line {line_no}: VM {vm_id} created twice without a delete")
+                    cpu, ram, storage, trace_index = _parse_create(event, line_no, trace_ids, trace_names)
+                    row = num_rows + len(columns["vm_id"])
+                    columns["vm_id"].append(vm_id)
+                    columns["arrival"].append(time)
+                    columns["lifetime"].append(float(event.get("lifetime", long_lived_duration)))
+                    columns["trace_index"].append(trace_index)
+                    columns["cpu"].append(cpu)
+                    columns["ram"].append(ram)
+                    columns["storage"].append(storage)
+                    if "lifetime" not in event:
+                        live[vm_id] = (row, time)
+                    if last_arrival is not None and time < last_arrival:
+                        in_order = False
+                    last_arrival = time
+                elif kind == "delete":
+                    if vm_id not in live:
+                        unmatched_deletes += 1
+                        continue
+                    row, arrival = live.pop(vm_id)
+                    lifetime = float(max(time - arrival, 1))
+                    if row >= num_rows:
+                        columns["lifetime"][row - num_rows] = lifetime
+                    else:
+                        patches.append((row, lifetime))
+                else:
+                    raise ValueError(f"Line {line_no}: unknown event {kind!r}")
+
+            for name, dtype in COLUMNS.items():
+                with open(_column_path(cache_dir, name), "ab") as out:
+                    np.asarray(columns[name], dtype=dtype).tofile(out)
+            num_rows += len(columns["vm_id"])
+
+            if patches:
+                lifetime = np.memmap(_column_path(cache_dir, "lifetime"), dtype=COLUMNS["lifetime"], mode="r+",
+                                     shape=(num_rows,))
+                rows, values = zip(*patches)
+                lifetime[list(rows)] = values
+                lifetime.flush()
+                del lifetime
+
+    if not in_order:
+        _sort_columns(cache_dir, num_rows, chunk_size)
+
+    meta = dict(_source_stat(log_path), format=CACHE_FORMAT, num_vms=num_rows, trace_names=trace_names,
+                unmatched_deletes=unmatched_deletes, long_lived_duration=long_lived_duration)
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+def _sort_columns(cache_dir, num_rows, chunk_size):
+    """
+    Reorder all columns by arrival step (stable), writing chunk_size rows at a time.
+    Needs the O(num_vms) permutation in memory; logs written in time order skip this.
+    """
+    arrival = np.memmap(_column_path(cache_dir, "arrival"), dtype=COLUMNS["arrival"], mode="r", shape=(num_rows,))
+    order = np.argsort(arrival, kind="stable")
+    del arrival
+    for name, dtype in COLUMNS.items():
+        path = _column_path(cache_dir, name)
+        src = np.memmap(path, dtype=dtype, mode="r", shape=(num_rows,))
+        with open(f"{path}.sorted", "wb") as out:
+            for start in range(0, num_rows, chunk_size):
+                np.asarray(src[order[start:start + chunk_size]]).tofile(out)
+        del src
+        os.replace(f"{path}.sorted", path)
+
+
+class RequestLog:
+    def __init__(self, log_path, cache_dir=None, chunk_size=100_000, long_lived_duration=1e9):
+        """
+        Typed, arrival-ordered columns of a request log, memory-mapped from the binary cache.
+        The log is (re)parsed only if the cache is missing or older than the log.
+
+        :param log_path: Path of the JSONL log
+        :param cache_dir: Cache directory (defaults to <log_path>.cache)
+        :param chunk_size: Lines parsed per chunk when the cache has to be built
+        :param long_lived_duration: Lifetime (steps) of VMs that are never deleted
+        """
+        self.log_path = log_path
+        self.cache_dir = cache_dir or default_cache_dir(log_path)
+        meta = _read_meta(self.cache_dir)
+        stat = _source_stat(log_path)
+        if (meta is None or meta.get("format") != CACHE_FORMAT
+                or any(meta.get(k) != v for k, v in stat.items())
+                or meta.get("long_lived_duration") != long_lived_duration):
+            print(f"Parsing request log {log_path}...")
+            meta = ingest_log(log_path, self.cache_dir, chunk_size, long_lived_duration)
+        self.meta = meta
+        self.trace_names = meta["trace_names"]
+        self.num_vms = meta["num_vms"]
+        self.columns = {}
+        for name, dtype in COLUMNS.items():
+            if self.num_vms:
+                self.columns[name] = np.memmap(_column_path(self.cache_dir, name), dtype=dtype, mode="r",
+                                               shape=(self.num_vms,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.num_vms
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def arrivals_between(self, start_step, end_step):
+        """
+        Row range [lo, hi) of the VMs arriving in steps [start_step, end_step).
+        """
+        arrival = self.columns["arrival"]
+        return (int(np.searchsorted(arrival, start_step, side="left")),
+                int(np.searchsorted(arrival, end_step, side="left")))
+
+    def iter_chunks(self, chunk_size=100_000, start=0, stop=None):
+        """
+        Yield column dicts of at most chunk_size consecutive VMs of rows [start, stop), in arrival order.
+        """
+        stop = self.num_vms if stop is None else min(stop, self.num_vms)
+        for lo in range(start, stop, chunk_size):
+            hi = min(lo + chunk_size, stop)
+            yield {name: np.asarray(col[lo:hi]) for name, col in self.columns.items()}
+
+    def load_traces(self, trace_dir, time_steps=288, trace_dtype="float64"):
+        """
+        (num_traces, time_steps) utilization of every trace referenced by the log, stored as
+        trace_dtype (see vector_engine.UTILIZATION_DTYPES), and the largest error of each trace.
+        """
+        traces = np.empty((len(self.trace_names), time_steps), dtype=trace_dtype)
+        errors = np.zeros(len(self.trace_names))
+        for i, name in enumerate(self.trace_names):
+            values = np.asarray(load_trace_file(os.path.join(trace_dir, name), time_steps))
+            traces[i] = encode_utilization(values, trace_dtype)
+            errors[i] = np.abs(decode_utilization(traces[i]) - values).max(initial=0.0)
+        return traces, errors
+
+    def to_workload(self, trace_dir, time_steps=288, trace_dtype="float64"):
+        """
+        Workload dict for vector_engine / sharded_engine (see vector_engine.build_workload).
+        VMs arriving at or after time_steps are left out. The VM columns stay memory-mapped here,
+        but the engines copy them into per-VM arrays, so a run holds the whole log in memory;
+        replay_log does not.
+        """
+        _, end = self.arrivals_between(0, time_steps)
+        workload = {name: col[:end] for name, col in self.columns.items()}
+        workload["traces"], workload["trace_error"] = self.load_traces(trace_dir, time_steps, trace_dtype)
+        return workload
+
+
+def replay_log(log, host_arrays, trace_dir, policy="first_fit", dvfs=False, migration="default",
+               step_duration_sec=300, time_steps=288, rng=None, chunk_size=100_000, trace_dtype="float64",
+               record_history=False, history_dtype="float64", initial_slots=1024):
+    """
+    Run a request log through the vector engine's step loop without loading it: the arrivals of
+    each step are read from the cache chunk_size rows at a time, and per-VM state is kept in slots
+    that are reused when a VM expires or is rejected. Memory follows the number of VMs alive at once
+    (plus the traces and, if record_history, the (T, H) history), not the log length. Results match
+    vector_engine.run_batched_simulation on to_workload with R = 1.
+
+    :param log: RequestLog
+    :param host_arrays: vector_engine.HostArrays
+    :param trace_dir: Directory of the traces named in the log
+    :param policy: Placement policy name, as in SchedulerVM
+    :param dvfs: Apply the default DVFS rule every step
+    :param migration: "default" or "disable"
+    :param rng: numpy Generator for the random policy
+    :param chunk_size: Log rows read at a time
+    :param trace_dtype: Storage type of the traces, one of vector_engine.UTILIZATION_DTYPES
+    :param record_history: Keep the full (T, H) utilization history
+    :param history_dtype: Storage type of the history
+    :param initial_slots: VM slots allocated up front; the pool doubles when it runs out
+    :return: Dict with energy_joules, boot_energy_joules, num_active_vm (T,), mean_utilization (T,),
+             peak_slots and host_utilization_history (T, H) if record_history
+    """
+    if migration not in ("default", "disable"):
+        raise ValueError(f"Unknown migration mode: {migration}")
+    rng = rng or np.random.default_rng(0)
+    H = host_arrays.num_hosts
+    traces, trace_error = log.load_traces(trace_dir, time_steps, trace_dtype)
+    trace_mean = decode_utilization(traces).mean(axis=1)
+
+    capacity = max(int(initial_slots), 1)
+    batch = {name: np.zeros((1, capacity), dtype=dtype) for name, dtype in COLUMNS.items()}
+    batch["trace_mean"] = np.zeros((1, capacity))
+    batch["traces"] = traces
+    batch["trace_error"] = trace_error
+    state = BatchState(host_arrays, batch, dvfs)
+    slot_row = np.zeros(capacity, dtype=np.int64)     # log row of the VM in each slot
+    free = np.arange(capacity)
+
+    def take_slots(n):
+        nonlocal capacity, slot_row, free
+        if n > len(free):
+            grown = max(2 * capacity, capacity + n - len(free))
+            extra = grown - capacity
+            for name, fill in (("vm_host", -1), ("vm_ratio", 0.0), ("vm_expiry", np.inf), ("vm_seq", 0)):
+                a = getattr(state, name)
+                setattr(state, name, np.concatenate([a, np.full((1, extra), fill, dtype=a.dtype)], axis=1))
+            for name in list(COLUMNS) + ["trace_mean"]:
+                batch[name] = np.concatenate([batch[name], np.zeros((1, extra), dtype=batch[name].dtype)], axis=1)
+            slot_row = np.concatenate([slot_row, np.zeros(extra, dtype=np.int64)])
+            free = np.concatenate([free, np.arange(capacity, grown)])
+            capacity = grown
+        slots, free = free[:n], free[n:]
+        return slots
+
+    energy = 0.0
+    num_active_vm = np.zeros(time_steps, dtype=np.int64)
+    mean_utilization = np.zeros(time_steps)
+    history = np.zeros((time_steps, H), dtype=history_dtype) if record_history else None
+
+    for t in range(time_steps):
+        # Step 1: place the VMs arriving at this step, in log order
+        lo, hi = log.arrivals_between(t, t + 1)
+        row = lo
+        for chunk in log.iter_chunks(chunk_size, lo, hi):
+            n = len(chunk["vm_id"])
+            slots = take_slots(n)
+            for name in COLUMNS:
+                batch[name][0, slots] = chunk[name]
+            batch["trace_mean"][0, slots] = trace_mean[chunk["trace_index"]]
+            slot_row[slots] = np.arange(row, row + n)
+            row += n
+            state.vm_ratio[0, slots] = decode_utilization(traces[chunk["trace_index"], t])
+            targets, booted = _place_sequence(state, 0, slots, policy, [rng])
+            for target in targets[booted]:
+                state.boot_energy[0] += host_arrays.boot_energy_joules[target]
+            placed = slots[targets >= 0]
+            state.vm_expiry[0, placed] = t + batch["lifetime"][0, placed]
+            free = np.concatenate([free, slots[targets < 0]])
+
+        # Step 2: remove expired VMs (in log order, as the engine does) and advance the rest
+        placed = np.nonzero(state.vm_host[0] >= 0)[0]
+        expiring = t >= state.vm_expiry[0, placed]
+        expired = placed[expiring]
+        if len(expired):
+            expired = expired[np.argsort(slot_row[expired], kind="stable")]
+            state.deallocate(np.zeros(len(expired), dtype=np.int64), expired)
+            free = np.concatenate([free, expired])
+        running = placed[~expiring]
+        state.vm_ratio[0, running] = decode_utilization(traces[batch["trace_index"][0, running], t])
+        state.recompute_demand()
+        num_active_vm[t] = len(running)
+
+        # Step 3: power and utilization
+        if dvfs:
+            state.level[...] = state.dvfs_levels_for(state.demand)
+        power = state.power(state.demand, state.active, state.level)
+        energy += power.sum(axis=1)[0] * step_duration_sec
+        base_util = state.base_utilization()
+        mean_utilization[t] = base_util.mean()
+        if record_history:
+            history[t] = encode_utilization(base_util[0], history_dtype)
+
+        # Step 4: migration or shutdown of idle hosts
+        if migration == "disable":
+            on = state.vm_host[0][state.vm_host[0] >= 0]
+            state.active[0] &= np.bincount(on, minlength=H) > 0
+        else:
+            _migrate_replica(state, 0, placed=running)
+            state.recompute_demand()
+
+    result = {
+        "energy_joules": float(energy),
+        "boot_energy_joules": float(state.boot_energy[0]),
+        "num_active_vm": num_active_vm,
+        "mean_utilization": mean_utilization,
+        "peak_slots": capacity,
+    }
+    if record_history:
+        result["host_utilization_history"] = history
+    return result
+
+
+if __name__ == "__main__":
+    from Helper import create_host_list
+    from vector_engine import HostArrays
+
+    if len(sys.argv) < 2:
+        print("Usage: python request_log.py <log.jsonl> [trace_dir] [num_hosts]")
+        sys.exit(1)
+    log_path = sys.argv[1]
+    trace_dir = sys.argv[2] if len(sys.argv) > 2 else "planetlab/20110303"
+    num_hosts = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    log = RequestLog(log_path)
+    print(f"{len(log)} VMs, {len(log.trace_names)} traces, {log.meta['unmatched_deletes']} unmatched deletes")
+    result = replay_log(log, HostArrays(create_host_list(num_hosts)), trace_dir, policy="first_fit")
+    print(f"Energy: {result['energy_joules'] / 3_600_000:.3f} kWh, "
+          f"peak {result['peak_slots']} VM slots for {len(log)} VMs")
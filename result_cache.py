@@ -0,0 +1,92 @@
+# result_cache.py
+import hashlib
+import json
+import os
+
+# Simulator sources whose contents determine a case's result. Editing any of
+# them changes the code version, which invalidates previously cached results.
+SOURCE_FILES = [
+    "datacenter.py",
+    "schedule.py",
+    "Runner.py",
+    "Helper.py",
+    "vm_profile_generator.py",
+    "ProteanData/Sampler.py",
+    "vector_engine.py",
+    "monte_carlo.py",
+    "sharded_engine.py",
+    "sla_metrics.py",
+    "trace_features.py",
+    "energy_ledger.py",
+    "overload_detection.py",
+    "vm_selection.py",
+    "capacity_model.py",
+]
+
+
+def code_version(root=None):
+    """
+    Short content hash of the simulator sources listed in SOURCE_FILES.
+
+    :param root: Repository root (defaults to the directory of this file)
+    :return: 12-character hex digest
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES:
+        path = os.path.join(root, name)
+        digest.update(name.encode())
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def case_key(case):
+    """
+    Content address of a case configuration: the SHA-256 of its canonical JSON form.
+    Two configurations with the same keys and values always map to the same key.
+    """
+    payload = json.dumps(case, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_dir="results_cache"):
+        """
+        Content-addressed store of sweep results, one JSON file per case.
+
+        :param cache_dir: Directory holding the <case_key>.json files
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, case):
+        return os.path.join(self.cache_dir, f"{case_key(case)}.json")
+
+    def contains(self, case):
+        return os.path.isfile(self.path(case))
+
+    def get(self, case):
+        """
+        Return the cached result dict for a case, or None if it has not been computed.
+        """
+        path = self.path(case)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)["result"]
+
+    def put(self, case, result):
+        """
+        Store the result of a case. The file is written under a temporary name and
+        renamed into place, so an interrupted sweep never leaves a partial entry.
+        """
+        path = self.path(case)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"case": case, "result": result}, f, sort_keys=True, default=str)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return sum(1 for f in os.listdir(self.cache_dir) if f.endswith(".json"))
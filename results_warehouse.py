@@ -0,0 +1,262 @@
+# results_warehouse.py
+#
+# SQLite store for sweep results, so plots and comparisons over thousands of cases are
+# indexed queries instead of re-reading and regrouping a CSV. Tables:
+#
+#   runs           one row per sweep invocation (code version, host, start/finish time)
+#   cases          one row per case configuration, keyed by result_cache.case_key, with the
+#                  columns queries filter on (policy, dvfs, migration, seed, code_version, ...)
+#                  and the full configuration as JSON
+#   metrics        scalar results, (case, name) -> value, latest run wins
+#   step_metrics   optional per-step aggregates, (case, name, step) -> value
+#
+# Writes are buffered and inserted with executemany in one transaction per batch. The database
+# runs in WAL mode with a busy timeout, so several worker processes on one machine can write to
+# it at once (SQLite locking is not reliable on network filesystems; there, collect the
+# sweep_coordinator results into the database afterwards).
+
+import json
+import os
+import socket
+import sqlite3
+import time
+
+import pandas as pd
+
+from result_cache import case_key, code_version
+
+CASE_COLUMNS = ["policy", "dvfs", "migration", "seed", "code_version", "trace_day", "num_hosts"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    label TEXT,
+    code_version TEXT,
+    host TEXT,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS cases (
+    case_id INTEGER PRIMARY KEY,
+    case_key TEXT NOT NULL UNIQUE,
+    policy TEXT,
+    dvfs INTEGER,
+    migration TEXT,
+    seed INTEGER,
+    code_version TEXT,
+    trace_day TEXT,
+    num_hosts INTEGER,
+    config TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cases_config ON cases (policy, dvfs, migration);
+CREATE INDEX IF NOT EXISTS cases_seed ON cases (seed);
+CREATE INDEX IF NOT EXISTS cases_version ON cases (code_version);
+CREATE TABLE IF NOT EXISTS metrics (
+    case_id INTEGER NOT NULL REFERENCES cases (case_id),
+    name TEXT NOT NULL,
+    value REAL,
+    run_id INTEGER REFERENCES runs (run_id),
+    PRIMARY KEY (case_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, value);
+CREATE TABLE IF NOT EXISTS step_metrics (
+    case_id INTEGER NOT NULL REFERENCES cases (case_id),
+    name TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (case_id, name, step)
+) WITHOUT ROWID;
+"""
+
+
+def _is_scalar(value):
+    return isinstance(value, (bool, int, float)) or (hasattr(value, "item") and getattr(value, "ndim", 1) == 0)
+
+
+class ResultsWarehouse:
+    def __init__(self, path="results.sqlite", batch_size=500, timeout=60.0):
+        """
+        :param path: SQLite database file (created with the schema if missing)
+        :param batch_size: Buffered results written per transaction
+        :param timeout: Seconds to wait for another writer's lock
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._pending = []
+        self.run_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.flush()
+            if self.run_id is not None:
+                self.finish_run()
+            self.conn.close()
+            self.conn = None
+
+    # ---------- Writing ----------
+
+    def start_run(self, label=None):
+        """
+        Open a run; results added afterwards are tagged with it.
+
+        :return: run_id
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (label, code_version, host, started_at) VALUES (?, ?, ?, ?)",
+                (label, code_version(), f"{socket.gethostname()}-{os.getpid()}", time.time()))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def finish_run(self):
+        self.flush()
+        with self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+        self.run_id = None
+
+    def add_result(self, case, result, steps=None):
+        """
+        Queue the result of one case. Scalar entries of result become metrics; lists and other
+        non-scalar entries are skipped (store them as steps if they are per-step series).
+
+        :param case: Case configuration dict
+        :param result: Result dict, e.g. from run_case
+        :param steps: Optional {name: per-step sequence}
+        """
+        self._pending.append((case, result, steps))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all queued results in one transaction.
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self.conn:
+            case_rows = []
+            for case, _, _ in pending:
+                case_rows.append((case_key(case), *(self._case_value(case, c) for c in CASE_COLUMNS),
+                                  json.dumps(case, sort_keys=True, default=str)))
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO cases (case_key, {', '.join(CASE_COLUMNS)}, config) "
+                f"VALUES ({', '.join('?' * (len(CASE_COLUMNS) + 2))})", case_rows)
+            keys = [row[0] for row in case_rows]
+            case_ids = self._case_ids(keys)
+
+            metric_rows = []
+            step_rows = []
+            for key, (_, result, steps) in zip(keys, pending):
+                case_id = case_ids[key]
+                for name, value in result.items():
+                    if _is_scalar(value):
+                        metric_rows.append((case_id, name, float(value), self.run_id))
+                for name, series in (steps or {}).items():
+                    step_rows.extend((case_id, name, step, float(v)) for step, v in enumerate(series))
+            self.conn.executemany("INSERT OR REPLACE INTO metrics (case_id, name, value, run_id) VALUES (?, ?, ?, ?)",
+                                  metric_rows)
+            self.conn.executemany("INSERT OR REPLACE INTO step_metrics (case_id, name, step, value) VALUES (?, ?, ?, ?)",
+                                  step_rows)
+
+    @staticmethod
+    def _case_value(case, column):
+        value = case.get(column)
+        return int(value) if isinstance(value, bool) else value
+
+    def _case_ids(self, keys):
+        ids = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            query = f"SELECT case_key, case_id FROM cases WHERE case_key IN ({', '.join('?' * len(chunk))})"
+            ids.update(self.conn.execute(query, chunk).fetchall())
+        return ids
+
+    # ---------- Queries ----------
+
+    @staticmethod
+    def _where(filters):
+        """
+        WHERE clause over case columns; a list or tuple value matches any of its elements.
+        """
+        clauses, params = [], []
+        for column, value in filters.items():
+            if column not in CASE_COLUMNS:
+                raise ValueError(f"Unknown case column: {column}")
+            values = value if isinstance(value, (list, tuple)) else [value]
+            values = [int(v) if isinstance(v, bool) else v for v in values]
+            clauses.append(f"c.{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, sql, params=()):
+        """
+        Run any SQL query and return a DataFrame.
+        """
+        self.flush()
+        return pd.read_sql_query(sql, self.conn, params=list(params))
+
+    def metric_frame(self, names, **filters):
+        """
+        One row per case with its case columns and the requested metrics as columns.
+
+        :param names: Metric names, e.g. ["energy_kwh", "slav"]
+        :param filters: Case column filters, e.g. policy="best_fit", dvfs=True, seed=[1, 2]
+        """
+        where, params = self._where(filters)
+        pivots = ", ".join(f'MAX(CASE WHEN m.name = ? THEN m.value END) AS "{name}"' for name in names)
+        sql = (f"SELECT c.case_key, {', '.join('c.' + col for col in CASE_COLUMNS)}, {pivots} "
+               f"FROM cases c JOIN metrics m ON m.case_id = c.case_id{where} "
+               f"{'AND' if where else 'WHERE'} m.name IN ({', '.join('?' * len(names))}) "
+               f"GROUP BY c.case_id ORDER BY c.case_id")
+        frame = self.query(sql, [*names, *params, *names])
+        frame["dvfs"] = frame["dvfs"].astype(bool)
+        return frame
+
+    def group_stats(self, name, by=("policy", "dvfs", "migration"), **filters):
+        """
+        Count, mean, min and max of one metric per group of case columns, computed in SQLite.
+        """
+        for column in by:
+            if column not in CASE_COLUMNS:
+                raise ValueError(f"Unknown case column: {column}")
+        where, params = self._where(filters)
+        columns = ", ".join(f"c.{column}" for column in by)
+        sql = (f"SELECT {columns}, COUNT(*) AS n, AVG(m.value) AS mean, MIN(m.value) AS min, "
+               f"MAX(m.value) AS max FROM cases c JOIN metrics m ON m.case_id = c.case_id AND m.name = ?"
+               f"{where} GROUP BY {columns} ORDER BY {columns}")
+        return self.query(sql, [name, *params])
+
+    def steps(self, name, **filters):
+        """
+        Per-step aggregate `name` of the matching cases, one row per (case, step).
+        """
+        where, params = self._where(filters)
+        sql = (f"SELECT c.case_key, {', '.join('c.' + col for col in CASE_COLUMNS)}, s.step, s.value "
+               f"FROM cases c JOIN step_metrics s ON s.case_id = c.case_id AND s.name = ?{where} "
+               f"ORDER BY c.case_id, s.step")
+        return self.query(sql, [name, *params])
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "results.sqlite"
+    with ResultsWarehouse(path) as warehouse:
+        print(f"{len(warehouse)} cases in {path}")
+        print(warehouse.group_stats("energy_kwh").to_string(index=False))
@@ -1,16 +1,43 @@
 # schedule.py
 import random
 
+import numpy as np
+
+from capacity_model import CapacityModel
+
 class SchedulerVM:
-    def __init__(self, hosts, policy="first_fit"):
+    def __init__(self, hosts, policy="first_fit", topology=None, rng=None, sample_size=None,
+                 max_probes=None, decision_log=None, feature_store=None, capacity=None):
         """
         Scheduler to assign VMs to Hosts based on a given policy.
 
         :param hosts: list of Host objects
         :param policy: scheduling strategy ("first_fit", "least_utilized", etc.)
+        :param topology: optional DatacenterTopology over the same hosts; policies then descend
+                         the cluster/rack tree and skip subtrees that cannot fit or improve the choice
+        :param rng: optional numpy Generator for the random policy (e.g. make_streams(seed)["policy"]);
+                    the global `random` is used otherwise
+        :param sample_size: d for power-of-d-choices placement: score only d randomly sampled feasible
+                            hosts instead of all of them (None = exact). Applies to every policy that
+                            ranks candidates; first_fit is unaffected
+        :param max_probes: random hosts tried to find the d feasible ones (default 8 * d); if none of
+                           them fits, the exact candidate scan is used so sampling never rejects a VM
+                           that would fit
+        :param decision_log: optional decision_log.DecisionLog recording every placement and rejection
+        :param feature_store: optional trace_features.TraceFeatureStore; VMs whose cloudlet has a
+                              trace_index then read their trace statistics from it
+        :param capacity: capacity_model.CapacityModel over hosts; by default the one the hosts
+                         already share, or a new one with CPU, RAM and storage
         """
         self.hosts = hosts
         self.policy = policy
+        self.topology = topology
+        self.rng = rng
+        self.sample_size = sample_size
+        self.max_probes = max_probes
+        self.decision_log = decision_log
+        self.feature_store = feature_store
+        self.capacity = capacity or CapacityModel.attach(hosts)
         self.boot_energy_total = 0.0  # Track total boot energy
         
     def schedule_vm(self, vm):
@@ -26,16 +53,34 @@ class SchedulerVM:
                 self.boot_energy_total += candidate_host.boot_energy_joules
 
             candidate_host.allocate_vm(vm)
+            if self.decision_log is not None:
+                self.decision_log.place(vm, candidate_host)
             print(f"Scheduler: VM {vm.vm_id} assigned to Host {candidate_host.host_id} using '{self.policy}'")
             return True
         else:
+            if self.decision_log is not None:
+                self.decision_log.reject(vm)
             print(f"Scheduler: No suitable host found for VM {vm.vm_id} with policy '{self.policy}'")
             return False
 
+    def trace_feature(self, vm, name="mean"):
+        """
+        Statistic of the VM's workload trace: a lookup in the feature store when the VM's trace is
+        indexed, else the cloudlet's own trace_mean (only "mean" is available that way).
+        """
+        cloudlet = vm.cloudlet
+        if self.feature_store is not None and cloudlet.trace_index is not None:
+            return self.feature_store[name][cloudlet.trace_index]
+        if name != "mean":
+            raise ValueError(f"Trace feature {name!r} needs a feature store and an indexed trace")
+        return cloudlet.trace_mean
+
     def _select_host(self, vm):
         """
         Internal method to select host based on policy.
         """
+        if self.topology is not None and self.topology.supports(self.policy):
+            return self.topology.select_host(vm, self.policy)
         if self.policy == "first_fit":
             return self._first_fit(vm)
         elif self.policy == "random":
@@ -56,55 +101,88 @@ class SchedulerVM:
         else:
             raise ValueError(f"Unknown scheduling policy: {self.policy}")
 
+    def _candidates(self, vm):
+        if self.topology is not None:
+            return list(self.topology.iter_candidates(vm))
+        if self.sample_size:
+            sampled = self._sampled_candidates(vm)
+            if sampled:
+                return sampled
+        return [self.hosts[i] for i in np.flatnonzero(self.capacity.feasible(vm))]
+
+    def _sampled_candidates(self, vm):
+        """
+        Up to sample_size distinct feasible hosts drawn uniformly at random, in O(max_probes).
+        """
+        num_hosts = len(self.hosts)
+        if num_hosts <= self.sample_size:
+            return []
+        max_probes = self.max_probes or 8 * self.sample_size
+        if self.rng is not None:
+            probes = self.rng.integers(num_hosts, size=max_probes).tolist()
+        else:
+            probes = [random.randrange(num_hosts) for _ in range(max_probes)]
+        seen = set()
+        sampled = []
+        for i in probes:
+            if i in seen:
+                continue
+            seen.add(i)
+            if self.hosts[i].can_host_vm(vm):
+                sampled.append(self.hosts[i])
+                if len(sampled) == self.sample_size:
+                    break
+        return sampled
+
     def _first_fit(self, vm):
-        for host in self.hosts:
-            if host.can_host_vm(vm):
-                return host
-        return None
+        feasible = np.flatnonzero(self.capacity.feasible(vm))
+        return self.hosts[feasible[0]] if len(feasible) else None
 
     def _random(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
+        if self.rng is not None:
+            return candidates[self.rng.integers(len(candidates))]
         return random.choice(candidates)
 
     def _least_utilized(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
         return min(candidates, key=lambda h: h.cpu_utilization())
     
     def _most_utilized(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
         return max(candidates, key=lambda h: h.cpu_utilization())
 
     def _best_fit(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
         return min(candidates, key=lambda h: (h.remaining_cpu() - vm.cpu))
 
     def _worst_fit(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
         return max(candidates, key=lambda h: (h.remaining_cpu() - vm.cpu))
     
     def _most_free_ram(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
-        return max(candidates, key=lambda h: h.ram_capacity - sum(v.ram for v in h.vms))
+        return max(candidates, key=lambda h: h.ram_capacity - self.capacity.used(h, "ram"))
     
     def _energy_aware(self, vm):
-        candidates = [h for h in self.hosts if h.can_host_vm(vm)]
+        candidates = self._candidates(vm)
         if not candidates:
             return None
 
         vm_cpu_u_store = vm.cloudlet.cpu_demand_ratio
-        vm.cloudlet.cpu_demand_ratio = vm.cloudlet.trace_mean
+        vm.cloudlet.cpu_demand_ratio = self.trace_feature(vm, "mean")
 
         def energy_increase_if_placed(host):
             original_energy = host.power_consumption()
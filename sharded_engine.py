@@ -0,0 +1,381 @@
+# sharded_engine.py
+#
+# Host-sharded execution of the vector engine for very large single runs. Hosts are
+# split into contiguous shards, one worker process each. All host and VM state lives in
+# multiprocessing.shared_memory arrays. Every step:
+#
+#   1. coordinator: places arriving VMs (needs a global view of host capacity), scoring
+#                   the hosts once per VM shape rather than once per VM
+#   2. workers:     expire VMs on their hosts, advance VM demand along the traces,
+#                   recompute host demand, DVFS level, power, energy and utilization
+#   3. coordinator: migration decisions across shards
+#   4. workers:     rebuild demand of their hosts after migration
+#
+# Each worker keeps the index of the VMs on its hosts. The coordinator posts the VMs it
+# placed or migrated in a shared inbox before each command and the workers update their
+# index from it, so a step costs each shard its own VMs rather than a scan of all of them.
+# Coordinator and workers alternate on a Barrier, so no array is written concurrently
+# by two processes. Results match vector_engine.run_batched_simulation with R = 1.
+
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from energy_ledger import DYNAMIC, IDLE
+from vector_engine import (
+    BatchState, DVFS_THRESHOLDS, _migrate_replica, _place_sequence, decode_utilization, encode_utilization,
+    stack_workloads
+)
+
+CMD_STEP = 0
+CMD_RECOMPUTE = 1
+CMD_STOP = 2
+
+# How often the coordinator checks that the shard processes are still alive
+WORKER_POLL_SEC = 0.5
+
+
+class SharedArrays:
+    def __init__(self):
+        """
+        Named NumPy arrays backed by shared memory blocks.
+        """
+        self.blocks = {}
+        self.arrays = {}
+
+    def create(self, name, value):
+        value = np.asarray(value)
+        block = shared_memory.SharedMemory(create=True, size=max(value.nbytes, 1))
+        array = np.ndarray(value.shape, dtype=value.dtype, buffer=block.buf)
+        array[...] = value
+        self.blocks[name] = block
+        self.arrays[name] = array
+        return array
+
+    def spec(self):
+        """
+        Picklable description a worker uses to attach to the same blocks.
+        """
+        return {name: (self.blocks[name].name, a.shape, a.dtype.str) for name, a in self.arrays.items()}
+
+    @classmethod
+    def attach(cls, spec):
+        shared = cls()
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            shared.blocks[name] = block
+            shared.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return shared
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = {}
+
+
+def _rebuild_demand(a, own, h0, h1):
+    """
+    Demand of hosts [h0, h1) from the VMs placed on them, summed in allocation order.
+    """
+    order = own[np.argsort(a["vm_seq"][0, own], kind="stable")]
+    weights = a["cpu"][0, order] * a["vm_ratio"][0, order]
+    a["demand"][0, h0:h1] = np.bincount(a["vm_host"][0, order] - h0, weights=weights, minlength=h1 - h0)
+
+
+def _apply_moves(a, own, mine, h0, h1):
+    """
+    Index of the VMs on hosts [h0, h1) after the moves posted in the inbox.
+
+    :param mine: (V,) bool, membership of the index, updated in place
+    """
+    moved = a["moved"][:a["moved_count"][0]]
+    if len(moved) == 0:
+        return own
+    host = a["vm_host"][0, moved]
+    here = (host >= h0) & (host < h1)
+    arrived = moved[here & ~mine[moved]]
+    mine[moved] = here
+    return np.concatenate([own[mine[own]], arrived])
+
+
+def _shard_step(a, own, mine, shard, h0, h1, t, dvfs, migration, step_duration_sec):
+    """
+    One step of hosts [h0, h1), whose VMs are own (membership mine, see _apply_moves).
+
+    :return: The VMs still running on them
+    """
+    vm_host = a["vm_host"][0]
+
+    # Expire VMs on this shard's hosts, in VM order like the engine
+    expired = np.sort(own[t >= a["vm_expiry"][0, own]])
+    if len(expired):
+        hosts = vm_host[expired]
+        for field, size in (("alloc_cpu", "cpu"), ("alloc_ram", "ram"), ("alloc_storage", "storage")):
+            np.subtract.at(a[field][0], hosts, a[size][0, expired])
+        vm_host[expired] = -1
+        mine[expired] = False
+    running = own[t < a["vm_expiry"][0, own]]
+
+    # Advance demand along the traces, then host demand, DVFS, power and utilization
+    a["vm_ratio"][0, running] = decode_utilization(a["traces"][a["trace_index"][0, running], t])
+    _rebuild_demand(a, running, h0, h1)
+    demand = a["demand"][0, h0:h1]
+    base_util = np.minimum(demand / a["base_cpu_capacity"][h0:h1], 1.0)
+    level = a["level"][0, h0:h1]
+    if dvfs:
+        low, high = DVFS_THRESHOLDS
+        level[...] = np.where(base_util < low, 2, np.where(base_util < high, 1, 0))
+    cols = np.arange(h0, h1)
+    u = np.minimum(demand / a["level_cpu_capacity"][level, cols], 1.0)
+    idle = a["level_power_idle"][level, cols]
+    peak = a["level_power_max"][level, cols]
+    active = a["active"][0, h0:h1]
+    power = np.where(~active & (u == 0), 0.0, idle + (peak - idle) * u)
+
+    a["shard_energy"][shard] += power.sum() * step_duration_sec
+    if "ledger_joules" in a.arrays:
+        books = a["ledger_joules"]
+        b = min(t // int(a["ledger_bucket_steps"][0]), books.shape[3] - 1)
+        idle_on = np.where(power > 0, idle, 0.0)
+        books[IDLE, 0, h0:h1, b] += idle_on * step_duration_sec
+        books[DYNAMIC, 0, h0:h1, b] += (power - idle_on) * step_duration_sec
+    a["shard_active_vms"][shard] = len(running)
+    a["base_util"][0, h0:h1] = base_util
+
+    if migration == "disable":
+        vm_count = np.bincount(vm_host[running] - h0, minlength=h1 - h0)
+        active &= vm_count > 0
+    return running
+
+
+def _shard_worker(spec, shard, h0, h1, barrier, dvfs, migration, step_duration_sec):
+    a = SharedArrays.attach(spec)
+    own = np.empty(0, dtype=np.int64)
+    mine = np.zeros(a["vm_host"].shape[1], dtype=bool)
+    try:
+        while True:
+            barrier.wait()
+            cmd, t = a["control"]
+            if cmd == CMD_STOP:
+                break
+            own = _apply_moves(a, own, mine, h0, h1)
+            if cmd == CMD_STEP:
+                own = _shard_step(a, own, mine, shard, h0, h1, t, dvfs, migration, step_duration_sec)
+            elif cmd == CMD_RECOMPUTE:
+                _rebuild_demand(a, own, h0, h1)
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        # Another process gave up; the coordinator reports it
+        pass
+    except BaseException:
+        # Release the coordinator and the other shards instead of leaving them at the barrier
+        barrier.abort()
+        raise
+    finally:
+        a.close()
+
+
+def run_sharded_simulation(workload, host_arrays, num_shards=None, policy="first_fit", dvfs=False,
+                           migration="default", step_duration_sec=300, time_steps=288, rng=None,
+                           record_history=False, history_dtype="float64", ledger=None, step_timeout_sec=3600):
+    """
+    Run one workload with host-level work split over worker processes.
+
+    :param workload: Workload dict from vector_engine.build_workload
+    :param host_arrays: vector_engine.HostArrays
+    :param num_shards: Worker processes (defaults to the CPU count)
+    :param policy: Placement policy name, as in SchedulerVM
+    :param dvfs: Apply the default DVFS rule every step
+    :param migration: "default" or "disable"
+    :param rng: numpy Generator for the random policy
+    :param record_history: Keep the full (T, H) utilization history (large for big fleets)
+    :param history_dtype: Storage type of the history, one of vector_engine.UTILIZATION_DTYPES
+    :param ledger: Optional energy_ledger.EnergyLedger (one replica); the shards book their hosts'
+                   idle and dynamic energy into it through shared memory
+    :param step_timeout_sec: Longest the coordinator waits for the shards at one barrier; a shard
+                             that fails or exits ends the run at once with RuntimeError, and its
+                             shared memory is released
+    :return: Dict with energy_joules, boot_energy_joules, num_active_vm (T,), mean_utilization (T,)
+             and host_utilization_history (T, H) if record_history
+    """
+    if migration not in ("default", "disable"):
+        raise ValueError(f"Unknown migration mode: {migration}")
+    H = host_arrays.num_hosts
+    num_shards = max(1, min(num_shards or multiprocessing.cpu_count(), H))
+    batch = stack_workloads([workload])
+    state = BatchState(host_arrays, batch, dvfs)
+    rng = rng or np.random.default_rng(0)
+
+    shared = SharedArrays()
+    for name in ("active", "level", "alloc_cpu", "alloc_ram", "alloc_storage", "demand",
+                 "vm_host", "vm_ratio", "vm_expiry", "vm_seq"):
+        setattr(state, name, shared.create(name, getattr(state, name)))
+    for name in ("traces", "trace_index", "cpu", "ram", "storage"):
+        batch[name] = shared.create(name, batch[name])
+    for name in ("base_cpu_capacity", "level_cpu_capacity", "level_power_idle", "level_power_max"):
+        shared.create(name, getattr(host_arrays, name))
+    shared.create("base_util", np.zeros((1, H)))
+    shared.create("shard_energy", np.zeros(num_shards))
+    shared.create("shard_active_vms", np.zeros(num_shards, dtype=np.int64))
+    if ledger is not None:
+        ledger.joules = shared.create("ledger_joules", ledger.joules)
+        shared.create("ledger_bucket_steps", np.array([ledger.bucket_steps]))
+    control = shared.create("control", np.zeros(2, dtype=np.int64))
+    # VMs placed or migrated since the last command, for the workers' indexes
+    inbox = shared.create("moved", np.zeros(max(batch["num_vms"][0], 1), dtype=np.int64))
+    inbox_count = shared.create("moved_count", np.zeros(1, dtype=np.int64))
+
+    bounds = np.linspace(0, H, num_shards + 1).astype(np.int64)
+    barrier = multiprocessing.Barrier(num_shards + 1)
+    workers = [
+        multiprocessing.Process(target=_shard_worker, args=(
+            shared.spec(), s, int(bounds[s]), int(bounds[s + 1]), barrier, dvfs, migration, step_duration_sec))
+        for s in range(num_shards)
+    ]
+    stopping = threading.Event()
+
+    def watch_workers():
+        # A shard killed without reaching its own abort would leave the coordinator at the barrier
+        while not stopping.wait(WORKER_POLL_SEC):
+            if any(w.exitcode is not None for w in workers):
+                barrier.abort()
+                return
+
+    def run_workers(cmd, t=0, moved=()):
+        inbox[:len(moved)] = moved
+        inbox_count[0] = len(moved)
+        control[0], control[1] = cmd, t
+        try:
+            barrier.wait(step_timeout_sec)
+            if cmd != CMD_STOP:
+                barrier.wait(step_timeout_sec)
+        except threading.BrokenBarrierError:
+            # A shard that aborted the barrier is on its way out
+            for w in workers:
+                w.join(WORKER_POLL_SEC)
+            failed = [s for s, w in enumerate(workers) if w.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"Shard worker(s) {failed} failed at step {t} "
+                                   f"(exit codes {[workers[s].exitcode for s in failed]})") from None
+            raise RuntimeError(f"Shard workers did not reach the barrier within {step_timeout_sec} s "
+                               f"at step {t}") from None
+
+    arrival = batch["arrival"][0, :batch["num_vms"][0]]
+    starts = np.searchsorted(arrival, np.arange(time_steps), side="left")
+    ends = np.searchsorted(arrival, np.arange(time_steps), side="right")
+    num_active_vm = np.zeros(time_steps, dtype=np.int64)
+    mean_utilization = np.zeros(time_steps)
+    history = np.zeros((time_steps, H), dtype=history_dtype) if record_history else None
+    live = np.empty(0, dtype=np.int64)
+
+    watcher = threading.Thread(target=watch_workers, daemon=True)
+    try:
+        for w in workers:
+            w.start()
+        watcher.start()
+        for t in range(time_steps):
+            if ledger is not None:
+                ledger.step = t
+
+            # Step 1: placement on the coordinator
+            vms = np.arange(starts[t], ends[t])
+            state.vm_ratio[0, vms] = decode_utilization(batch["traces"][batch["trace_index"][0, vms], t])
+            targets, booted = _place_sequence(state, 0, vms, policy, [rng])
+            for target in targets[booted]:
+                state.boot_energy[0] += host_arrays.boot_energy_joules[target]
+                if ledger is not None:
+                    ledger.add_boot(target, host_arrays.boot_energy_joules[target])
+            placed = vms[targets >= 0]
+            state.vm_expiry[0, placed] = t + batch["lifetime"][0, placed]
+            live = np.concatenate([live, placed])
+
+            # Step 2/3: expiry, demand, power and energy on the shards
+            run_workers(CMD_STEP, t, placed)
+            live = live[state.vm_host[0, live] >= 0]
+            num_active_vm[t] = shared["shard_active_vms"].sum()
+            mean_utilization[t] = shared["base_util"].mean()
+            if record_history:
+                history[t] = encode_utilization(shared["base_util"][0], history_dtype)
+
+            # Step 4: migration decisions on the coordinator, then fresh demand on the shards
+            if migration == "default":
+                moved = _migrate_replica(state, 0, ledger=ledger, placed=live)
+                run_workers(CMD_RECOMPUTE, t, moved)
+
+        result = {
+            "energy_joules": float(shared["shard_energy"].sum()),
+            "boot_energy_joules": float(state.boot_energy[0]),
+            "num_active_vm": num_active_vm,
+            "mean_utilization": mean_utilization,
+        }
+        stopping.set()
+        run_workers(CMD_STOP)
+    except BaseException:
+        # Shards still at the barrier, or stuck, would never exit on their own
+        barrier.abort()
+        for w in workers:
+            if w.is_alive():
+                w.terminate()
+        raise
+    finally:
+        stopping.set()
+        if watcher.is_alive():
+            watcher.join()
+        for w in workers:
+            if w.pid is not None:
+                w.join()
+        # Views into the blocks must be released before the blocks can be closed
+        if ledger is not None:
+            ledger.joules = np.array(ledger.joules)
+        state = batch = control = inbox = inbox_count = None
+        shared.close(unlink=True)
+
+    if record_history:
+        result["host_utilization_history"] = history
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from ComprehensiveExperiment_FinalReport import block_print, build_cases, enable_print, generate_case_profiles
+    from Helper import create_host_list
+    from vector_engine import HostArrays, build_workload, draw_vm_specs, run_batched_simulation
+
+    # The first_fit consolidation case copied k times into one fleet (a trace day has too few traces to
+    # draw k times the VMs), on one shard and on every CPU; k = 1 is also checked against the vector engine
+    copies = [int(arg) for arg in sys.argv[1:]] or [1, 10, 50]
+    case = next(case for case in build_cases()
+                if case["policy"] == "first_fit" and case["migration"] == "default" and not case["dvfs"])
+    block_print()
+    profiles = generate_case_profiles(case)
+    single = build_workload(profiles, draw_vm_specs(len(profiles)), time_steps=case["time_steps"])
+    enable_print()
+    shard_counts = sorted({1, multiprocessing.cpu_count()})
+
+    for k in copies:
+        order = np.argsort(np.tile(single["arrival"], k), kind="stable")
+        workload = {name: np.tile(single[name], k)[order]
+                    for name in ("arrival", "lifetime", "trace_index", "cpu", "ram", "storage")}
+        workload.update(vm_id=np.arange(len(order)), traces=single["traces"], trace_error=single["trace_error"])
+        host_arrays = HostArrays(create_host_list(case["num_hosts"] * k))
+        for num_shards in shard_counts:
+            start = time.perf_counter()
+            result = run_sharded_simulation(workload, host_arrays, num_shards, policy=case["policy"],
+                                            time_steps=case["time_steps"])
+            elapsed = time.perf_counter() - start
+            print(f"{host_arrays.num_hosts} hosts, {len(order)} VMs, {num_shards} shard(s): {elapsed:.1f} s, "
+                  f"{result['energy_joules'] / 3.6e6:.3f} kWh")
+        if k == 1:
+            batched = run_batched_simulation(stack_workloads([workload]), host_arrays, policy=case["policy"],
+                                             time_steps=case["time_steps"])
+            print(f"  vector engine: {batched['energy_joules'][0] / 3.6e6:.3f} kWh")
@@ -0,0 +1,170 @@
+# sla_metrics.py
+#
+# Streaming SLA counters in the style of CloudSim's power-aware experiments
+# (Beloglazov & Buyya):
+#
+#   SLATAH = 1/N * sum_hosts(overloaded time / active time)
+#   PDM    = 1/M * sum_vms(MIPS*s lost to migrations / MIPS*s requested)
+#   SLAV   = SLATAH * PDM
+#
+# A host is overloaded while its VMs request more MIPS than its current (DVFS-scaled)
+# capacity; the excess is counted as unmet MIPS*s and shared among its VMs in proportion
+# to their demand. A migration costs the VM 10% of its demand for ram / (bw / 2) seconds.
+# Every counter is updated in O(1) per host-step, VM-step or migration event.
+
+import numpy as np
+
+from Helper import HOST_BW
+
+MIGRATION_DEGRADATION = 0.1
+
+
+def migration_time_sec(ram_mb, bandwidth=HOST_BW):
+    """
+    CloudSim's migration time: RAM (MB) over half the host bandwidth (kbit/s).
+    """
+    return ram_mb / (bandwidth / (2 * 8000.0))
+
+
+class SLAMetrics:
+    def __init__(self):
+        """
+        Counters for the object engine (Runner.run_simulation). Keyed by host_id / vm_id.
+        """
+        self.host_active_time = {}
+        self.host_overload_time = {}
+        self.host_unmet_mips_s = {}
+        self.vm_requested_mips_s = {}
+        self.vm_unmet_mips_s = {}
+        self.vm_migration_loss_mips_s = {}
+        self.vm_overload_time = {}
+        self.vm_migrations = {}
+        self.total_migrations = 0
+        # Totals of VMs folded out of the per-VM dicts by fold_vm
+        self.folded_pdm_sum = 0.0
+        self.folded_pdm_count = 0
+        self.folded_requested_mips_s = 0.0
+
+    def record_host_step(self, host, step_duration_sec):
+        """
+        Account one step of a host and its VMs. Must be called after the host's DVFS level is
+        updated for the step, since overload is judged against the current capacity.
+        """
+        demand = host.cpu_demand()
+        capacity = host.cpu_capacity
+        overloaded = demand > capacity
+        hid = host.host_id
+        if host.active:
+            self.host_active_time[hid] = self.host_active_time.get(hid, 0.0) + step_duration_sec
+        if overloaded:
+            self.host_overload_time[hid] = self.host_overload_time.get(hid, 0.0) + step_duration_sec
+            self.host_unmet_mips_s[hid] = self.host_unmet_mips_s.get(hid, 0.0) + (demand - capacity) * step_duration_sec
+
+        unmet_share = (demand - capacity) / demand if overloaded else 0.0
+        for vm in host.vms:
+            vm_demand = vm.cpu_demand()
+            vid = vm.vm_id
+            self.vm_requested_mips_s[vid] = self.vm_requested_mips_s.get(vid, 0.0) + vm_demand * step_duration_sec
+            if overloaded:
+                self.vm_unmet_mips_s[vid] = self.vm_unmet_mips_s.get(vid, 0.0) + vm_demand * unmet_share * step_duration_sec
+                self.vm_overload_time[vid] = self.vm_overload_time.get(vid, 0.0) + step_duration_sec
+
+    def record_migration(self, vm):
+        vid = vm.vm_id
+        loss = MIGRATION_DEGRADATION * vm.cpu_demand() * migration_time_sec(vm.ram)
+        self.vm_migration_loss_mips_s[vid] = self.vm_migration_loss_mips_s.get(vid, 0.0) + loss
+        self.vm_migrations[vid] = self.vm_migrations.get(vid, 0) + 1
+        self.total_migrations += 1
+
+    def fold_vm(self, vm_id):
+        """
+        Move a departed VM's counters into running totals so the per-VM dicts only hold live VMs.
+        """
+        requested = self.vm_requested_mips_s.pop(vm_id, 0.0)
+        loss = self.vm_migration_loss_mips_s.pop(vm_id, 0.0)
+        self.vm_unmet_mips_s.pop(vm_id, None)
+        self.vm_overload_time.pop(vm_id, None)
+        self.vm_migrations.pop(vm_id, None)
+        if requested > 0:
+            self.folded_pdm_sum += loss / requested
+            self.folded_pdm_count += 1
+            self.folded_requested_mips_s += requested
+
+    def summary(self):
+        slatah_terms = [self.host_overload_time.get(h, 0.0) / t for h, t in self.host_active_time.items() if t > 0]
+        pdm_terms = [self.vm_migration_loss_mips_s.get(v, 0.0) / r for v, r in self.vm_requested_mips_s.items() if r > 0]
+        slatah = sum(slatah_terms) / len(slatah_terms) if slatah_terms else 0.0
+        pdm_count = len(pdm_terms) + self.folded_pdm_count
+        pdm = (sum(pdm_terms) + self.folded_pdm_sum) / pdm_count if pdm_count else 0.0
+        return {
+            "slatah": slatah,
+            "pdm": pdm,
+            "slav": slatah * pdm,
+            "overload_time_s": sum(self.host_overload_time.values()),
+            "unmet_mips_s": sum(self.host_unmet_mips_s.values()),
+            "requested_mips_s": sum(self.vm_requested_mips_s.values()) + self.folded_requested_mips_s,
+            "migrations": self.total_migrations,
+        }
+
+
+class BatchSLAMetrics:
+    def __init__(self, num_replicas, num_hosts, num_vms):
+        """
+        The same counters as SLAMetrics, as (R, H) and (R, V) arrays for vector_engine.
+        """
+        R, H, V = num_replicas, num_hosts, num_vms
+        self.host_active_time = np.zeros((R, H))
+        self.host_overload_time = np.zeros((R, H))
+        self.host_unmet_mips_s = np.zeros((R, H))
+        self.vm_requested_mips_s = np.zeros((R, V))
+        self.vm_unmet_mips_s = np.zeros((R, V))
+        self.vm_migration_loss_mips_s = np.zeros((R, V))
+        self.vm_overload_time = np.zeros((R, V))
+        self.vm_migrations = np.zeros((R, V), dtype=np.int64)
+
+    def record_step(self, state, running, step_duration_sec):
+        """
+        :param state: vector_engine.BatchState after the step's DVFS update
+        :param running: (R, V) mask of VMs placed on a host
+        """
+        demand = state.demand
+        capacity = state.current_capacity()
+        overloaded = demand > capacity
+        self.host_active_time += state.active * step_duration_sec
+        self.host_overload_time += overloaded * step_duration_sec
+        self.host_unmet_mips_s += np.maximum(demand - capacity, 0.0) * step_duration_sec
+
+        r_idx, v_idx = np.nonzero(running)
+        h_idx = state.vm_host[r_idx, v_idx]
+        vm_demand = state.batch["cpu"][r_idx, v_idx] * state.vm_ratio[r_idx, v_idx]
+        host_demand = demand[r_idx, h_idx]
+        share = np.where(overloaded[r_idx, h_idx], (host_demand - capacity[r_idx, h_idx]) / np.maximum(host_demand, 1e-12), 0.0)
+        self.vm_requested_mips_s[r_idx, v_idx] += vm_demand * step_duration_sec
+        self.vm_unmet_mips_s[r_idx, v_idx] += vm_demand * share * step_duration_sec
+        self.vm_overload_time[r_idx, v_idx] += overloaded[r_idx, h_idx] * step_duration_sec
+
+    def record_migrations(self, state, r, vms):
+        demand = state.batch["cpu"][r, vms] * state.vm_ratio[r, vms]
+        self.vm_migration_loss_mips_s[r, vms] += MIGRATION_DEGRADATION * demand * migration_time_sec(state.batch["ram"][r, vms])
+        self.vm_migrations[r, vms] += 1
+
+    def summary(self):
+        """
+        :return: Dict of (R,) arrays, one value per replica
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            host_ratio = np.where(self.host_active_time > 0, self.host_overload_time / self.host_active_time, np.nan)
+            vm_ratio = np.where(self.vm_requested_mips_s > 0, self.vm_migration_loss_mips_s / self.vm_requested_mips_s, np.nan)
+        host_counted = (self.host_active_time > 0).sum(axis=1)
+        vm_counted = (self.vm_requested_mips_s > 0).sum(axis=1)
+        slatah = np.where(host_counted > 0, np.nansum(host_ratio, axis=1) / np.maximum(host_counted, 1), 0.0)
+        pdm = np.where(vm_counted > 0, np.nansum(vm_ratio, axis=1) / np.maximum(vm_counted, 1), 0.0)
+        return {
+            "slatah": slatah,
+            "pdm": pdm,
+            "slav": slatah * pdm,
+            "overload_time_s": self.host_overload_time.sum(axis=1),
+            "unmet_mips_s": self.host_unmet_mips_s.sum(axis=1),
+            "requested_mips_s": self.vm_requested_mips_s.sum(axis=1),
+            "migrations": self.vm_migrations.sum(axis=1),
+        }
@@ -0,0 +1,360 @@
+# sweep_coordinator.py
+#
+# Shards a sweep across any number of worker processes, on any number of machines,
+# using nothing but a shared directory:
+#
+#   <work_dir>/cases/<key>.json     case descriptors written by the coordinator
+#   <work_dir>/locks/<key>.lock     claim held by a worker, refreshed while it runs
+#   <work_dir>/results/<key>.json   finished results (a ResultCache)
+#
+# A claim is an O_CREAT | O_EXCL file create, which is atomic on local and NFS
+# filesystems. A worker that crashes stops refreshing its lock; once the lock is
+# older than the lease timeout any other worker may break it and take the case over.
+# Every claim writes a fresh token into its lock, and a worker only refreshes or
+# removes a lock that still carries its own token, so a worker whose lease was
+# broken never touches the lock of the worker that took the case over.
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+
+from result_cache import ResultCache, case_key
+
+DEFAULT_LEASE_SEC = 600
+
+
+def _case_dir(work_dir):
+    return os.path.join(work_dir, "cases")
+
+
+def _lock_dir(work_dir):
+    return os.path.join(work_dir, "locks")
+
+
+def _result_cache(work_dir):
+    return ResultCache(os.path.join(work_dir, "results"))
+
+
+def publish_cases(work_dir, cases):
+    """
+    Write one descriptor per case into the shared work directory.
+    Already published cases are left untouched, so publishing twice is harmless.
+
+    :param work_dir: Shared directory visible to all workers
+    :param cases: List of case configuration dicts
+    :return: Number of newly published cases
+    """
+    os.makedirs(_case_dir(work_dir), exist_ok=True)
+    os.makedirs(_lock_dir(work_dir), exist_ok=True)
+    _result_cache(work_dir)
+
+    published = 0
+    for case in cases:
+        path = os.path.join(_case_dir(work_dir), f"{case_key(case)}.json")
+        if os.path.exists(path):
+            continue
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(case, f, sort_keys=True)
+        os.replace(tmp_path, path)
+        published += 1
+    return published
+
+
+def load_cases(work_dir):
+    """
+    Return all published case descriptors as a {key: case} dict.
+    """
+    cases = {}
+    for filename in sorted(os.listdir(_case_dir(work_dir))):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(_case_dir(work_dir), filename), "r") as f:
+            cases[filename[:-len(".json")]] = json.load(f)
+    return cases
+
+
+def _file_age(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+
+def _break_lease(lock_path, lease_sec):
+    """
+    Remove an expired lock. Staleness is re-checked while holding the break file, so a lock
+    freshly created by another worker in the meantime is never removed.
+    """
+    break_path = f"{lock_path}.break"
+    try:
+        os.close(os.open(break_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        # A worker that died while breaking leaves the break file behind
+        break_age = _file_age(break_path)
+        if break_age is not None and break_age >= lease_sec:
+            try:
+                os.remove(break_path)
+            except FileNotFoundError:
+                pass
+        return False
+    try:
+        age = _file_age(lock_path)
+        if age is not None and age < lease_sec:
+            return False
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+        return True
+    finally:
+        os.remove(break_path)
+
+
+def _lock_token(lock_path):
+    """
+    Token of the claim currently holding a lock, or None if there is none (or it is still being written).
+    """
+    try:
+        with open(lock_path, "r") as f:
+            return json.load(f).get("token")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def release_claim(lock_path, token, timeout_sec=5.0):
+    """
+    Remove a lock if it still belongs to the claim with this token. The check and the removal
+    happen under the <key>.lock.break file, so a lock that another worker broke and claimed
+    again in between is left alone. If the break file stays busy for timeout_sec, the lock is
+    left to expire.
+
+    :return: True if the lock was removed
+    """
+    break_path = f"{lock_path}.break"
+    deadline = time.time() + timeout_sec
+    while True:
+        try:
+            os.close(os.open(break_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+    try:
+        if _lock_token(lock_path) != token:
+            return False
+        os.remove(lock_path)
+        return True
+    finally:
+        os.remove(break_path)
+
+
+def try_claim(work_dir, key, worker_id, lease_sec=DEFAULT_LEASE_SEC):
+    """
+    Atomically claim a case. An expired lease is broken first, under a separate
+    <key>.lock.break file so that only one worker can take over an abandoned case.
+
+    :return: (lock path, claim token) if the claim succeeded, None otherwise
+    """
+    lock_path = os.path.join(_lock_dir(work_dir), f"{key}.lock")
+
+    age = _file_age(lock_path)
+    if age is not None:
+        if age < lease_sec:
+            return None
+        if not _break_lease(lock_path, lease_sec):
+            return None
+        print(f"[Sweep] Worker {worker_id} broke expired lease on case {key[:12]}")
+
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    token = uuid.uuid4().hex
+    with os.fdopen(fd, "w") as f:
+        json.dump({"worker": worker_id, "claimed_at": time.time(), "token": token}, f)
+    return lock_path, token
+
+
+class _LeaseKeeper(threading.Thread):
+    """
+    Background thread that refreshes the lock mtime while a case runs. It stops for good once
+    the lock no longer carries its claim's token, i.e. the lease was broken.
+    """
+    def __init__(self, lock_path, token, interval):
+        super().__init__(daemon=True)
+        self.lock_path = lock_path
+        self.token = token
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if _lock_token(self.lock_path) != self.token:
+                return
+            try:
+                os.utime(self.lock_path)
+            except FileNotFoundError:
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_worker(work_dir, worker_id=None, lease_sec=DEFAULT_LEASE_SEC, run_fn=None, max_cases=None,
+               warehouse_path=None):
+    """
+    Claim and run cases from the work directory until none are left. A case whose run_fn raises
+    is logged, its lock released, and skipped by this worker from then on.
+
+    :param work_dir: Shared directory written by publish_cases
+    :param worker_id: Label recorded in lock files (defaults to hostname-pid)
+    :param lease_sec: A lock not refreshed for this long is considered abandoned
+    :param run_fn: Function mapping a case dict to a result dict (defaults to ComprehensiveExperiment's run_case)
+    :param max_cases: Stop after this many cases (None = run until the sweep is done)
+    :param warehouse_path: Optional results_warehouse SQLite file the worker also writes its results to,
+                           in batches (local filesystems only; otherwise use collect --db afterwards)
+    :return: Number of cases this worker completed
+    """
+    if run_fn is None:
+        from ComprehensiveExperiment_FinalReport import run_case, block_print, enable_print
+
+        def run_fn(case):
+            block_print()
+            try:
+                return run_case(case)
+            finally:
+                enable_print()
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    results = _result_cache(work_dir)
+    warehouse = None
+    if warehouse_path is not None:
+        from results_warehouse import ResultsWarehouse
+        warehouse = ResultsWarehouse(warehouse_path, batch_size=16)
+        warehouse.start_run(f"sweep worker {worker_id}")
+    completed = 0
+    failed = set()
+
+    while max_cases is None or completed < max_cases:
+        pending = [(k, c) for k, c in load_cases(work_dir).items() if k not in failed and not results.contains(c)]
+        if not pending:
+            break
+
+        claimed_any = False
+        for key, case in pending:
+            claim = try_claim(work_dir, key, worker_id, lease_sec)
+            if claim is None:
+                continue
+            claimed_any = True
+            lock_path, token = claim
+
+            try:
+                # Re-check after claiming: the previous owner may have finished just before its lease expired
+                if not results.contains(case):
+                    keeper = _LeaseKeeper(lock_path, token, interval=max(lease_sec / 3.0, 0.01))
+                    keeper.start()
+                    try:
+                        result = run_fn(case)
+                    except Exception as e:
+                        failed.add(key)
+                        print(f"[Sweep] Worker {worker_id} failed case {key[:12]}, skipping it: {e!r}")
+                    else:
+                        results.put(case, result)
+                        if warehouse is not None:
+                            warehouse.add_result(case, result)
+                        completed += 1
+                        print(f"[Sweep] Worker {worker_id} finished case {key[:12]}")
+                    finally:
+                        keeper.stop()
+            finally:
+                release_claim(lock_path, token)
+            break
+
+        if not claimed_any:
+            # Every pending case is held by a live worker; wait for results or expired leases
+            time.sleep(min(lease_sec / 3.0, 5.0))
+
+    if warehouse is not None:
+        warehouse.close()
+    return completed
+
+
+def collect_results(work_dir):
+    """
+    Return (case, result) pairs for every published case, with result None if not finished yet.
+    """
+    results = _result_cache(work_dir)
+    return [(case, results.get(case)) for case in load_cases(work_dir).values()]
+
+
+def sweep_status(work_dir):
+    """
+    Count published, finished and currently claimed cases.
+    """
+    pairs = collect_results(work_dir)
+    claimed = [f for f in os.listdir(_lock_dir(work_dir)) if f.endswith(".lock")]
+    return {
+        "published": len(pairs),
+        "finished": sum(1 for _, r in pairs if r is not None),
+        "claimed": len(claimed),
+    }
+
+
+def launch_local_workers(work_dir, num_workers, lease_sec=DEFAULT_LEASE_SEC, run_fn=None, warehouse_path=None):
+    """
+    Start num_workers worker processes on this machine and wait for them to finish.
+    """
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(work_dir, f"{socket.gethostname()}-w{i}", lease_sec, run_fn,
+                                                         None, warehouse_path))
+        for i in range(num_workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    return [p.exitcode for p in processes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded sweep over a shared work directory.")
+    parser.add_argument("command", choices=["publish", "worker", "local", "status", "collect"])
+    parser.add_argument("work_dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SEC)
+    parser.add_argument("--output", default="results.csv")
+    parser.add_argument("--db", default=None, help="Also write results to this results_warehouse SQLite file")
+    parser.add_argument("--seeds", type=int, nargs="+", default=None)
+    parser.add_argument("--trace-days", nargs="+", default=None)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        from ComprehensiveExperiment_FinalReport import build_cases
+        print(f"Published {publish_cases(args.work_dir, build_cases(args.seeds, args.trace_days))} new cases to {args.work_dir}")
+    elif args.command == "worker":
+        print(f"Worker completed {run_worker(args.work_dir, lease_sec=args.lease, warehouse_path=args.db)} cases")
+    elif args.command == "local":
+        launch_local_workers(args.work_dir, args.workers, lease_sec=args.lease, warehouse_path=args.db)
+        print(sweep_status(args.work_dir))
+    elif args.command == "status":
+        print(sweep_status(args.work_dir))
+    elif args.command == "collect":
+        import pandas as pd
+        finished = [(case, result) for case, result in collect_results(args.work_dir) if result is not None]
+        pd.DataFrame([dict(case, **result) for case, result in finished]).to_csv(args.output, index=False)
+        print(f"Collected {len(finished)} results into {args.output}")
+        if args.db is not None:
+            from results_warehouse import ResultsWarehouse
+            with ResultsWarehouse(args.db) as warehouse:
+                warehouse.start_run("collect")
+                for case, result in finished:
+                    warehouse.add_result(case, result)
+            print(f"Collected {len(finished)} results into {args.db}")
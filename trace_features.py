@@ -0,0 +1,112 @@
+# trace_features.py
+#
+# Per-trace statistics computed once per trace corpus and stored column-wise, aligned with
+# the rows of the trace matrix, so policies look them up by trace index in O(1) instead of
+# recomputing them on every arrival.
+
+import numpy as np
+
+from vector_engine import trace_values
+
+FEATURE_NAMES = ["mean", "p50", "p95", "max", "std", "lag1_autocorr"]
+
+
+class TraceFeatureStore:
+    def __init__(self, traces, step_duration_sec=300):
+        """
+        :param traces: (N, T) utilization matrix, one trace per row
+        :param step_duration_sec: Step length, used to bin the hourly profile
+        """
+        traces = np.asarray(traces, dtype=np.float64)
+        N, T = traces.shape
+        self.num_traces = N
+        self.step_duration_sec = step_duration_sec
+        self.traces = traces    # Kept for policies that look at recent trace windows
+
+        # One contiguous row per feature: columns["mean"][i] is the mean of trace i
+        self.matrix = np.zeros((len(FEATURE_NAMES), N))
+        self.columns = {name: self.matrix[k] for k, name in enumerate(FEATURE_NAMES)}
+        if N and T:
+            self.columns["mean"][:] = traces.mean(axis=1)
+            self.columns["p50"][:], self.columns["p95"][:] = np.percentile(traces, [50, 95], axis=1)
+            self.columns["max"][:] = traces.max(axis=1)
+            self.columns["std"][:] = traces.std(axis=1)
+            centered = traces - self.columns["mean"][:, None]
+            variance = (centered ** 2).sum(axis=1)
+            lagged = (centered[:, :-1] * centered[:, 1:]).sum(axis=1)
+            self.columns["lag1_autocorr"][:] = np.where(variance > 0, lagged / np.where(variance > 0, variance, 1.0),
+                                                        0.0)
+
+        # Mean utilization per hour of the day (partial last hour dropped)
+        steps_per_hour = max(int(round(3600 / step_duration_sec)), 1)
+        hours = T // steps_per_hour
+        self.hourly = traces[:, :hours * steps_per_hour].reshape(N, hours, steps_per_hour).mean(axis=2)
+
+    def __len__(self):
+        return self.num_traces
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def features(self, trace_index):
+        """
+        All scalar features of one trace as a dict.
+        """
+        return {name: float(self.columns[name][trace_index]) for name in FEATURE_NAMES}
+
+    def hourly_profile(self, trace_index):
+        return self.hourly[trace_index]
+
+    def windows(self, trace_index, step, length):
+        """
+        Utilization of the given traces over the `length` steps ending at `step` (inclusive),
+        shorter at the start of the run.
+
+        :param trace_index: Array of trace rows, any shape S
+        :return: S + (n,) array, n = min(length, step + 1)
+        """
+        if self.traces is None:
+            raise ValueError("This feature store was loaded without its traces")
+        return self.traces[np.asarray(trace_index), max(step + 1 - length, 0):step + 1]
+
+    @classmethod
+    def from_profiles(cls, profiles, time_steps=None, step_duration_sec=300):
+        """
+        Build the store over the distinct traces of a list of VM profiles.
+
+        :return: (store, trace_index) with trace_index[i] the row of profiles[i]
+        """
+        unique = {}
+        by_object = {}      # Profiles usually share trace lists; skip hashing the values again
+        corpus = []
+        trace_index = np.empty(len(profiles), dtype=np.int64)
+        for i, profile in enumerate(profiles):
+            trace = profile["cpu_utilization"]
+            row = by_object.get(id(trace))
+            if row is None:
+                values = trace_values(trace)
+                key = tuple(values[:time_steps] if time_steps else values)
+                row = unique.setdefault(key, len(corpus))
+                if row == len(corpus):
+                    corpus.append(key)
+                by_object[id(trace)] = row
+            trace_index[i] = row
+        length = len(corpus[0]) if corpus else (time_steps or 0)
+        return cls(np.array(corpus, dtype=np.float64).reshape(len(corpus), length), step_duration_sec), trace_index
+
+    def save(self, path):
+        traces = {} if self.traces is None else {"traces": self.traces}
+        np.savez(path, matrix=self.matrix, hourly=self.hourly, names=np.array(FEATURE_NAMES),
+                 step_duration_sec=self.step_duration_sec, **traces)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        store = cls.__new__(cls)
+        store.matrix = data["matrix"]
+        store.num_traces = store.matrix.shape[1]
+        store.columns = {str(name): store.matrix[k] for k, name in enumerate(data["names"])}
+        store.hourly = data["hourly"]
+        store.step_duration_sec = int(data["step_duration_sec"])
+        store.traces = data["traces"] if "traces" in data.files else None
+        return store
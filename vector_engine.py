@@ -0,0 +1,682 @@
+# vector_engine.py
+#
+# Array-based re-implementation of Runner.run_simulation. Host and VM state is kept in
+# NumPy arrays with a leading replica dimension R, so R independent workloads of the same
+# case (same hosts, policy, DVFS and migration settings) advance together in one pass.
+# With R = 1 and a deterministic policy it reproduces Runner.run_simulation.
+
+import random
+import numpy as np
+
+from Helper import VM_TYPES, VM_MIPS, VM_PES, VM_RAM, VM_SIZE, vm_fleet_arrays
+
+# Default DVFS rule of Host.update_dvfs: utilization < 0.6 -> level 2, < 0.8 -> level 1, else level 0
+DVFS_THRESHOLDS = (0.6, 0.8)
+
+# Consolidation thresholds of Runner.migrate_vms
+UNDERLOAD_THRESHOLD = 0.2
+TARGET_MAX_UTIL = 0.8
+# First migration targets tested at once, doubled while no VM fits; most fit one of the first few
+MIGRATION_TARGET_CHUNK = 256
+
+POLICIES = [
+    "first_fit", "random", "least_utilized", "most_utilized",
+    "best_fit", "worst_fit", "energy_aware", "most_free_ram"
+]
+
+# Storage types for utilization traces and histories. "uint8" keeps whole percent, which is
+# lossless for PlanetLab traces (integer percentages); values are decoded to float64 only
+# where the kernels compute with them.
+UTILIZATION_DTYPES = ["float64", "float32", "float16", "uint8"]
+
+
+def encode_utilization(values, dtype="float64"):
+    """
+    Store utilization ratios in [0, 1] as dtype (uint8 holds percent).
+    """
+    if dtype not in UTILIZATION_DTYPES:
+        raise ValueError(f"Unknown utilization dtype: {dtype}")
+    values = np.asarray(values, dtype=np.float64)
+    if dtype == "uint8":
+        return np.rint(np.clip(values, 0.0, 1.0) * 100.0).astype(np.uint8)
+    return values.astype(dtype)
+
+
+def decode_utilization(values):
+    """
+    Utilization ratios as float64, from any of UTILIZATION_DTYPES.
+    """
+    values = np.asarray(values)
+    if values.dtype == np.uint8:
+        return values / 100.0
+    return values.astype(np.float64, copy=False)
+
+
+def trace_values(trace):
+    """
+    One VM trace of the object engine as ratios: lists of floats are returned as they are,
+    arrays in any of UTILIZATION_DTYPES are decoded.
+    """
+    return decode_utilization(trace) if isinstance(trace, np.ndarray) else trace
+
+
+def trace_value(trace, t):
+    """
+    Ratio at step t of one VM trace (a list of floats or an encoded array), as a float.
+    """
+    value = trace[t]
+    if isinstance(trace, np.ndarray):
+        return value / 100.0 if trace.dtype == np.uint8 else float(value)
+    return value
+
+
+class HostArrays:
+    def __init__(self, hosts):
+        """
+        Static host parameters as arrays of shape (H,), DVFS tables as (L, H).
+
+        :param hosts: list of Host objects (only their configuration is read)
+        """
+        for host in hosts:
+            if host.power_function is not None or host.dvfs_rule_function is not None:
+                raise ValueError(f"Host {host.host_id} uses a custom power or DVFS function, "
+                                 f"which the vectorized engine does not support.")
+
+        self.host_ids = [h.host_id for h in hosts]
+        self.num_hosts = len(hosts)
+        self.num_cores = np.array([h.num_cores for h in hosts], dtype=np.float64)
+        self.base_core_capacity = np.array([h.base_core_capacity for h in hosts], dtype=np.float64)
+        self.base_cpu_capacity = np.array([h.base_cpu_capacity for h in hosts], dtype=np.float64)
+        self.cpu_limit = self.base_cpu_capacity * np.array([h.cpu_oversub for h in hosts])
+        self.ram_limit = np.array([h.ram_capacity * h.ram_oversub for h in hosts], dtype=np.float64)
+        self.storage_limit = np.array([h.storage_capacity * h.storage_oversub for h in hosts], dtype=np.float64)
+        self.ram_capacity = np.array([h.ram_capacity for h in hosts], dtype=np.float64)
+        self.boot_energy_joules = np.array([h.boot_energy_joules for h in hosts], dtype=np.float64)
+
+        # DVFS tables indexed by level number; Host.apply_dvfs_level truncates the core capacity to int
+        num_levels = max(d["level"] for h in hosts for d in h.dvfs_levels) + 1
+        self.level_cpu_capacity = np.zeros((num_levels, self.num_hosts))
+        self.level_power_idle = np.zeros((num_levels, self.num_hosts))
+        self.level_power_max = np.zeros((num_levels, self.num_hosts))
+        for j, host in enumerate(hosts):
+            for d in host.dvfs_levels:
+                self.level_cpu_capacity[d["level"], j] = host.num_cores * int(host.base_core_capacity * d["scaling"])
+                self.level_power_idle[d["level"], j] = d["power_idle"]
+                self.level_power_max[d["level"], j] = d["power_max"]
+        self.initial_level = np.array([h.current_dvfs_level for h in hosts], dtype=np.int64)
+        self.initial_active = np.array([h.active for h in hosts], dtype=bool)
+
+
+def draw_vm_specs(num_vms, rng=None):
+    """
+    Draw VM types exactly as Helper.create_vm_list does, consuming the same `random` stream,
+    or in one draw from rng (see Helper.vm_fleet_arrays) if a numpy Generator is given.
+
+    :return: (cpu, ram, storage) arrays of length num_vms
+    """
+    if rng is not None:
+        fleet = vm_fleet_arrays(num_vms, rng)
+        return fleet["cpu"], fleet["ram"], fleet["storage"]
+    vm_types = np.array([random.randint(0, VM_TYPES - 1) for _ in range(num_vms)], dtype=np.int64)
+    cpu = (np.array(VM_MIPS) * np.array(VM_PES))[vm_types]
+    ram = np.array(VM_RAM, dtype=np.float64)[vm_types]
+    storage = np.full(num_vms, VM_SIZE, dtype=np.float64)
+    return cpu, ram, storage
+
+
+def build_workload(profiles, vm_specs, time_steps=288, trace_dtype="float64"):
+    """
+    Convert a list of VM profile dicts (sorted by arrival) into arrays.
+    Identical utilization traces are stored once and referenced by index.
+
+    :param profiles: VM profile dicts as produced by vm_profile_generator
+    :param vm_specs: (cpu, ram, storage) arrays aligned with profiles, e.g. from draw_vm_specs
+    :param time_steps: Number of simulation steps
+    :param trace_dtype: Storage type of the trace corpus, one of UTILIZATION_DTYPES
+    :return: Workload dict of arrays; trace_error holds the largest absolute quantization
+             error of each stored trace
+    """
+    trace_index = np.empty(len(profiles), dtype=np.int64)
+    unique = {}
+    corpus = []
+    for i, profile in enumerate(profiles):
+        key = tuple(trace_values(profile["cpu_utilization"][:time_steps]))
+        if key not in unique:
+            unique[key] = len(corpus)
+            corpus.append(key)
+        trace_index[i] = unique[key]
+
+    traces = np.array(corpus, dtype=np.float64).reshape(len(corpus), time_steps)
+    stored = encode_utilization(traces, trace_dtype)
+    cpu, ram, storage = vm_specs
+    return {
+        "vm_id": np.array([p["vm_id"] for p in profiles], dtype=np.int64),
+        "arrival": np.array([p["arrival_time"] for p in profiles], dtype=np.int64),
+        "lifetime": np.array([p["lifetime"] for p in profiles], dtype=np.float64),
+        "trace_index": trace_index,
+        "traces": stored,
+        "trace_error": np.abs(decode_utilization(stored) - traces).max(axis=1, initial=0.0),
+        "cpu": np.asarray(cpu, dtype=np.float64),
+        "ram": np.asarray(ram, dtype=np.float64),
+        "storage": np.asarray(storage, dtype=np.float64),
+    }
+
+
+def stack_workloads(workloads):
+    """
+    Pad R per-replica workloads to a common VM count and merge their trace corpora.
+    Padding VMs arrive at step -1 and are never scheduled.
+    """
+    num_replicas = len(workloads)
+    max_vms = max(len(w["arrival"]) for w in workloads)
+    offsets = np.cumsum([0] + [len(w["traces"]) for w in workloads])
+
+    batch = {
+        "traces": np.concatenate([w["traces"] for w in workloads], axis=0),
+        "trace_error": np.concatenate([w.get("trace_error", np.zeros(len(w["traces"]))) for w in workloads]),
+        "num_vms": np.array([len(w["arrival"]) for w in workloads], dtype=np.int64),
+    }
+    fill = {"vm_id": -1, "arrival": -1, "lifetime": 0.0, "trace_index": 0, "cpu": 0.0, "ram": 0.0, "storage": 0.0}
+    for name, value in fill.items():
+        arr = np.full((num_replicas, max_vms), value, dtype=workloads[0][name].dtype)
+        for r, w in enumerate(workloads):
+            arr[r, :len(w[name])] = w[name]
+        batch[name] = arr
+    for r in range(num_replicas):
+        batch["trace_index"][r] += offsets[r]
+
+    # Mean of each VM's trace, used by the energy-aware policy (Cloudlet.trace_mean)
+    batch["trace_mean"] = decode_utilization(batch["traces"]).mean(axis=1)[batch["trace_index"]]
+    return batch
+
+
+class BatchState:
+    def __init__(self, host_arrays, batch, dvfs):
+        """
+        Mutable simulation state. Host arrays have shape (R, H), VM arrays (R, V).
+        """
+        R, V = batch["arrival"].shape
+        H = host_arrays.num_hosts
+        self.hosts = host_arrays
+        self.batch = batch
+        self.dvfs = dvfs
+        self.rows = np.arange(R)
+
+        self.active = np.tile(host_arrays.initial_active, (R, 1))
+        self.level = np.tile(host_arrays.initial_level, (R, 1))
+        self.alloc_cpu = np.zeros((R, H))
+        self.alloc_ram = np.zeros((R, H))
+        self.alloc_storage = np.zeros((R, H))
+        self.demand = np.zeros((R, H))
+
+        self.vm_host = np.full((R, V), -1, dtype=np.int64)   # -1: not placed (yet) or departed
+        self.vm_ratio = np.zeros((R, V))                      # current cpu_demand_ratio
+        self.vm_expiry = np.full((R, V), np.inf)
+        self.vm_seq = np.zeros((R, V), dtype=np.int64)        # allocation order, as in Host.vms
+        self.next_seq = 0
+        self.boot_energy = np.zeros(R)
+
+    # ---------- Derived host quantities ----------
+
+    def base_utilization(self):
+        return np.minimum(self.demand / self.hosts.base_cpu_capacity, 1.0)
+
+    def current_capacity(self, rows=None):
+        H = self.hosts.num_hosts
+        level = self.level if rows is None else self.level[rows]
+        return self.hosts.level_cpu_capacity[level, np.arange(H)]
+
+    def utilization(self, rows=None):
+        demand = self.demand if rows is None else self.demand[rows]
+        return np.minimum(demand / self.current_capacity(rows), 1.0)
+
+    def power(self, demand, active, level):
+        H = self.hosts.num_hosts
+        cols = np.arange(H)
+        u = np.minimum(demand / self.hosts.level_cpu_capacity[level, cols], 1.0)
+        idle = self.hosts.level_power_idle[level, cols]
+        peak = self.hosts.level_power_max[level, cols]
+        return np.where(~active & (u == 0), 0.0, idle + (peak - idle) * u)
+
+    # ---------- Placement ----------
+
+    def feasible(self, rows, vms, cols=None):
+        """
+        (n, H) bool, whether VM vms[i] of replica rows[i] fits on each host, or (n, len(cols)) on hosts cols.
+        """
+        h, b = self.hosts, self.batch
+        at = (rows,) if cols is None else (np.asarray(rows)[:, None], cols)
+        limit = slice(None) if cols is None else cols
+        return ((self.alloc_cpu[at] + b["cpu"][rows, vms][:, None] <= h.cpu_limit[limit]) &
+                (self.alloc_ram[at] + b["ram"][rows, vms][:, None] <= h.ram_limit[limit]) &
+                (self.alloc_storage[at] + b["storage"][rows, vms][:, None] <= h.storage_limit[limit]))
+
+    def allocate(self, rows, vms, targets):
+        b = self.batch
+        np.add.at(self.alloc_cpu, (rows, targets), b["cpu"][rows, vms])
+        np.add.at(self.alloc_ram, (rows, targets), b["ram"][rows, vms])
+        np.add.at(self.alloc_storage, (rows, targets), b["storage"][rows, vms])
+        np.add.at(self.demand, (rows, targets), b["cpu"][rows, vms] * self.vm_ratio[rows, vms])
+        self.vm_host[rows, vms] = targets
+        self.vm_seq[rows, vms] = self.next_seq + np.arange(len(rows))
+        self.next_seq += len(rows)
+
+    def allocate_one(self, r, vm, target):
+        """
+        allocate for a single VM, without the fancy-indexing overhead.
+        """
+        b = self.batch
+        self.alloc_cpu[r, target] += b["cpu"][r, vm]
+        self.alloc_ram[r, target] += b["ram"][r, vm]
+        self.alloc_storage[r, target] += b["storage"][r, vm]
+        self.demand[r, target] += b["cpu"][r, vm] * self.vm_ratio[r, vm]
+        self.vm_host[r, vm] = target
+        self.vm_seq[r, vm] = self.next_seq
+        self.next_seq += 1
+
+    def deallocate(self, rows, vms):
+        b = self.batch
+        hosts = self.vm_host[rows, vms]
+        np.subtract.at(self.alloc_cpu, (rows, hosts), b["cpu"][rows, vms])
+        np.subtract.at(self.alloc_ram, (rows, hosts), b["ram"][rows, vms])
+        np.subtract.at(self.alloc_storage, (rows, hosts), b["storage"][rows, vms])
+        np.subtract.at(self.demand, (rows, hosts), b["cpu"][rows, vms] * self.vm_ratio[rows, vms])
+        self.vm_host[rows, vms] = -1
+
+    def recompute_demand(self):
+        """
+        Rebuild host demand from VM ratios. Terms are added in allocation order, the order in
+        which Host.cpu_utilization walks Host.vms, so sums (and policy tie-breaks) match it exactly.
+        """
+        R, H = self.demand.shape
+        placed = self.vm_host >= 0
+        order = np.argsort(self.vm_seq[placed], kind="stable")
+        flat = (self.rows[:, None] * H + self.vm_host)[placed][order]
+        weights = (self.batch["cpu"] * self.vm_ratio)[placed][order]
+        self.demand[...] = np.bincount(flat, weights=weights, minlength=R * H).reshape(R, H)
+
+    def dvfs_levels_for(self, demand):
+        util = np.minimum(demand / self.hosts.base_cpu_capacity, 1.0)
+        low, high = DVFS_THRESHOLDS
+        return np.where(util < low, 2, np.where(util < high, 1, 0))
+
+
+def _host_scores(state, rows, vms, policy, noise=None, cols=None):
+    """
+    Whether VM vms[i] of replica rows[i] fits on each host, and the score _select_hosts ranks the
+    hosts by (lower is better, ties to the lowest host index). A placement only changes the score
+    of the host it lands on. energy_aware is scored in _select_hosts, with its DVFS side effects.
+
+    :param noise: Uniform draws of the random policy, one row per VM and one column per host scored
+    :param cols: Host indices to score (all by default)
+    :return: (feasible, score), both (n, H) or (n, len(cols))
+    """
+    rows = np.asarray(rows)
+    hosts = state.hosts
+    at = (rows,) if cols is None else (rows[:, None], cols)
+    limit = slice(None) if cols is None else cols
+    feasible = state.feasible(rows, vms, cols)
+
+    if policy == "first_fit":
+        score = np.zeros(feasible.shape)
+    elif policy == "random":
+        score = -noise
+    elif policy in ("least_utilized", "most_utilized"):
+        capacity = hosts.level_cpu_capacity[state.level[at], np.arange(hosts.num_hosts)[limit]]
+        util = np.minimum(state.demand[at] / capacity, 1.0)
+        score = util if policy == "least_utilized" else -util
+    elif policy in ("best_fit", "worst_fit"):
+        remaining = hosts.base_cpu_capacity[limit] - state.alloc_cpu[at]
+        score = remaining if policy == "best_fit" else -remaining
+    elif policy == "most_free_ram":
+        score = -(hosts.ram_capacity[limit] - state.alloc_ram[at])
+    else:
+        raise ValueError(f"Unknown scheduling policy: {policy}")
+    return feasible, score
+
+
+def _select_hosts(state, rows, vms, policy, rngs):
+    """
+    Choose a target host for VM vms[i] of replica rows[i], for all i at once.
+    Returns -1 where no host fits. Ties go to the lowest host index, as with min()/max().
+    """
+    hosts = state.hosts
+    if policy == "energy_aware":
+        feasible = state.feasible(rows, vms)
+        demand = state.demand[rows]
+        active = state.active[rows]
+        added = demand + (state.batch["cpu"][rows, vms] * state.batch["trace_mean"][rows, vms])[:, None]
+        if state.dvfs:
+            level_before = state.dvfs_levels_for(demand)
+            level_after = state.dvfs_levels_for(added)
+        else:
+            level_before = level_after = state.level[rows]
+        increase = state.power(added, active, level_after) - state.power(demand, active, level_before)
+        choice = np.argmin(np.where(feasible, increase, np.inf), axis=1)
+        if state.dvfs:
+            # SchedulerVM._energy_aware leaves every evaluated host at its pre-placement DVFS level
+            state.level[rows] = np.where(feasible, level_before, state.level[rows])
+        return np.where(feasible.any(axis=1), choice, -1)
+
+    noise = np.stack([rngs[r].random(hosts.num_hosts) for r in rows]) if policy == "random" else None
+    feasible, score = _host_scores(state, rows, vms, policy, noise)
+    choice = np.argmin(np.where(feasible, score, np.inf), axis=1)
+    return np.where(feasible.any(axis=1), choice, -1)
+
+
+def _place_sequence(state, r, vms, policy, rngs, block_elements=1 << 22):
+    """
+    Place VMs vms of replica r one after another, with the same result as one _select_hosts and
+    allocate call per VM. Whether a VM fits depends only on its cpu, RAM and storage, and the scores
+    (but random's) not on the VM at all, so hosts are scored once per distinct VM shape; a placement
+    only changes its host, whose column is then scored again. Chosen hosts are switched on.
+
+    :param rngs: Numpy Generators by replica (random policy)
+    :param block_elements: Upper bound on VMs x hosts of random draws held at once
+    :return: (targets, booted) aligned with vms; target -1 where no host fits, booted where the
+             placement switched its host on
+    """
+    vms = np.asarray(vms, dtype=np.int64)
+    n, H = len(vms), state.hosts.num_hosts
+    targets = np.full(n, -1, dtype=np.int64)
+    booted = np.zeros(n, dtype=bool)
+    rows = np.full(n, r, dtype=np.int64)
+
+    def place(i, target):
+        targets[i] = target
+        booted[i] = not state.active[r, target]
+        state.active[r, target] = True
+        state.allocate_one(r, vms[i], target)
+
+    if policy == "energy_aware":
+        # DVFS side effects of every evaluation change other hosts' scores: one VM at a time
+        for i in range(n):
+            target = _select_hosts(state, rows[i:i + 1], vms[i:i + 1], policy, rngs)[0]
+            if target >= 0:
+                place(i, target)
+        return targets, booted
+
+    b = state.batch
+    shapes = np.stack([b["cpu"][r, vms], b["ram"][r, vms], b["storage"][r, vms]], axis=1)
+    _, first, shape = np.unique(shapes, axis=0, return_index=True, return_inverse=True)
+    shape = shape.reshape(-1)
+    kinds, kind_rows = vms[first], rows[:len(first)]
+    if policy == "random":
+        feasible = state.feasible(kind_rows, kinds)
+        block = max(block_elements // max(H, 1), 1)
+    else:
+        feasible, score = _host_scores(state, kind_rows, kinds, policy)
+        masked = np.where(feasible, score, np.inf)
+
+    for i in range(n):
+        if policy == "random":
+            if i % block == 0:
+                noise = rngs[r].random((min(block, n - i), H))
+            scores = np.where(feasible[shape[i]], -noise[i % block], np.inf)
+        else:
+            scores = masked[shape[i]]
+        target = np.argmin(scores)
+        if scores[target] == np.inf:
+            continue
+        place(i, target)
+        cols = np.array([target])
+        if policy == "random":
+            feasible[:, target] = state.feasible(kind_rows, kinds, cols)[:, 0]
+        else:
+            fits, current = _host_scores(state, kind_rows, kinds, policy, cols=cols)
+            masked[:, target] = np.where(fits[:, 0], current[:, 0], np.inf)
+    return targets, booted
+
+
+def _migrate_replica(state, r, metrics=None, ledger=None, placed=None):
+    """
+    Runner.migrate_vms for replica r: try to empty each underutilized host (ascending utilization)
+    onto other active hosts without pushing them above TARGET_MAX_UTIL or their RAM and storage
+    limits, and power it off on success.
+    Like the original, the projected utilization of targets is not rolled back when a host fails.
+    Moved VMs are reported to metrics (sla_metrics.BatchSLAMetrics) and their overhead booked in
+    ledger (energy_ledger.EnergyLedger) if given.
+    The VMs of a host are fitted against a chunk of targets at once: projections and the RAM and
+    storage of targets only grow, so a target a VM did not fit at the start still does not, and
+    only targets the host already sent VMs to are checked again. For the same reason a host found
+    too full for a VM shape stays so for the rest of the pass, and a VM whose shape no remaining
+    target fits fails without being tested again.
+
+    :param placed: Optional VMs of replica r that are on a host, in any order (all by default)
+    :return: The VMs that moved, each once
+    """
+    hosts = state.hosts
+    util = state.base_utilization()[r]
+    active = state.active[r]
+    order = np.argsort(util, kind="stable")
+    under = order[(util[order] < UNDERLOAD_THRESHOLD) & active[order]]
+    non_under = order[(util[order] >= UNDERLOAD_THRESHOLD) & active[order]]
+    projected = util.copy()
+    moved = []
+    # Targets in the order Runner.migrate_vms tries them: the hosts that are not underloaded, then
+    # the underloaded ones by index; the source and hosts switched off by now are skipped when tested
+    targets = np.concatenate([non_under, np.sort(under)])
+    position = np.empty(hosts.num_hosts, dtype=np.int64)
+    position[targets] = np.arange(len(targets))
+    # (cpu, ram, storage) -> (H,) bool, hosts known not to fit VMs of that shape (or switched off)
+    unfit = {}
+    off = np.zeros(hosts.num_hosts, dtype=bool)
+
+    # VMs of every host in allocation order, built once; VMs moved onto a host later are appended
+    if placed is None:
+        placed = np.where(state.vm_host[r] >= 0)[0]
+    placed = placed[np.lexsort((state.vm_seq[r, placed], state.vm_host[r, placed]))]
+    bounds = np.searchsorted(state.vm_host[r, placed], np.arange(hosts.num_hosts + 1))
+    moved_in = {}
+
+    for src in under:
+        on_src = placed[bounds[src]:bounds[src + 1]]
+        if src in moved_in:
+            on_src = np.concatenate([on_src, moved_in[src]])
+        if len(on_src) == 0:
+            # As in Runner.migrate_vms, a host without VMs is left on
+            continue
+        # Fits depend on the VM only through its shape: one row per distinct (cpu, ram, storage)
+        shapes = list(zip(state.batch["cpu"][r, on_src].tolist(), state.batch["ram"][r, on_src].tolist(),
+                          state.batch["storage"][r, on_src].tolist()))
+        kinds = list(dict.fromkeys(shapes))
+        for shape in kinds:
+            unfit.setdefault(shape, off.copy())
+        cpu, ram, storage = (np.array(column)[:, None] for column in zip(*kinds))
+        fits = np.zeros((len(kinds), len(targets)), dtype=bool)
+        cost = np.zeros((len(kinds), len(targets)))
+        tested = 0
+
+        def test_more(tested):
+            # Targets are tested in growing chunks, as far as needed; untested ones cannot have been used
+            chunk = slice(tested, min(max(2 * tested, MIGRATION_TARGET_CHUNK), len(targets)))
+            cols = targets[chunk]
+            cost[:, chunk] = cpu / hosts.base_core_capacity[cols]
+            fit = ((projected[cols] + cost[:, chunk] <= TARGET_MAX_UTIL) &
+                   (state.alloc_ram[r, cols] + ram <= hosts.ram_limit[cols]) &
+                   (state.alloc_storage[r, cols] + storage <= hosts.storage_limit[cols]))
+            for u, shape in enumerate(kinds):
+                unfit[shape][cols] |= ~fit[u]
+            fits[:, chunk] = fit & ~off[cols] & (cols != src)
+            return chunk.stop
+
+        plan = []
+        used = set()
+        pending_ram = {}
+        pending_storage = {}
+        for shape in shapes:
+            u = kinds.index(shape)
+            k = None
+            while k is None:
+                if not fits[u, :tested].any():
+                    if tested == len(targets):
+                        break
+                    left = unfit[shape][targets[tested:]]
+                    if position[src] >= tested:
+                        left[position[src] - tested] = True
+                    if left.all():
+                        break
+                    tested = test_more(tested)
+                    continue
+                k = np.argmax(fits[u, :tested])
+                h = targets[k]
+                # A used target that no longer fits this shape will not fit it again for this host
+                if k in used and not (
+                        projected[h] + cost[u, k] <= TARGET_MAX_UTIL and
+                        state.alloc_ram[r, h] + pending_ram[h] + shape[1] <= hosts.ram_limit[h] and
+                        state.alloc_storage[r, h] + pending_storage[h] + shape[2] <= hosts.storage_limit[h]):
+                    fits[u, k] = False
+                    k = None
+            if k is None:
+                plan = None
+                break
+            used.add(k)
+            projected[h] += cost[u, k]
+            pending_ram[h] = pending_ram.get(h, 0.0) + shape[1]
+            pending_storage[h] = pending_storage.get(h, 0.0) + shape[2]
+            plan.append(h)
+        if plan is None:
+            continue
+
+        rows = np.full(len(on_src), r)
+        state.deallocate(rows, on_src)
+        state.allocate(rows, on_src, np.array(plan, dtype=np.int64))
+        if metrics is not None:
+            metrics.record_migrations(state, r, on_src)
+        if ledger is not None:
+            ledger.add_migration(src, np.array(plan, dtype=np.int64), state.batch["ram"][r, on_src], rows=r)
+        for vm, target in zip(on_src, plan):
+            moved_in[target] = np.append(moved_in.get(target, np.empty(0, dtype=np.int64)), vm)
+        state.active[r, src] = False
+        off[src] = True
+        for hopeless in unfit.values():
+            hopeless[src] = True
+        moved.append(on_src)
+    # A VM moved onto a host emptied later in the pass moves twice
+    return np.unique(np.concatenate(moved)) if moved else np.empty(0, dtype=np.int64)
+
+
+def run_batched_simulation(batch, host_arrays, policy="first_fit", dvfs=False, migration="default",
+                           step_duration_sec=300, time_steps=288, rngs=None, metrics=None,
+                           history_dtype="float64", ledger=None):
+    """
+    Run R replicas of one case in lockstep.
+
+    :param batch: Stacked workload from stack_workloads
+    :param host_arrays: HostArrays describing the (shared) host fleet
+    :param policy: Placement policy name, as in SchedulerVM
+    :param dvfs: Apply the default DVFS rule every step
+    :param migration: "default" (Runner.migrate_vms) or "disable" (power off idle hosts)
+    :param step_duration_sec: Duration of one step in seconds
+    :param time_steps: Number of steps
+    :param rngs: One numpy Generator per replica (used by the random policy)
+    :param metrics: Optional sla_metrics.BatchSLAMetrics, updated every step
+    :param history_dtype: Storage type of the utilization history, one of UTILIZATION_DTYPES
+    :param ledger: Optional energy_ledger.EnergyLedger with R replicas, booked every step
+    :return: Dict with per-replica energy_joules (R,), boot_energy_joules (R,),
+             host_utilization_history (R, T, H), num_active_vm (R, T) and quantization, which
+             reports the trace and history errors and energy_error_bound_joules (R,): a first-order
+             bound on the energy error from quantized traces, for the placement decisions taken
+    """
+    R, V = batch["arrival"].shape
+    state = BatchState(host_arrays, batch, dvfs)
+    if rngs is None:
+        rngs = [np.random.default_rng(r) for r in range(R)]
+
+    # Arrival order per replica: profiles are already sorted by arrival step
+    arrival = batch["arrival"]
+    energy = np.zeros(R)
+    history = np.zeros((R, time_steps, host_arrays.num_hosts), dtype=history_dtype)
+    num_active_vm = np.zeros((R, time_steps), dtype=np.int64)
+    H = host_arrays.num_hosts
+    trace_error = batch.get("trace_error")
+    quantized_traces = trace_error is not None and trace_error.any()
+    energy_error_bound = np.zeros(R)
+    history_error = 0.0
+    cols = np.arange(H)
+
+    for t in range(time_steps):
+        if ledger is not None:
+            ledger.step = t
+
+        # Step 1: Place VMs arriving at this step, k-th arrival of every replica at once
+        start = np.argmax(arrival >= t, axis=1) if V else np.zeros(R, dtype=np.int64)
+        start = np.where((arrival >= t).any(axis=1), start, V)
+        count = (arrival == t).sum(axis=1)
+        for k in range(int(count.max()) if R else 0):
+            rows = np.where(count > k)[0]
+            vms = start[rows] + k
+            state.vm_ratio[rows, vms] = decode_utilization(batch["traces"][batch["trace_index"][rows, vms], t])
+            targets = _select_hosts(state, rows, vms, policy, rngs)
+            ok = targets >= 0
+            rows, vms, targets = rows[ok], vms[ok], targets[ok]
+            booting = ~state.active[rows, targets]
+            state.boot_energy[rows[booting]] += host_arrays.boot_energy_joules[targets[booting]]
+            if ledger is not None:
+                ledger.add_boot(targets[booting], host_arrays.boot_energy_joules[targets[booting]], rows[booting])
+            state.active[rows, targets] = True
+            state.allocate(rows, vms, targets)
+            state.vm_expiry[rows, vms] = t + batch["lifetime"][rows, vms]
+
+        # Step 2: Remove expired VMs and advance the remaining ones along their traces
+        placed = state.vm_host >= 0
+        expired = placed & (t >= state.vm_expiry)
+        if expired.any():
+            r_idx, v_idx = np.nonzero(expired)
+            state.deallocate(r_idx, v_idx)
+        running = placed & ~expired
+        state.vm_ratio[running] = decode_utilization(batch["traces"][batch["trace_index"][running], t])
+        state.recompute_demand()
+        num_active_vm[:, t] = running.sum(axis=1)
+
+        # Step 3: Power and utilization
+        if dvfs:
+            state.level[...] = state.dvfs_levels_for(state.demand)
+        power = state.power(state.demand, state.active, state.level)
+        energy += power.sum(axis=1) * step_duration_sec
+        if ledger is not None:
+            ledger.add_power(np.where(power > 0, host_arrays.level_power_idle[state.level, cols], 0.0), power,
+                             step_duration_sec)
+        base_util = state.base_utilization()
+        history[:, t, :] = encode_utilization(base_util, history_dtype)
+        if history_dtype != "float64":
+            history_error = max(history_error, float(np.abs(decode_utilization(history[:, t, :]) - base_util).max()))
+        if quantized_traces:
+            # Power is linear in demand below capacity, so a demand error d moves it by at most slope * d
+            r_idx, v_idx = np.nonzero(running)
+            h_idx = state.vm_host[r_idx, v_idx]
+            weights = batch["cpu"][r_idx, v_idx] * trace_error[batch["trace_index"][r_idx, v_idx]]
+            demand_error = np.bincount(r_idx * H + h_idx, weights=weights, minlength=R * H).reshape(R, H)
+            slope = ((host_arrays.level_power_max - host_arrays.level_power_idle)[state.level, cols]
+                     / host_arrays.level_cpu_capacity[state.level, cols])
+            energy_error_bound += (slope * demand_error).sum(axis=1) * step_duration_sec
+        if metrics is not None:
+            metrics.record_step(state, running, step_duration_sec)
+
+        # Step 4: Migration or shutdown of idle hosts
+        if migration == "disable":
+            vm_count = np.zeros((R, host_arrays.num_hosts), dtype=np.int64)
+            r_idx, v_idx = np.nonzero(state.vm_host >= 0)
+            np.add.at(vm_count, (r_idx, state.vm_host[r_idx, v_idx]), 1)
+            state.active[...] &= vm_count > 0
+        elif migration == "default":
+            for r in range(R):
+                _migrate_replica(state, r, metrics, ledger)
+            state.recompute_demand()
+        else:
+            raise ValueError(f"Unknown migration mode: {migration}")
+
+    return {
+        "energy_joules": energy,
+        "boot_energy_joules": state.boot_energy,
+        "host_utilization_history": history,
+        "num_active_vm": num_active_vm,
+        "host_ids": host_arrays.host_ids,
+        "quantization": {
+            "trace_dtype": str(batch["traces"].dtype),
+            "trace_max_abs_error": float(trace_error.max()) if trace_error is not None and len(trace_error) else 0.0,
+            "history_dtype": history_dtype,
+            "history_max_abs_error": history_error,
+            "energy_error_bound_joules": energy_error_bound,
+        },
+    }
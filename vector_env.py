@@ -0,0 +1,245 @@
+# vector_env.py
+#
+# Gym-style environment running N independent datacenters in lockstep on top of the
+# vector engine's BatchState, for training placement and DVFS controllers. One env step is
+# one simulation step of every datacenter:
+#
+#   1. the VMs queued for this step are placed on the hosts chosen by the action
+#      (invalid or -1 choices fall back to a SchedulerVM-style policy)
+#   2. expired VMs leave, the rest advance along their traces
+#   3. DVFS levels are set from the action (or the default rule), power and energy accounted,
+#      and demand above the current capacity is counted as unmet MIPS
+#   4. idle hosts are powered off (as with migration "disable"); the queue is refilled
+#
+# Observations live in preallocated arrays that are updated in place every step; copy them
+# if they need to be kept. Nothing here depends on the gym package.
+#
+# The running VMs of all envs are kept as flat, aligned arrays (env, VM, host slot, size, trace row,
+# expiry), extended on placement and compacted on expiry, so a step touches only live VMs with 1-D
+# gathers instead of scanning the full (N, V) arrays. Host allocations are updated incrementally by
+# BatchState.allocate / deallocate (VM sizes are whole numbers, so the sums stay exact); only
+# demand, which changes with every VM's trace, is re-summed over the live VMs.
+
+import numpy as np
+
+from vector_engine import BatchState, _select_hosts, decode_utilization
+
+# Per live VM: env, VM index, env * H + host, MIPS, trace row, expiry step
+LIVE_FIELDS = {"row": np.int64, "vm": np.int64, "slot": np.int64, "cpu": np.float64, "trace": np.int64,
+               "expiry": np.float64}
+
+
+class VectorDatacenterEnv:
+    def __init__(self, batch, host_arrays, queue_size=16, fallback_policy="first_fit", dvfs=True,
+                 step_duration_sec=300, time_steps=288, sla_weight=1.0, reject_penalty=1.0, autoreset=True,
+                 seed=0):
+        """
+        :param batch: Stacked workloads, one row per env (vector_engine.stack_workloads)
+        :param host_arrays: vector_engine.HostArrays shared by all envs
+        :param queue_size: Q, arriving VMs exposed per step; further arrivals of the same step are
+                           placed by fallback_policy
+        :param fallback_policy: Policy for unplaceable actions and queue overflow
+        :param dvfs: Without a DVFS action, apply the default DVFS rule (True) or keep levels (False)
+        :param sla_weight: Reward weight of the fraction of requested MIPS left unmet
+        :param reject_penalty: Reward penalty per VM no host could take
+        :param autoreset: Reset automatically when the day ends, returning the first observation
+        """
+        self.batch = batch
+        self.hosts = host_arrays
+        self.num_envs, self.num_vms = batch["arrival"].shape
+        self.num_hosts = host_arrays.num_hosts
+        self.queue_size = queue_size
+        self.fallback_policy = fallback_policy
+        self.dvfs = dvfs
+        self.step_duration_sec = step_duration_sec
+        self.time_steps = time_steps
+        self.sla_weight = sla_weight
+        self.reject_penalty = reject_penalty
+        self.autoreset = autoreset
+        self.seed = seed
+        self.num_levels = host_arrays.level_cpu_capacity.shape[0]
+
+        # First VM of every env arriving at or after each step (VMs are sorted by arrival)
+        N, T = self.num_envs, time_steps
+        self._arrival_start = np.zeros((N, T + 1), dtype=np.int64)
+        for r in range(N):
+            arrival = batch["arrival"][r, :batch["num_vms"][r]]
+            self._arrival_start[r] = np.searchsorted(arrival, np.arange(T + 1), side="left")
+        self._cols = np.arange(self.num_hosts)
+        self._env_rows = np.arange(N)
+
+        H, Q = self.num_hosts, queue_size
+        self.observation = {
+            "host_util": np.zeros((N, H), dtype=np.float32),
+            "dvfs_level": np.zeros((N, H), dtype=np.int8),
+            "active": np.zeros((N, H), dtype=bool),
+            "queue": np.zeros((N, Q, 3), dtype=np.float32),     # cpu (MIPS), ram (MB), cpu ratio now
+            "queue_mask": np.zeros((N, Q), dtype=bool),
+        }
+        self.queue_vm = np.full((N, Q), -1, dtype=np.int64)
+        self.reset()
+
+    # ---------- Gym-style API ----------
+
+    def reset(self):
+        """
+        Restart every datacenter at step 0.
+
+        :return: The observation dict
+        """
+        self.state = BatchState(self.hosts, self.batch, self.dvfs)
+        self.rngs = [np.random.default_rng(self.seed + r) for r in range(self.num_envs)]
+        self.t = 0
+        self.episode_energy = np.zeros(self.num_envs)
+        self._live = {name: np.zeros(0, dtype=dtype) for name, dtype in LIVE_FIELDS.items()}
+        self._placed = []       # Live entries placed during the current step
+        self._fill_queue()
+        self._observe()
+        return self.observation
+
+    def step(self, placement=None, dvfs_levels=None):
+        """
+        Advance all datacenters by one step.
+
+        :param placement: (N, Q) host index per queued VM, -1 for the fallback policy; None = all fallback
+        :param dvfs_levels: (N, H) DVFS level per host, or None for the default behaviour
+        :return: (observation, reward (N,), done (N,), info dict of (N,) arrays)
+        """
+        state, batch, t = self.state, self.batch, self.t
+        N, H = self.num_envs, self.num_hosts
+
+        # Step 1: place the queued VMs, then the overflow of this step
+        rejected = np.zeros(N, dtype=np.int64)
+        for k in range(self.queue_size):
+            rows = np.nonzero(self.queue_vm[:, k] >= 0)[0]
+            if len(rows) == 0:
+                break
+            chosen = None if placement is None else np.asarray(placement)[rows, k]
+            rejected += self._place(rows, self.queue_vm[rows, k], chosen)
+        overflow = np.maximum(self._arrival_start[:, t + 1] - self._arrival_start[:, t] - self.queue_size, 0)
+        for k in range(int(overflow.max())):
+            rows = np.nonzero(overflow > k)[0]
+            rejected += self._place(rows, self._arrival_start[rows, t] + self.queue_size + k, None)
+
+        # Step 2: expiry and trace update
+        live = {name: np.concatenate([values] + [placed[name] for placed in self._placed])
+                for name, values in self._live.items()}
+        self._placed = []
+        expired = t >= live["expiry"]
+        if expired.any():
+            state.deallocate(live["row"][expired], live["vm"][expired])
+            live = {name: values[~expired] for name, values in live.items()}
+        self._live = live
+        ratio = decode_utilization(batch["traces"][live["trace"], t])
+        np.put(state.vm_ratio, live["row"] * self.num_vms + live["vm"], ratio)
+        # Order-free sum; exact replication of the object engine's summation order is not needed here
+        state.demand[...] = np.bincount(live["slot"], weights=live["cpu"] * ratio, minlength=N * H).reshape(N, H)
+
+        # Step 3: DVFS, power, energy and unmet demand
+        if dvfs_levels is not None:
+            state.level[...] = np.clip(dvfs_levels, 0, self.num_levels - 1)
+        elif self.dvfs:
+            state.level[...] = state.dvfs_levels_for(state.demand)
+        power = state.power(state.demand, state.active, state.level)
+        energy = power.sum(axis=1) * self.step_duration_sec
+        self.episode_energy += energy
+        capacity = self.hosts.level_cpu_capacity[state.level, self._cols]
+        unmet = np.maximum(state.demand - capacity, 0.0).sum(axis=1)
+        requested = state.demand.sum(axis=1)
+        unmet_fraction = np.where(requested > 0, unmet / np.maximum(requested, 1e-12), 0.0)
+
+        # Step 4: power off idle hosts, move on to the next step
+        state.active &= state.alloc_cpu > 0
+        reward = -(energy / 3_600_000 + self.sla_weight * unmet_fraction + self.reject_penalty * rejected)
+        info = {
+            "energy_joules": energy,
+            "unmet_mips": unmet,
+            "rejected": rejected,
+            "overflow": overflow,
+            "active_vms": np.bincount(live["row"], minlength=N),
+        }
+        self.t += 1
+        done = np.full(N, self.t >= self.time_steps)
+        if done[0]:
+            info["episode_energy_joules"] = self.episode_energy.copy()
+            info["episode_boot_energy_joules"] = state.boot_energy.copy()
+            if self.autoreset:
+                return self.reset(), reward, done, info
+        self._fill_queue()
+        self._observe()
+        return self.observation, reward, done, info
+
+    # ---------- Internals ----------
+
+    def _place(self, rows, vms, chosen):
+        """
+        Place VM vms[i] of env rows[i] on chosen[i] if it fits, else with the fallback policy.
+        :return: (N,) count of VMs no host could take
+        """
+        state = self.state
+        targets = np.full(len(rows), -1, dtype=np.int64)
+        if chosen is not None:
+            valid = (chosen >= 0) & (chosen < self.num_hosts)
+            idx = np.nonzero(valid)[0]
+            if len(idx):
+                r, v, h = rows[idx], vms[idx], chosen[idx]
+                b = self.batch
+                fits = ((state.alloc_cpu[r, h] + b["cpu"][r, v] <= self.hosts.cpu_limit[h]) &
+                        (state.alloc_ram[r, h] + b["ram"][r, v] <= self.hosts.ram_limit[h]) &
+                        (state.alloc_storage[r, h] + b["storage"][r, v] <= self.hosts.storage_limit[h]))
+                targets[idx[fits]] = h[fits]
+        need = targets < 0
+        if need.any():
+            targets[need] = _select_hosts(state, rows[need], vms[need], self.fallback_policy, self.rngs)
+
+        ok = targets >= 0
+        rows_ok, vms_ok, targets_ok = rows[ok], vms[ok], targets[ok]
+        booting = ~state.active[rows_ok, targets_ok]
+        state.boot_energy[rows_ok[booting]] += self.hosts.boot_energy_joules[targets_ok[booting]]
+        state.active[rows_ok, targets_ok] = True
+        state.vm_ratio[rows_ok, vms_ok] = decode_utilization(
+            self.batch["traces"][self.batch["trace_index"][rows_ok, vms_ok], self.t])
+        state.allocate(rows_ok, vms_ok, targets_ok)
+        state.vm_expiry[rows_ok, vms_ok] = self.t + self.batch["lifetime"][rows_ok, vms_ok]
+        self._placed.append({"row": rows_ok, "vm": vms_ok, "slot": rows_ok * self.num_hosts + targets_ok,
+                             "cpu": self.batch["cpu"][rows_ok, vms_ok],
+                             "trace": self.batch["trace_index"][rows_ok, vms_ok],
+                             "expiry": state.vm_expiry[rows_ok, vms_ok]})
+        return np.bincount(rows[~ok], minlength=self.num_envs)
+
+    def _fill_queue(self):
+        if self.t >= self.time_steps:
+            return
+        start = self._arrival_start[:, self.t]
+        count = np.minimum(self._arrival_start[:, self.t + 1] - start, self.queue_size)
+        slots = np.arange(self.queue_size)
+        present = slots[None, :] < count[:, None]
+        self.queue_vm[...] = np.where(present, start[:, None] + slots[None, :], -1)
+
+    def _observe(self):
+        obs, state, b = self.observation, self.state, self.batch
+        obs["host_util"][...] = state.base_utilization()
+        obs["dvfs_level"][...] = state.level
+        obs["active"][...] = state.active
+        present = self.queue_vm >= 0
+        rows = np.broadcast_to(self._env_rows[:, None], self.queue_vm.shape)
+        vms = np.where(present, self.queue_vm, 0)
+        t = min(self.t, self.time_steps - 1)
+        obs["queue"][..., 0] = np.where(present, b["cpu"][rows, vms], 0.0)
+        obs["queue"][..., 1] = np.where(present, b["ram"][rows, vms], 0.0)
+        obs["queue"][..., 2] = np.where(present, decode_utilization(b["traces"][b["trace_index"][rows, vms], t]), 0.0)
+        obs["queue_mask"][...] = present
+
+
+def make_env_from_case(case, num_envs, **kwargs):
+    """
+    One env per seed (case seed, seed + 1, ...), with the workloads run_case would generate.
+    """
+    from Helper import create_host_list
+    from monte_carlo import build_replica_batch
+    from vector_engine import HostArrays
+
+    batch = build_replica_batch(case, num_envs)
+    return VectorDatacenterEnv(batch, HostArrays(create_host_list(case["num_hosts"])),
+                               step_duration_sec=case["step_duration_sec"], time_steps=case["time_steps"],
+                               dvfs=case["dvfs"], **kwargs)
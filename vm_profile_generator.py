@@ -2,32 +2,56 @@ import random
 import numpy as np
 import os
 from ProteanData.Sampler import ProteanSampler
+from vector_engine import encode_utilization
 
-def load_trace_data(trace_dir, num_traces, time_steps=288):
+def load_trace_data(trace_dir, num_traces, time_steps=288, rng=None, trace_dtype=None):
     """
     Load trace data from the PlanetLab directory.
+
+    :param rng: Optional numpy Generator choosing the traces; the global `random` is used otherwise
+    :param trace_dtype: None for lists of floats, or one of vector_engine.UTILIZATION_DTYPES to keep
+                        each trace as an array of that type (see load_trace_file)
     """
     trace_files = [f for f in os.listdir(trace_dir) if os.path.isfile(os.path.join(trace_dir, f))]
-    selected_traces = random.sample(trace_files, num_traces)
+    if rng is not None:
+        # Sorted so the choice does not depend on the directory listing order
+        trace_files = sorted(trace_files)
+        selected_traces = [trace_files[i] for i in rng.choice(len(trace_files), num_traces, replace=False)]
+    else:
+        selected_traces = random.sample(trace_files, num_traces)
     trace_data = {}
 
     for i, filename in enumerate(selected_traces):
-        path = os.path.join(trace_dir, filename)
-        with open(path, 'r') as f:
-            values = [float(line.strip()) for line in f if line.strip().isdigit()]
-        values = values[:time_steps]
-        if len(values) < time_steps:
-            raise ValueError(f"Trace file {filename} has fewer than {time_steps} entries.")
-        trace_data[i] = [min(max(v / 100.0, 0.0), 1.0) for v in values]
+        trace_data[i] = load_trace_file(os.path.join(trace_dir, filename), time_steps, trace_dtype)
 
     return trace_data
 
+def load_trace_file(path, time_steps=288, trace_dtype=None):
+    """
+    Read one PlanetLab trace file as a list of CPU utilization ratios in [0, 1].
+
+    :param trace_dtype: None for a list of floats (about 32 bytes per value), or one of
+                        vector_engine.UTILIZATION_DTYPES for an array (8 bytes per value for float64,
+                        1 for uint8, which is lossless for these whole-percent traces). The engines
+                        read either through vector_engine.trace_value / trace_values.
+    """
+    with open(path, 'r') as f:
+        values = [float(line.strip()) for line in f if line.strip().isdigit()]
+    values = values[:time_steps]
+    if len(values) < time_steps:
+        raise ValueError(f"Trace file {os.path.basename(path)} has fewer than {time_steps} entries.")
+    ratios = [min(max(v / 100.0, 0.0), 1.0) for v in values]
+    return ratios if trace_dtype is None else encode_utilization(ratios, trace_dtype)
+
 def generate_initial_vm_profiles(
     num_vms,
     trace_dir,
     long_lived_ratio=1.0,
     long_lived_duration=1e9,
-    time_steps=288
+    time_steps=288,
+    streams=None,
+    antithetic_lifetimes=False,
+    trace_dtype=None
 ):
     """
     Generate a group of VMs that all exist at time = 0.
@@ -37,16 +61,22 @@ def generate_initial_vm_profiles(
     :param long_lived_ratio: Fraction of VMs that are long-lived (e.g., 0.3 for 30%)
     :param long_lived_duration: Duration (in steps) to assign to long-lived VMs
     :param time_steps: Number of simulation steps
+    :param streams: Optional Helper.make_streams dict; its "traces" and "lifetimes" streams replace
+                    the global random state
+    :param antithetic_lifetimes: Draw lifetimes in antithetic pairs (see ProteanSampler)
+    :param trace_dtype: Storage type of the cpu_utilization traces (see load_trace_file)
     :return: List of VM profile dicts
     """
-    trace_data = load_trace_data(trace_dir, num_traces=num_vms, time_steps=time_steps)
-    protean = ProteanSampler()
+    streams = streams or {}
+    trace_data = load_trace_data(trace_dir, num_traces=num_vms, time_steps=time_steps, rng=streams.get("traces"),
+                                 trace_dtype=trace_dtype)
+    protean = ProteanSampler(antithetic=antithetic_lifetimes)
     vm_profiles = []
 
     num_long_lived_vms = int(num_vms * long_lived_ratio)
     num_short_lived_vms = num_vms - num_long_lived_vms
 
-    short_lived_lifetimes = protean.VM_lifetime(num_short_lived_vms)
+    short_lived_lifetimes = protean.VM_lifetime(num_short_lived_vms, rng=streams.get("lifetimes"))
 
     for vm_index in range(num_vms):
         trace_index = vm_index % len(trace_data)
@@ -67,7 +97,12 @@ def generate_dynamic_vm_profiles(
     num_hosts,
     num_peak_arrive,
     initial_vm_id=0,
-    time_steps=288
+    time_steps=288,
+    streams=None,
+    arrival_process=None,
+    step_duration_sec=300,
+    antithetic_lifetimes=False,
+    trace_dtype=None
 ):
     """
     Generate all VM profiles for dynamic arrivals using PlanetLab traces and Protean arrival/lifetime model.
@@ -76,33 +111,58 @@ def generate_dynamic_vm_profiles(
     - vm_id
     - arrival_time (step)
     - lifetime (steps)
-    - cpu_utilization (list of length time_steps)
+    - cpu_utilization (list of length time_steps, or an array with trace_dtype)
 
     :param trace_dir: Directory for trace data
     :param num_hosts: Number of physical hosts (controls how many traces to load)
     :param num_peak_arrive: Scaling factor for Protean arrivals
     :param initial_vm_id: Starting vm_id for dynamic VMs (to avoid id overlap)
     :param time_steps: Total number of simulation steps
+    :param streams: Optional Helper.make_streams dict (see generate_initial_vm_profiles)
+    :param arrival_process: None for one arrival count per CSV row, rounded (the original model), or
+                            "poisson" / "thinning" to draw arrivals from the rate curve interpolated
+                            onto steps of step_duration_sec (see ProteanSampler.VM_arrivals)
+    :param step_duration_sec: Step length used with arrival_process
+    :param antithetic_lifetimes: Draw lifetimes in antithetic pairs (see ProteanSampler)
+    :param trace_dtype: Storage type of the cpu_utilization traces (see load_trace_file)
     :return: List of VM profile dicts
     """
-    protean = ProteanSampler()
+    streams = streams or {}
+    lifetime_rng = streams.get("lifetimes")
+    protean = ProteanSampler(antithetic=antithetic_lifetimes)
     arrival_rates = protean.VM_arrival_rates(scale=num_peak_arrive)
-    trace_data = load_trace_data(trace_dir, num_traces=num_hosts * 4, time_steps=time_steps)
+    trace_data = load_trace_data(trace_dir, num_traces=num_hosts * 4, time_steps=time_steps, rng=streams.get("traces"),
+                                 trace_dtype=trace_dtype)
 
     vm_profiles = []
     vm_id = initial_vm_id
 
+    if arrival_process is not None:
+        # Without an "arrivals" stream, derive one from the (seeded) global numpy state
+        rng = streams.get("arrivals") or np.random.default_rng(np.random.randint(0, 2 ** 31))
+        arrival_steps, lifetimes = protean.VM_arrivals(step_duration_sec, time_steps, scale=num_peak_arrive,
+                                                       rng=rng, method=arrival_process)
+        for t, lifetime in zip(arrival_steps.tolist(), lifetimes.tolist()):
+            vm_profiles.append({
+                "vm_id": vm_id,
+                "arrival_time": t,
+                "lifetime": lifetime,
+                "cpu_utilization": trace_data[vm_id % len(trace_data)][:time_steps]
+            })
+            vm_id += 1
+        return vm_profiles
+
     for t, num_arrivals in enumerate(arrival_rates):
         num_arrivals = int(num_arrivals)
         if num_arrivals == 0:
             continue
-        lifetimes = protean.VM_lifetime(num_arrivals)
+        lifetimes = protean.VM_lifetime(num_arrivals, rng=lifetime_rng)
         for i in range(num_arrivals):
             trace_index = vm_id % len(trace_data)
             lifetime = int(np.ceil(lifetimes[i] / 5))
 
             while lifetime > time_steps:
-                lifetime = int(np.ceil(protean.VM_lifetime(1)[0] / 5))
+                lifetime = int(np.ceil(protean.VM_lifetime(1, rng=lifetime_rng)[0] / 5))
 
             profile = {
                 "vm_id": vm_id,